@@ -0,0 +1,238 @@
+# asr_poller.py (批量转录的异步提交与集中轮询)
+#
+# AssemblyAI SDK 的 Transcriber.transcribe 在调用线程中同步轮询直到转录完成，每个转录都要占用
+# 一个线程数秒到数十秒，并发任务数因此受线程池大小限制。这里改为：
+#   1. AssemblyAITranscriptService 通过 REST 接口异步上传音频并提交转录，立即拿到 transcript ID；
+#   2. TranscriptPoller 用一个 asyncio 循环跟踪所有未完成的 ID：每个 ID 的轮询间隔从
+#      initial_interval 开始按倍数增长到 max_interval (短音频很快完成，长音频不会被频繁查询)，
+#      每一轮把所有到期的 ID 作为一批查询 (共享连接池并发请求)，完成后解析对应任务的 future。
+# 调用方只让上传与提交经过 ProviderScheduler (限速与 max_in_flight)，等待结果时不占用名额，
+# 同时进行中的转录数因此既不受线程数限制，也不受 max_in_flight 限制。
+# 本地测试替身: benchmarks/fake_providers.py 中的 create_fake_assemblyai_app (经 httpx.ASGITransport 调用)。
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+import httpx
+
+DEFAULT_BASE_URL = "https://api.assemblyai.com"
+
+
+class TranscriptServiceError(Exception):
+    """REST 调用失败；status_code 供 ProviderScheduler 判断是否可重试。"""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def transcript_to_asr_data(transcript: dict) -> dict:
+    """REST 返回的 transcript JSON -> {"text", "words"}，词级字段与 SDK 的 word.dict() 一致。"""
+    words = [
+        {"text": w.get("text"), "start": w.get("start"), "end": w.get("end"), "confidence": w.get("confidence"),
+         "speaker": w.get("speaker"), "channel": w.get("channel")}
+        for w in transcript.get("words") or []
+    ]
+    return {"text": transcript.get("text"), "words": words}
+
+
+def read_file_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class AssemblyAITranscriptService:
+    """AssemblyAI v2 REST 接口：上传 + 提交转录，以及按 ID 批量查询状态。"""
+
+    def __init__(self, api_key: str, base_url: str = DEFAULT_BASE_URL, poll_concurrency: int = 16,
+                 timeout_seconds: float = 60.0, transport: httpx.AsyncBaseTransport = None):
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"authorization": api_key},
+            timeout=timeout_seconds,
+            transport=transport,
+            limits=httpx.Limits(max_connections=poll_concurrency + 4, max_keepalive_connections=poll_concurrency),
+        )
+        self.poll_concurrency = poll_concurrency
+        self._semaphore = None
+
+    async def _request(self, method: str, url: str, **kwargs) -> dict:
+        response = await self._client.request(method, url, **kwargs)
+        if response.status_code >= 400:
+            raise TranscriptServiceError(f"{method} {url} failed: {response.status_code} {response.text[:200]}", response.status_code)
+        return response.json()
+
+    async def submit(self, audio_path: str) -> str:
+        """上传音频并提交转录，返回 transcript ID (不等待转录完成)。"""
+        content = await asyncio.to_thread(read_file_bytes, audio_path)
+        upload = await self._request("POST", "/v2/upload", content=content)
+        transcript = await self._request("POST", "/v2/transcript", json={"audio_url": upload["upload_url"]})
+        return transcript["id"]
+
+    async def _get_status(self, transcript_id: str) -> dict:
+        async with self._semaphore:
+            return await self._request("GET", f"/v2/transcript/{transcript_id}")
+
+    async def get_statuses(self, transcript_ids: list) -> dict:
+        """批量查询；返回 {id: transcript JSON 或 异常}，单个 ID 失败不影响同批其他 ID。"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.poll_concurrency)
+        results = await asyncio.gather(*[self._get_status(tid) for tid in transcript_ids], return_exceptions=True)
+        return dict(zip(transcript_ids, results))
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+@dataclass
+class PendingTranscript:
+    future: asyncio.Future
+    interval: float
+    next_poll_at: float
+    deadline: float
+    log_prefix: str = ""
+    failures: int = 0
+    last_error: BaseException = field(default=None, repr=False)
+
+
+class TranscriptPoller:
+    """在单个后台任务中轮询所有未完成的转录。
+
+    `get_service` 返回提供 `submit(path) -> id` 与 `get_statuses(ids) -> {id: dict | Exception}`
+    的服务对象 (延迟获取，见 clients.ClientRegistry)。
+    """
+
+    def __init__(self, get_service, initial_interval: float = 1.0, max_interval: float = 5.0, backoff: float = 1.5,
+                 timeout_seconds: float = 600.0, max_poll_failures: int = 5):
+        self.get_service = get_service
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout_seconds = timeout_seconds
+        self.max_poll_failures = max_poll_failures
+        self._pending: "dict[str, PendingTranscript]" = {}
+        self._task = None
+        self._wakeup = None
+        # 统计
+        self.submitted = 0
+        self.poll_rounds = 0
+        self.status_checks = 0
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def transcribe(self, audio_path: str, log_prefix: str = "") -> dict:
+        """提交转录并等待轮询循环给出结果，返回 {"text", "words"}。"""
+        transcript_id = await self.get_service().submit(audio_path)
+        return await self.wait(transcript_id, log_prefix)
+
+    async def wait(self, transcript_id: str, log_prefix: str = "") -> dict:
+        """等待已提交的转录完成；调用方可以只让提交经过限速与并发控制，等待期间不占用名额。"""
+        self.submitted += 1
+        logging.info(f"{log_prefix} 转录已提交 ({transcript_id})，等待轮询结果...")
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        pending = PendingTranscript(
+            future=loop.create_future(),
+            interval=self.initial_interval,
+            next_poll_at=now + self.initial_interval,
+            deadline=now + self.timeout_seconds,
+            log_prefix=log_prefix,
+        )
+        self._pending[transcript_id] = pending
+        self._ensure_running()
+        return await pending.future
+
+    def _ensure_running(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._pending:
+                # 等待者已取消 (如任务被中断) 的 ID 不再查询
+                for transcript_id in [tid for tid, p in self._pending.items() if p.future.done()]:
+                    del self._pending[transcript_id]
+                if not self._pending:
+                    break
+                now = loop.time()
+                next_due = min(p.next_poll_at for p in self._pending.values())
+                if next_due > now:
+                    self._wakeup.clear()
+                    try:
+                        # 有新提交时提前醒来，重新计算下一次到期时间
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=next_due - now)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                due = [tid for tid, p in self._pending.items() if p.next_poll_at <= now]
+                await self._poll(due, loop)
+        except BaseException as e:
+            # 循环意外退出时不能让等待者永远挂起
+            for pending in self._pending.values():
+                if not pending.future.done():
+                    pending.future.set_exception(e if isinstance(e, Exception) else RuntimeError("transcript poller stopped"))
+            self._pending.clear()
+            if not isinstance(e, Exception):
+                raise
+            logging.error(f"[asr-poller] 轮询循环异常退出: {e}", exc_info=True)
+
+    async def _poll(self, due: list, loop):
+        self.poll_rounds += 1
+        self.status_checks += len(due)
+        try:
+            statuses = await self.get_service().get_statuses(due)
+        except Exception as e:
+            statuses = {tid: e for tid in due}
+        now = loop.time()
+        for transcript_id in due:
+            pending = self._pending.get(transcript_id)
+            if pending is None:
+                continue
+            status = statuses.get(transcript_id)
+            if isinstance(status, BaseException) or status is None:
+                self._on_poll_failed(transcript_id, pending, status or TranscriptServiceError("missing status"), now)
+                continue
+            pending.failures = 0
+            if status.get("status") == "completed":
+                self._resolve(transcript_id, result=transcript_to_asr_data(status))
+            elif status.get("status") == "error":
+                self._resolve(transcript_id, error=Exception(f"ASR Error: {status.get('error')}"))
+            elif now >= pending.deadline:
+                self._resolve(transcript_id, error=TimeoutError(f"transcript {transcript_id} not completed within {self.timeout_seconds:.0f}s"))
+            else:
+                pending.interval = min(self.max_interval, pending.interval * self.backoff)
+                pending.next_poll_at = now + pending.interval
+
+    def _on_poll_failed(self, transcript_id: str, pending: PendingTranscript, error: BaseException, now: float):
+        pending.failures += 1
+        pending.last_error = error
+        if pending.failures >= self.max_poll_failures or now >= pending.deadline:
+            self._resolve(transcript_id, error=error)
+            return
+        logging.warning(f"{pending.log_prefix} 查询转录状态失败 ({transcript_id}，第 {pending.failures} 次): {error}")
+        pending.interval = min(self.max_interval, pending.interval * self.backoff)
+        pending.next_poll_at = now + pending.interval
+
+    def _resolve(self, transcript_id: str, result: dict = None, error: BaseException = None):
+        pending = self._pending.pop(transcript_id)
+        if pending.future.done():
+            return
+        if error is not None:
+            pending.future.set_exception(error)
+        else:
+            pending.future.set_result(result)
+
+    async def close(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,289 @@
+# audio_normalize.py (ASR 上传前的音频归一化)
+#
+# 客户端常上传 44.1/48 kHz 立体声 PCM，且首尾带有较长静音。转录前统一处理为：
+#   单声道 → 16 kHz (抗混叠低通 + 线性插值) → 去除首尾静音 (按帧能量，numpy 向量化)
+#   → 16-bit PCM WAV，或可选编码为 FLAC (无损、更小)
+# 去掉的开头时长记为 offset_ms，转录后用 shift_word_timestamps 把词级时间戳移回原音频的时间轴。
+#
+# numpy 与 soundfile 是项目依赖 (pyproject.toml)。解码顺序：PCM WAV 用标准库 wave；其他格式
+# (如 sample_audio/ 中的 MP3) 用 soundfile (wheel 自带 libsndfile，支持 MP3/FLAC/OGG，无需 ffmpeg)；
+# 两者都无法解码时若 PATH 中有 ffmpeg 再交给 ffmpeg。FLAC 编码同样优先使用 soundfile。
+# 依赖缺失的环境 (如只装了部分依赖的工具进程) 仍可导入本模块，此时直接使用原文件。
+# numpy 与 soundfile 在首次归一化时才导入 (合计约 100 ms)，只负责入队的进程不承担其耗时。
+
+import functools
+import importlib.util
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import wave
+from dataclasses import dataclass
+
+AUDIO_ENCODINGS = ("wav", "flac")
+
+
+class UnsupportedAudioError(Exception):
+    """无法在本地解码的音频。"""
+
+
+@dataclass
+class NormalizedAudio:
+    path: str                 # 实际用于转录的文件；未归一化时即原文件
+    offset_ms: int = 0        # 开头被裁掉的时长，转录结果需加回
+    source_bytes: int = 0
+    output_bytes: int = 0
+    source_duration_ms: int = 0
+    output_duration_ms: int = 0
+    skipped_reason: str = None
+
+    @property
+    def normalized(self) -> bool:
+        return self.skipped_reason is None
+
+
+def ffmpeg_path():
+    return shutil.which("ffmpeg")
+
+
+def is_installed(module: str) -> bool:
+    """只查找模块而不导入，供启动时的依赖提示使用。"""
+    return importlib.util.find_spec(module) is not None
+
+
+@functools.lru_cache(maxsize=None)
+def load_numpy():
+    """导入 numpy；未安装时返回 None (跳过归一化)。"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+@functools.lru_cache(maxsize=None)
+def load_soundfile():
+    """导入 soundfile；未安装或找不到 libsndfile 时返回 None。"""
+    try:
+        import soundfile
+    except (ImportError, OSError):
+        return None
+    return soundfile
+
+
+# --- 解码 ---
+
+def read_wav(path: str):
+    """读取 PCM WAV，返回 (float32 数组 [帧, 声道]，取值 -1~1, 采样率)。"""
+    np = load_numpy()
+    try:
+        with wave.open(path, "rb") as f:
+            channels, width, rate = f.getnchannels(), f.getsampwidth(), f.getframerate()
+            raw = f.readframes(f.getnframes())
+    except (wave.Error, EOFError) as e:
+        raise UnsupportedAudioError(f"not a PCM WAV file: {e}")
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        # 24-bit: 补齐为 32-bit 再右移，保留符号
+        bytes3 = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        padded = np.zeros((len(bytes3), 4), dtype=np.uint8)
+        padded[:, 1:] = bytes3
+        samples = (padded.view("<i4").ravel() >> 8).astype(np.float32) / 8388608.0
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise UnsupportedAudioError(f"unsupported sample width: {width} bytes")
+    return samples.reshape(-1, channels), rate
+
+
+def read_with_soundfile(path: str):
+    """用 libsndfile 解码 (MP3、FLAC、OGG 等)，返回 (float32 数组 [帧, 声道], 采样率)。"""
+    try:
+        samples, rate = load_soundfile().read(path, dtype="float32", always_2d=True)
+    except RuntimeError as e:  # LibsndfileError 是 RuntimeError 的子类
+        raise UnsupportedAudioError(f"libsndfile cannot decode: {e}")
+    return samples, rate
+
+
+def decode_with_ffmpeg(path: str, target_rate: int):
+    """用 ffmpeg 解码任意格式为单声道 target_rate 的 float32 数组。"""
+    np = load_numpy()
+    result = subprocess.run(
+        [ffmpeg_path(), "-nostdin", "-v", "error", "-i", path, "-ac", "1", "-ar", str(target_rate), "-f", "f32le", "-"],
+        capture_output=True, check=False,
+    )
+    if result.returncode != 0:
+        raise UnsupportedAudioError(f"ffmpeg failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+    return np.frombuffer(result.stdout, dtype="<f4").reshape(-1, 1), target_rate
+
+
+# --- 处理 ---
+
+def to_mono(samples):
+    return samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+
+
+def resample(signal, src_rate: int, dst_rate: int, taps: int = 101):
+    """降采样：Hamming 窗 sinc 低通 (截止频率为目标 Nyquist 的 90%) 后线性插值。"""
+    np = load_numpy()
+    if src_rate == dst_rate or len(signal) == 0:
+        return signal.astype(np.float32)
+    if dst_rate < src_rate:
+        cutoff = 0.45 * dst_rate / src_rate  # 单位：周期/采样
+        n = np.arange(taps) - (taps - 1) / 2
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+        signal = np.convolve(signal, kernel / kernel.sum(), mode="same")
+    n_out = int(round(len(signal) * dst_rate / src_rate))
+    positions = np.arange(n_out) * (src_rate / dst_rate)
+    return np.interp(positions, np.arange(len(signal)), signal).astype(np.float32)
+
+
+def find_speech_bounds(signal, rate: int, frame_ms: int = 20, threshold_db: float = -35.0,
+                       floor_db: float = -55.0, pad_ms: int = 150) -> tuple:
+    """按帧 RMS 能量找出首个与最后一个有声帧，返回保留区间 [start, end) (采样点)。
+
+    阈值取 (最响帧能量 + threshold_db) 与绝对下限 floor_db (dBFS) 中较大者；首尾各保留 pad_ms 余量，
+    避免切掉弱起的辅音。整段都低于阈值时不裁剪。
+    """
+    np = load_numpy()
+    frame = max(1, rate * frame_ms // 1000)
+    n_frames = len(signal) // frame
+    if n_frames == 0:
+        return 0, len(signal)
+    frames = signal[:n_frames * frame].reshape(n_frames, frame)
+    energy_db = 10 * np.log10(np.mean(frames.astype(np.float64) ** 2, axis=1) + 1e-12)
+    threshold = max(energy_db.max() + threshold_db, floor_db)
+    voiced = np.flatnonzero(energy_db > threshold)
+    if len(voiced) == 0:
+        return 0, len(signal)
+    pad = rate * pad_ms // 1000
+    return max(0, voiced[0] * frame - pad), min(len(signal), (voiced[-1] + 1) * frame + pad)
+
+
+def write_wav(path: str, signal, rate: int):
+    np = load_numpy()
+    pcm = (np.clip(signal, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(pcm.tobytes())
+
+
+def encode_flac(wav_path: str, flac_path: str, signal=None, rate: int = None):
+    soundfile = load_soundfile()
+    if soundfile is not None and signal is not None:
+        soundfile.write(flac_path, load_numpy().clip(signal, -1.0, 1.0), rate, format="FLAC", subtype="PCM_16")
+        return
+    subprocess.run([ffmpeg_path(), "-nostdin", "-v", "error", "-y", "-i", wav_path, "-c:a", "flac", flac_path],
+                   capture_output=True, check=True)
+
+
+def decode_audio(path: str, target_rate: int):
+    """依次尝试 wave、soundfile 与 ffmpeg，返回 (float32 数组 [帧, 声道], 采样率)。"""
+    errors = []
+    decoders = [read_wav]
+    soundfile = load_soundfile()
+    if soundfile is not None:
+        decoders.append(read_with_soundfile)
+    if ffmpeg_path():
+        decoders.append(lambda p: decode_with_ffmpeg(p, target_rate))
+    for decoder in decoders:
+        try:
+            return decoder(path)
+        except UnsupportedAudioError as e:
+            errors.append(str(e))
+    if soundfile is None and not ffmpeg_path():
+        errors.append("neither soundfile nor ffmpeg is available")
+    raise UnsupportedAudioError("; ".join(errors))
+
+
+def remove_outputs(*paths):
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+def normalize_audio(src_path: str, target_rate: int = 16000, trim_silence: bool = True,
+                    threshold_db: float = -35.0, encoding: str = "wav", output_dir: str = None) -> NormalizedAudio:
+    """把 src_path 归一化为 output_dir (缺省为系统临时目录) 下唯一命名的 .wav / .flac 文件。
+
+    输出从不写在源文件旁边：源目录可能只读 (如导入参考句)，遗留的输出也会被当作新的音频文件。
+    无法处理 (缺少 numpy、无法解码、无法写入输出) 或归一化后反而更大且几乎没有裁剪时，返回原文件
+    (skipped_reason 说明原因)。调用方负责在转录后删除 path != src_path 的输出文件。
+    """
+    source_bytes = os.path.getsize(src_path)
+    skipped = NormalizedAudio(path=src_path, source_bytes=source_bytes, output_bytes=source_bytes)
+    if load_numpy() is None:
+        skipped.skipped_reason = "numpy is not installed"
+        return skipped
+
+    try:
+        samples, rate = decode_audio(src_path, target_rate)
+    except UnsupportedAudioError as e:
+        skipped.skipped_reason = str(e)
+        return skipped
+
+    signal = resample(to_mono(samples), rate, target_rate)
+    source_duration_ms = int(len(signal) * 1000 / target_rate)
+    start, end = find_speech_bounds(signal, target_rate, threshold_db=threshold_db) if trim_silence else (0, len(signal))
+    signal = signal[start:end]
+    output_duration_ms = int(len(signal) * 1000 / target_rate)
+
+    prefix = f"{os.path.splitext(os.path.basename(src_path))[0]}_norm_"
+    wav_path = flac_path = None
+    try:
+        os.makedirs(output_dir or tempfile.gettempdir(), exist_ok=True)
+        fd, wav_path = tempfile.mkstemp(prefix=prefix, suffix=".wav", dir=output_dir)
+        os.close(fd)
+        write_wav(wav_path, signal, target_rate)
+        output_path = wav_path
+        if encoding == "flac":
+            if load_soundfile() is not None or ffmpeg_path():
+                fd, flac_path = tempfile.mkstemp(prefix=prefix, suffix=".flac", dir=output_dir)
+                os.close(fd)
+                try:
+                    encode_flac(wav_path, flac_path, signal, target_rate)
+                    os.remove(wav_path)
+                    output_path = flac_path
+                except (subprocess.CalledProcessError, RuntimeError) as e:
+                    logging.warning(f"FLAC 编码失败，改用 WAV: {e}")
+                    os.remove(flac_path)
+            else:
+                logging.debug("soundfile 与 ffmpeg 均不可用，归一化音频以 WAV 保存。")
+        output_bytes = os.path.getsize(output_path)
+    except OSError as e:
+        remove_outputs(wav_path, flac_path)
+        skipped.skipped_reason = f"cannot write normalized audio: {e}"
+        return skipped
+    except BaseException:
+        remove_outputs(wav_path, flac_path)
+        raise
+
+    trimmed_ms = source_duration_ms - output_duration_ms
+    # 已压缩的输入 (MP3 等) 解码为 PCM 后可能更大；几乎没有静音可裁时保留原文件
+    if output_bytes >= source_bytes and trimmed_ms < source_duration_ms * 0.1:
+        os.remove(output_path)
+        skipped.skipped_reason = "normalized audio would not be smaller"
+        skipped.source_duration_ms = skipped.output_duration_ms = source_duration_ms
+        return skipped
+    return NormalizedAudio(
+        path=output_path,
+        offset_ms=int(round(start * 1000 / target_rate)),
+        source_bytes=source_bytes,
+        output_bytes=output_bytes,
+        source_duration_ms=source_duration_ms,
+        output_duration_ms=output_duration_ms,
+    )
+
+
+def shift_word_timestamps(asr_data: dict, offset_ms: int) -> dict:
+    """把基于裁剪后音频的词级时间戳移回原音频的时间轴。"""
+    if not offset_ms:
+        return asr_data
+    words = [dict(word, start=word["start"] + offset_ms, end=word["end"] + offset_ms) for word in asr_data.get("words") or []]
+    return dict(asr_data, words=words)
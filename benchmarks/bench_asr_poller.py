@@ -0,0 +1,107 @@
+# benchmarks/bench_asr_poller.py (线程内同步转录与集中轮询的并发对比)
+#
+# 同时发起 N 个转录，处理时长由替身按 --asr-latency 采样，两种模式都经 main.run_asr 调用
+# (即经过 main.asr_scheduler 的限速与 ASR_MAX_IN_FLIGHT)，比较两种等待方式：
+#   thread: clients 中只有 FakeTranscriber，transcribe 在默认线程池中同步等待 (与 SDK 的 transcribe 相同)，
+#           线程池大小由 --threads 指定，模拟容器中的默认线程池；等待期间占用调度器名额
+#   poller: transcript_service 为经 httpx.ASGITransport 调用 create_fake_assemblyai_app 的
+#           AssemblyAITranscriptService，只有提交经过调度器，所有 transcript ID 由 transcript_poller 集中轮询
+# 输出总耗时、单个转录的耗时分位数、峰值线程数，以及 poller 的查询轮数与状态查询次数。
+# 调度器参数取 main 的配置 (ASR_RATE_PER_SECOND / ASR_BURST / ASR_MAX_IN_FLIGHT 环境变量)。
+#
+# 用法 (在仓库根目录):
+#     python -m benchmarks.bench_asr_poller --jobs 64 --threads 8 --asr-latency 3
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from asr_poller import AssemblyAITranscriptService, TranscriptPoller
+from benchmarks.bench_e2e import load_fixtures, percentiles
+from benchmarks.fake_providers import FakeTranscriber, FaultProfile, create_fake_assemblyai_app
+from provider_scheduler import ProviderScheduler
+
+
+async def sample_threads(stop: asyncio.Event, peak: list):
+    while not stop.is_set():
+        peak[0] = max(peak[0], threading.active_count())
+        await asyncio.sleep(0.05)
+
+
+async def run_mode(main, mode: str, args, paths: list) -> dict:
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=args.threads))
+    profile = FaultProfile(latency_mean=args.asr_latency, latency_jitter=args.asr_latency / 4)
+    # 每种模式使用全新的调度器与轮询器，避免前一模式的令牌桶与事件循环状态影响结果
+    main.asr_scheduler = ProviderScheduler(
+        "assemblyai", rate_per_second=main.ASR_RATE_PER_SECOND, burst=main.ASR_BURST,
+        max_in_flight=main.ASR_MAX_IN_FLIGHT, max_retries=main.PROVIDER_MAX_RETRIES,
+    )
+    main.transcript_poller = poller = TranscriptPoller(
+        lambda: main.clients.get("transcript_service"), initial_interval=args.poll_initial, max_interval=args.poll_max,
+    )
+    service = app = None
+    main.clients.set("transcriber", FakeTranscriber(profile, seed=args.seed))
+    if mode == "poller":
+        app = create_fake_assemblyai_app(profile, seed=args.seed)
+        service = AssemblyAITranscriptService("fake-key", base_url="http://fake-assemblyai",
+                                              transport=httpx.ASGITransport(app=app))
+    main.clients.set("transcript_service", service)
+
+    latencies = []
+
+    async def one(index: int, path: str):
+        started = time.perf_counter()
+        await main.run_asr(path, f"[bench/{index}]")
+        latencies.append(time.perf_counter() - started)
+
+    stop, peak = asyncio.Event(), [threading.active_count()]
+    sampler = asyncio.create_task(sample_threads(stop, peak))
+    started = time.perf_counter()
+    await asyncio.gather(*[one(i, paths[i % len(paths)]) for i in range(args.jobs)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+
+    result = {"mode": mode, "wall_seconds": round(elapsed, 3), "latency_seconds": percentiles(latencies), "peak_threads": peak[0]}
+    if service is not None:
+        result.update(poll_rounds=poller.poll_rounds, status_checks=poller.status_checks,
+                      status_requests=app.state.stats["status_requests"])
+        await poller.close()
+        await service.aclose()
+    return result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="对比线程内同步转录与单个轮询循环在高并发下的耗时。")
+    parser.add_argument("--jobs", type=int, default=64, help="同时发起的转录数")
+    parser.add_argument("--threads", type=int, default=8, help="默认线程池大小")
+    parser.add_argument("--asr-latency", type=float, default=3.0, help="替身转录平均处理时长 (秒)")
+    parser.add_argument("--poll-initial", type=float, default=0.5)
+    parser.add_argument("--poll-max", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    import main
+
+    paths = [practice for _, practice, _ in load_fixtures()] + [original for _, _, original in load_fixtures()]
+    results = [asyncio.run(run_mode(main, mode, args, paths)) for mode in ("thread", "poller")]
+    if args.json:
+        print(json.dumps({"params": vars(args), "results": results}, indent=2, ensure_ascii=False))
+        return
+    for r in results:
+        line = (f"{r['mode']:>6}: 总耗时 {r['wall_seconds']:6.2f}s  单个 p50 {r['latency_seconds']['p50']:.2f}s "
+                f"p99 {r['latency_seconds']['p99']:.2f}s  峰值线程 {r['peak_threads']}")
+        if "poll_rounds" in r:
+            line += f"  轮询 {r['poll_rounds']} 轮 / {r['status_checks']} 次状态查询"
+        print(line)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,85 @@
+# benchmarks/bench_audio_normalize.py (音频归一化的体积与耗时)
+#
+# 1) 合成客户端常见的输入：44.1/48 kHz 立体声 16-bit PCM WAV，首尾带静音、中间是带音节包络的
+#    谐波信号，统计归一化前后的字节数、时长、开头偏移 (与已知静音时长对照) 以及处理耗时。
+# 2) 对 sample_audio/ 中的样例逐个执行归一化：样例是 MP3 编码，由 soundfile (libsndfile) 离线解码；
+#    归一化后不比原 MP3 更小且几乎没有静音可裁的文件按设计保留原文件。
+#
+# 用法 (在仓库根目录):
+#     python -m benchmarks.bench_audio_normalize --encoding wav
+
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+import audio_normalize
+from audio_normalize import ffmpeg_path, normalize_audio
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_audio")
+
+
+def synthesize(path: str, rate: int, lead_s: float, speech_s: float, tail_s: float, seed: int = 1):
+    """首尾为 -70 dBFS 底噪，中间为 4 Hz 音节包络调制的谐波 (基频 140 Hz) 加少量噪声的立体声 WAV。"""
+    rng = np.random.default_rng(seed)
+    n_lead, n_speech, n_tail = int(lead_s * rate), int(speech_s * rate), int(tail_s * rate)
+    t = np.arange(n_speech) / rate
+    voice = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 0.5
+    speech = 0.3 * voice * envelope + 0.01 * rng.standard_normal(n_speech)
+    signal = np.concatenate([np.zeros(n_lead), speech, np.zeros(n_tail)])
+    signal += 10 ** (-70 / 20) * rng.standard_normal(len(signal))
+    stereo = np.stack([signal, signal * 0.9], axis=1)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes((np.clip(stereo, -1, 1) * 32767).astype("<i2").tobytes())
+
+
+def report(label: str, src_path: str, args, output_dir: str, expected_offset_ms: int = None):
+    started = time.perf_counter()
+    result = normalize_audio(src_path, args.target_rate, True, args.threshold_db, args.encoding, output_dir)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if not result.normalized:
+        print(f"{label:<28} skipped ({result.skipped_reason})  {elapsed_ms:.1f} ms")
+        return
+    line = (f"{label:<28} {result.source_bytes / 1024:8.1f} KB → {result.output_bytes / 1024:7.1f} KB "
+            f"({result.source_bytes / result.output_bytes:4.1f}x)  {result.source_duration_ms / 1000:5.2f}s → "
+            f"{result.output_duration_ms / 1000:5.2f}s  offset {result.offset_ms} ms")
+    if expected_offset_ms is not None:
+        line += f" (静音 {expected_offset_ms} ms)"
+    print(line + f"  {elapsed_ms:.1f} ms")
+    os.remove(result.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量音频归一化的体积缩减与处理耗时。")
+    parser.add_argument("--target-rate", type=int, default=16000)
+    parser.add_argument("--threshold-db", type=float, default=-35.0)
+    parser.add_argument("--encoding", choices=("wav", "flac"), default="wav")
+    args = parser.parse_args()
+
+    soundfile = audio_normalize.load_soundfile()
+    print(f"soundfile: {f'{soundfile.__version__} (libsndfile {soundfile.__libsndfile_version__})' if soundfile else '未安装'}  "
+          f"ffmpeg: {ffmpeg_path() or '未安装'}")
+    workdir = tempfile.mkdtemp(prefix="retelling_norm_")
+    try:
+        for rate, lead, speech, tail in ((48000, 1.5, 6.0, 2.0), (44100, 0.8, 4.0, 3.0), (48000, 0.0, 8.0, 0.0)):
+            path = os.path.join(workdir, f"synthetic_{rate}_{lead}_{tail}.wav")
+            synthesize(path, rate, lead, speech, tail)
+            report(f"synthetic {rate} Hz stereo", path, args, workdir, expected_offset_ms=int(lead * 1000))
+        for src in sorted(glob.glob(os.path.join(SAMPLE_DIR, "*.wav"))):
+            # 输出写入 workdir，sample_audio/ 保持不变
+            report(os.path.basename(src), src, args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
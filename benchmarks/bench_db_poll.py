@@ -0,0 +1,136 @@
+# benchmarks/bench_db_poll.py (状态轮询 QPS 微基准)
+#
+# 模拟 /get-single-card-result 的轮询读取与后台任务的状态写入同时进行，对比：
+#   baseline : 每次操作都 sqlite3.connect，默认回滚日志，在事件循环线程上同步执行
+#   db       : 共享的 db.Database (WAL、长连接复用、专用线程池)
+#
+# 用法 (在仓库根目录):
+#     python -m benchmarks.bench_db_poll --seconds 5 --pollers 32
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from db import Database
+
+SCHEMA = """
+    CREATE TABLE jobs (
+        round_id TEXT, card_id TEXT, status TEXT,
+        result TEXT, error_message TEXT,
+        PRIMARY KEY (round_id, card_id)
+    )"""
+POLL_SQL = "SELECT round_id, card_id, status, result, error_message FROM jobs WHERE round_id = ? AND card_id = ?"
+WRITE_SQL = "UPDATE jobs SET status = ?, result = ? WHERE round_id = ? AND card_id = ?"
+STATUSES = ("PENDING", "PROCESSING", "COMPLETED")
+
+
+def create_db(path: str, jobs: int):
+    with sqlite3.connect(path) as conn:
+        conn.execute(SCHEMA)
+        conn.executemany(
+            "INSERT INTO jobs (round_id, card_id, status) VALUES (?, ?, ?)",
+            [(f"round_{i // 10}", f"card_{i % 10}", "PENDING") for i in range(jobs)],
+        )
+
+
+def writer_loop(write, jobs: int, stop: threading.Event, counter: list):
+    payload = "x" * 4000
+    i = 0
+    while not stop.is_set():
+        n = i % jobs
+        write(WRITE_SQL, (STATUSES[i % 3], payload, f"round_{n // 10}", f"card_{n % 10}"))
+        counter[0] += 1
+        i += 1
+
+
+async def run_mode(mode: str, seconds: float, pollers: int, writers: int, jobs: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    create_db(path, jobs)
+    database = Database(path) if mode == "db" else None
+
+    if mode == "baseline":
+        def baseline_write(sql, params):
+            with sqlite3.connect(path) as conn:
+                conn.execute(sql, params)
+
+        async def poll(params):
+            with sqlite3.connect(path) as conn:
+                conn.row_factory = sqlite3.Row
+                return conn.execute(POLL_SQL, params).fetchone()
+        write = baseline_write
+    else:
+        async def poll(params):
+            return await database.aquery_one(POLL_SQL, params)
+        write = database.execute
+
+    stop = threading.Event()
+    writes = [0]
+    threads = [threading.Thread(target=writer_loop, args=(write, jobs, stop, writes), daemon=True) for _ in range(writers)]
+    for t in threads:
+        t.start()
+
+    latencies = []
+    deadline = time.perf_counter() + seconds
+
+    async def poller(index: int):
+        i = index
+        while time.perf_counter() < deadline:
+            n = i % jobs
+            started = time.perf_counter()
+            await poll((f"round_{n // 10}", f"card_{n % 10}"))
+            latencies.append(time.perf_counter() - started)
+            i += pollers
+            await asyncio.sleep(0)
+
+    # 事件循环延迟：定时器实际唤醒时间与预期时间之差
+    loop_lag = []
+
+    async def lag_probe():
+        while time.perf_counter() < deadline:
+            expected = time.perf_counter() + 0.01
+            await asyncio.sleep(0.01)
+            loop_lag.append(max(0.0, time.perf_counter() - expected))
+
+    started = time.perf_counter()
+    await asyncio.gather(lag_probe(), *[poller(i) for i in range(pollers)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for t in threads:
+        t.join()
+    if database:
+        database.close()
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "poll_qps": len(latencies) / elapsed,
+        "poll_p50_ms": statistics.median(latencies) * 1000,
+        "poll_p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "writes_per_sec": writes[0] / elapsed,
+        "loop_lag_max_ms": max(loop_lag, default=0.0) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比 jobs 表状态轮询在两种数据库访问方式下的吞吐。")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--pollers", type=int, default=32, help="并发轮询协程数")
+    parser.add_argument("--writers", type=int, default=2, help="并发写入线程数")
+    parser.add_argument("--jobs", type=int, default=1000)
+    args = parser.parse_args()
+
+    for mode in ("baseline", "db"):
+        r = asyncio.run(run_mode(mode, args.seconds, args.pollers, args.writers, args.jobs))
+        print(
+            f"{r['mode']:>8}: poll {r['poll_qps']:8.0f} QPS  p50 {r['poll_p50_ms']:6.2f} ms  "
+            f"p99 {r['poll_p99_ms']:7.2f} ms  writes {r['writes_per_sec']:6.0f}/s  loop lag max {r['loop_lag_max_ms']:7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# benchmarks/bench_e2e.py (离线端到端基准)
+#
+# 用 benchmarks/fake_providers.py 中的本地替身替换 clients 中的 transcriber 与 gemini，
+# 在进程内驱动 FastAPI app (httpx.ASGITransport + app lifespan)，以 sample_audio/ 中的
+# 样例音频模拟 N 个轮次并发提交，统计：
+#   - 提交延迟 (每个 HTTP 提交请求)
+#   - 提交到 COMPLETED/FAILED 的耗时分位数 (通过进程内事件广播精确计时)
+#   - 吞吐 (jobs/sec) 与峰值 RSS
+# 结果以 JSON 输出，便于在不同提交之间对比回归。
+#
+# 用法 (在仓库根目录):
+#     python -m benchmarks.bench_e2e --rounds 20 --concurrency 10 --output bench_e2e.json
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import time
+
+import httpx
+
+from asr_poller import AssemblyAITranscriptService
+from benchmarks.fake_providers import FakeGeminiClient, FakeTranscriber, FaultProfile, create_fake_assemblyai_app
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_audio")
+TERMINAL_STATUSES = ("COMPLETED", "FAILED")
+
+
+def load_fixtures() -> list:
+    fixtures = []
+    index = 1
+    while os.path.exists(os.path.join(SAMPLE_DIR, f"original_{index}.wav")):
+        fixtures.append((
+            f"card_{index:02d}",
+            os.path.join(SAMPLE_DIR, f"practice_{index}.wav"),
+            os.path.join(SAMPLE_DIR, f"original_{index}.wav"),
+        ))
+        index += 1
+    return fixtures
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+    return {"p50": pick(0.50), "p90": pick(0.90), "p99": pick(0.99), "max": round(ordered[-1], 4),
+            "mean": round(statistics.fmean(ordered), 4)}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def peak_rss_mb() -> float:
+    # Linux 上 ru_maxrss 单位为 KB，macOS 上为字节
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024) if platform.system() == "Darwin" else rss / 1024, 1)
+
+
+async def run_round(client: httpx.AsyncClient, main, round_id: str, fixtures: list, batch: bool, stats: dict):
+    queue = main.round_events.subscribe(round_id)
+    submitted_at = {}
+    try:
+        if batch:
+            manifest, files = [], []
+            for card_id, practice_path, original_path in fixtures:
+                manifest.append({"card_id": card_id, "practice_audio": f"{card_id}_p", "original_audio": f"{card_id}_o"})
+                files.append((f"{card_id}_p", open(practice_path, "rb")))
+                files.append((f"{card_id}_o", open(original_path, "rb")))
+            started = time.perf_counter()
+            try:
+                response = await client.post("/evaluate-round", data={"round_id": round_id, "manifest": json.dumps(manifest)}, files=files)
+            finally:
+                for _, f in files:
+                    f.close()
+            stats["submit_latency"].append(time.perf_counter() - started)
+            for card in response.json()["cards"]:
+                if card["status"] == "accepted":
+                    submitted_at[card["card_id"]] = started
+                else:
+                    stats["submit_errors"] += 1
+        else:
+            for card_id, practice_path, original_path in fixtures:
+                with open(practice_path, "rb") as p, open(original_path, "rb") as o:
+                    started = time.perf_counter()
+                    response = await client.post(
+                        "/evaluate-single-card",
+                        data={"round_id": round_id, "card_id": card_id},
+                        files={"practice_audio": p, "original_audio": o},
+                    )
+                stats["submit_latency"].append(time.perf_counter() - started)
+                if response.status_code == 202:
+                    submitted_at[card_id] = started
+                else:
+                    stats["submit_errors"] += 1
+
+        pending = set(submitted_at)
+        while pending:
+            event = await queue.get()
+            if event["card_id"] in pending and event["status"] in TERMINAL_STATUSES:
+                pending.discard(event["card_id"])
+                stats["time_to_done"].append(time.perf_counter() - submitted_at[event["card_id"]])
+                stats["completed" if event["status"] == "COMPLETED" else "failed"] += 1
+    finally:
+        main.round_events.unsubscribe(round_id, queue)
+
+
+async def run_benchmark(args) -> dict:
+    import main
+
+    asr_profile = FaultProfile(
+        latency_mean=args.asr_latency, latency_jitter=args.asr_latency / 4,
+        rate_limit_probability=args.rate_limit_probability, server_error_probability=args.error_probability,
+    )
+    fake_assemblyai = None
+    if args.asr_mode == "poller":
+        # 异步提交 + 单个轮询循环，经 ASGI 替身走真实的 REST 客户端代码
+        fake_assemblyai = create_fake_assemblyai_app(asr_profile, seed=args.seed)
+        main.clients.set("transcript_service", AssemblyAITranscriptService(
+            "fake-key", base_url="http://fake-assemblyai", transport=httpx.ASGITransport(app=fake_assemblyai)))
+        main.transcript_poller.initial_interval = args.poll_initial
+        main.transcript_poller.max_interval = args.poll_max
+    else:
+        main.clients.set("transcript_service", None)
+        main.clients.set("transcriber", FakeTranscriber(asr_profile, seed=args.seed))
+    main.clients.set("gemini", FakeGeminiClient(FaultProfile(
+        latency_mean=args.gemini_latency, latency_jitter=args.gemini_latency / 4,
+        rate_limit_probability=args.rate_limit_probability, server_error_probability=args.error_probability,
+    ), seed=args.seed))
+
+    fixtures = load_fixtures()
+    stats = {"submit_latency": [], "time_to_done": [], "completed": 0, "failed": 0, "submit_errors": 0}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(client, index):
+        async with semaphore:
+            await run_round(client, main, f"bench_round_{index:05d}", fixtures, args.batch, stats)
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            started = time.perf_counter()
+            await asyncio.wait_for(asyncio.gather(*[limited(client, i) for i in range(args.rounds)]), args.timeout)
+            elapsed = time.perf_counter() - started
+
+    jobs_done = stats["completed"] + stats["failed"]
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": vars(args),
+        "rounds": args.rounds,
+        "cards_per_round": len(fixtures),
+        "jobs_completed": stats["completed"],
+        "jobs_failed": stats["failed"],
+        "submit_errors": stats["submit_errors"],
+        "wall_seconds": round(elapsed, 3),
+        "jobs_per_second": round(jobs_done / elapsed, 3) if elapsed else None,
+        "submit_latency_seconds": percentiles(stats["submit_latency"]),
+        "time_to_completed_seconds": percentiles(stats["time_to_done"]),
+        "peak_rss_mb": peak_rss_mb(),
+        "providers": {
+            "assemblyai": main.asr_scheduler.snapshot(),
+            "gemini": main.gemini_scheduler.snapshot(),
+        },
+        "asr_poller": {
+            "submitted": main.transcript_poller.submitted,
+            "poll_rounds": main.transcript_poller.poll_rounds,
+            "status_checks": main.transcript_poller.status_checks,
+        } if fake_assemblyai is not None else None,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="使用本地替身的离线端到端吞吐/延迟基准。")
+    parser.add_argument("--rounds", type=int, default=20, help="提交的轮次数")
+    parser.add_argument("--concurrency", type=int, default=10, help="同时进行中的轮次数")
+    parser.add_argument("--batch", action="store_true", help="使用 /evaluate-round 整轮提交")
+    parser.add_argument("--workers", type=int, default=4, help="JOB_WORKER_CONCURRENCY")
+    parser.add_argument("--asr-latency", type=float, default=0.5, help="ASR 替身平均延迟 (秒)")
+    parser.add_argument("--gemini-latency", type=float, default=1.0, help="Gemini 替身平均延迟 (秒)")
+    parser.add_argument("--asr-mode", choices=("thread", "poller"), default="thread",
+                        help="thread: SDK 同步转录 (每次占用一个线程)；poller: 异步提交 + 集中轮询")
+    parser.add_argument("--poll-initial", type=float, default=0.25, help="poller 模式的首次轮询间隔 (秒)")
+    parser.add_argument("--poll-max", type=float, default=2.0, help="poller 模式的最大轮询间隔 (秒)")
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0)
+    parser.add_argument("--error-probability", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--output", help="结果 JSON 文件路径 (默认输出到标准输出)")
+    args = parser.parse_args()
+
+    # main 在导入时读取配置，因此先准备隔离的数据库与临时目录
+    workdir = tempfile.mkdtemp(prefix="retelling_bench_")
+    os.environ["DB_FILE"] = os.path.join(workdir, "bench_jobs.db")
+    os.environ["TEMP_AUDIO_DIR"] = os.path.join(workdir, "temp_audio")
+    os.environ["JOB_WORKER_CONCURRENCY"] = str(args.workers)
+    os.environ.setdefault("PROVIDER_MAX_RETRIES", "6")
+
+    result = asyncio.run(run_benchmark(args))
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"结果已写入 {args.output}")
+    print(output if not args.output else
+          f"{result['jobs_completed']} 完成 / {result['jobs_failed']} 失败, {result['jobs_per_second']} jobs/s, "
+          f"time-to-completed p50 {result['time_to_completed_seconds'].get('p50')}s "
+          f"p99 {result['time_to_completed_seconds'].get('p99')}s, 峰值 RSS {result['peak_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    main_cli()
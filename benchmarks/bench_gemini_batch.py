@@ -0,0 +1,145 @@
+# benchmarks/bench_gemini_batch.py (逐张评测与同轮次微批评测的 token 与耗时对比)
+#
+# 生成 --rounds 个轮次、每轮 --cards 张卡片的 ASR 数据 (fake_asr_words)，各卡片在 --arrival-spread 秒内
+# 随机到达，用 FakeGeminiClient 替换 clients 中的 gemini (延迟随输入字符数增长)，分别测量：
+#   single: 每张卡片调用一次 request_card_report (GEMINI_BATCH_WINDOW_SECONDS=0 时的路径)
+#   batch : 经 card_batcher 按轮次合并，窗口为 --window 秒，每批最多 --max-cards 张
+# 两种模式都经过 main.gemini_scheduler (同样的限速与并发上限)。输出调用次数、输入/输出 token
+# (bench_prompt_tokens 中的本地估算)、总耗时与单张卡片从到达到拿到报告的耗时分位数。
+# --malformed-rate 让一部分批量调用返回无法解析的内容，用于观察退回单卡调用的开销。
+#
+# 用法 (在仓库根目录):
+#     python -m benchmarks.bench_gemini_batch --rounds 10 --cards 6 --window 0.5 --max-cards 8
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmarks.bench_e2e import percentiles
+from benchmarks.bench_prompt_tokens import estimate_tokens
+from benchmarks.fake_providers import BATCH_CARD_HEADER, FakeGeminiClient, FaultProfile, fake_asr_words, fake_report
+
+
+class TokenRecorder:
+    """包装 fake_report，统计调用次数与输入/输出 token；可按概率让批量调用返回无法解析的内容。"""
+
+    def __init__(self, malformed_rate: float = 0.0, seed: int = None):
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        self.calls = self.batch_calls = self.input_tokens = self.output_tokens = 0
+
+    def __call__(self, contents: str):
+        self.calls += 1
+        self.input_tokens += estimate_tokens(contents)
+        is_batch = BATCH_CARD_HEADER.search(contents) is not None
+        self.batch_calls += is_batch
+        if is_batch and self.rng.random() < self.malformed_rate:
+            payload = "抱歉，无法按要求输出。"
+        else:
+            payload = fake_report(contents)
+        self.output_tokens += estimate_tokens(json.dumps(payload, ensure_ascii=False))
+        return payload
+
+
+def asr_data(seed_bytes: bytes, practice: bool) -> dict:
+    text, words = fake_asr_words(seed_bytes, practice)
+    return {"text": text, "words": [word.dict() for word in words]}
+
+
+def build_cards(args) -> list:
+    rng = random.Random(args.seed)
+    cards = []
+    for r in range(args.rounds):
+        for c in range(args.cards):
+            seed_bytes = f"bench_round_{r:03d}/card_{c:02d}".encode("utf-8")
+            cards.append((rng.uniform(0, args.arrival_spread), f"bench_round_{r:03d}", f"card_{c:02d}",
+                          asr_data(seed_bytes, False), asr_data(seed_bytes, True)))
+    return cards
+
+
+async def run_mode(main, mode: str, args, cards: list) -> dict:
+    from metrics import StageTimings
+    from provider_scheduler import ProviderScheduler
+
+    recorder = TokenRecorder(args.malformed_rate, seed=args.seed)
+    main.clients.set("gemini", FakeGeminiClient(
+        FaultProfile(latency_mean=args.gemini_latency, latency_jitter=0.2, latency_per_kchar=args.latency_per_kchar),
+        seed=args.seed, respond=recorder,
+    ))
+    # 每种模式使用全新的令牌桶，避免前一模式消耗的令牌影响结果
+    main.gemini_scheduler = ProviderScheduler(
+        "gemini", rate_per_second=main.GEMINI_RATE_PER_SECOND, burst=main.GEMINI_BURST,
+        max_in_flight=main.GEMINI_MAX_IN_FLIGHT, max_retries=main.PROVIDER_MAX_RETRIES,
+    )
+    batcher = main.card_batcher
+    batcher.window_seconds, batcher.max_cards = args.window, args.max_cards
+    latencies, failures = [], 0
+
+    async def one(delay, round_id, card_id, original, practice):
+        nonlocal failures
+        await asyncio.sleep(delay)
+        arrived = time.perf_counter()
+        timings = StageTimings("bench")
+        try:
+            if mode == "batch":
+                await batcher.evaluate(round_id, card_id, original, practice, timings)
+            else:
+                await main.request_card_report(round_id, card_id, original, practice, timings)
+        except Exception:
+            failures += 1
+            return
+        latencies.append(time.perf_counter() - arrived)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(*card) for card in cards])
+    result = {
+        "mode": mode,
+        "cards": len(cards),
+        "failed": failures,
+        "gemini_calls": recorder.calls,
+        "input_tokens": recorder.input_tokens,
+        "output_tokens": recorder.output_tokens,
+        "total_tokens": recorder.input_tokens + recorder.output_tokens,
+        "wall_seconds": round(time.perf_counter() - started, 3),
+        "card_latency_seconds": percentiles(latencies),
+    }
+    if mode == "batch":
+        result.update(batch_calls=batcher.batch_calls, batched_cards=batcher.batched_cards,
+                      single_calls=batcher.single_calls, fallback_cards=batcher.fallback_cards)
+    return result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="对比逐张评测与同轮次微批评测的 token 数与耗时。")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--cards", type=int, default=6, help="每轮卡片数")
+    parser.add_argument("--arrival-spread", type=float, default=1.0, help="同一轮次卡片的到达时间分布范围 (秒)")
+    parser.add_argument("--window", type=float, default=0.5, help="微批收集窗口 (秒)")
+    parser.add_argument("--max-cards", type=int, default=8, help="每批最多卡片数")
+    parser.add_argument("--gemini-latency", type=float, default=2.0, help="Gemini 替身的基础延迟 (秒)")
+    parser.add_argument("--latency-per-kchar", type=float, default=0.05, help="每千字符输入额外增加的延迟 (秒)")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="批量调用返回无法解析内容的概率")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    import main
+
+    cards = build_cards(args)
+    results = [asyncio.run(run_mode(main, mode, args, cards)) for mode in ("single", "batch")]
+    if args.json:
+        print(json.dumps({"params": vars(args), "results": results}, indent=2, ensure_ascii=False))
+        return
+    for r in results:
+        line = (f"{r['mode']:>6}: {r['gemini_calls']:4d} 次调用  token 输入 {r['input_tokens']:7d} / 输出 {r['output_tokens']:6d} "
+                f"(合计 {r['total_tokens']})  总耗时 {r['wall_seconds']:6.2f}s  单张 p50 {r['card_latency_seconds']['p50']:.2f}s "
+                f"p99 {r['card_latency_seconds']['p99']:.2f}s  失败 {r['failed']}")
+        if r["mode"] == "batch":
+            line += f"  (批量 {r['batch_calls']} 次 / {r['batched_cards']} 张，退回单卡 {r['fallback_cards']} 张)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main_cli()
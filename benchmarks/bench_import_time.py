@@ -0,0 +1,112 @@
+# benchmarks/bench_import_time.py (冷启动导入耗时)
+#
+# 在全新的子进程中以 `python -X importtime -c "import main"` 导入服务模块 (使用临时数据库路径，
+# 不读写真实数据库)，解析 stderr 中的 importtime 输出，统计：
+#   - main 的累计导入耗时 (多次运行取中位数) 与子进程总耗时
+#   - main 直接导入的模块中累计耗时最高的若干项
+#   - 导入后是否已经加载了应当延迟导入的模块：第三方 SDK (assemblyai / google.genai，客户端在首次使用时创建)
+#     与 numpy / soundfile (在首次本地评分或音频归一化时导入)，用于防止回归到导入时即加载
+#
+# 用法 (在仓库根目录):
+#     python -m benchmarks.bench_import_time --runs 5 [--module main] [--output import_time.json]
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+# 导入 main 时不应加载的模块
+LAZY_MODULES = ("assemblyai", "google.genai", "numpy", "soundfile")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str) -> list:
+    """返回 [(模块名, 自身微秒, 累计微秒, 缩进层级)]，顺序与 importtime 输出一致 (子模块在父模块之前)。"""
+    entries = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def direct_imports(entries: list, module: str) -> list:
+    """module 直接导入的模块 (比 module 深一层的条目)。"""
+    for position, (name, _, _, level) in enumerate(entries):
+        if name == module:
+            children, index = [], position - 1
+            while index >= 0 and entries[index][3] > level:
+                if entries[index][3] == level + 1:
+                    children.append(entries[index])
+                index -= 1
+            return children
+    return []
+
+
+def run_once(module: str, workdir: str) -> dict:
+    env = dict(os.environ, DB_FILE=os.path.join(workdir, "import_bench.db"), TEMP_AUDIO_DIR=os.path.join(workdir, "temp_audio"))
+    probe = f"import sys, {module}; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - started
+    entries = parse_importtime(result.stderr)
+    total_us = next((cumulative for name, _, cumulative, _ in entries if name == module), 0)
+    return {
+        "wall_seconds": wall,
+        "import_seconds": total_us / 1e6,
+        "children": direct_imports(entries, module),
+        "lazy_loaded": [name for name in result.stdout.strip().split(",") if name],
+        "db_created": os.path.exists(os.path.join(workdir, "import_bench.db")),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="用 -X importtime 测量导入服务模块的冷启动耗时。")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="列出累计耗时最高的直接导入模块数")
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory(prefix="retelling_import_") as workdir:
+            runs.append(run_once(args.module, workdir))
+
+    # 各模块取多次运行的中位数
+    per_module = {}
+    for run in runs:
+        for name, _, cumulative_us, _ in run["children"]:
+            per_module.setdefault(name, []).append(cumulative_us / 1e6)
+    top = sorted(((name, statistics.median(values)) for name, values in per_module.items()), key=lambda item: -item[1])[:args.top]
+    result = {
+        "module": args.module,
+        "runs": args.runs,
+        "import_seconds_median": round(statistics.median(run["import_seconds"] for run in runs), 4),
+        "wall_seconds_median": round(statistics.median(run["wall_seconds"] for run in runs), 4),
+        "lazy_modules_loaded_at_import": sorted({name for run in runs for name in run["lazy_loaded"]}),
+        "db_touched_at_import": any(run["db_created"] for run in runs),
+        "top_direct_imports": [{"module": name, "seconds": round(seconds, 4)} for name, seconds in top],
+    }
+
+    print(f"import {args.module}: {result['import_seconds_median'] * 1000:.0f} ms (importtime 中位数)，"
+          f"子进程总耗时 {result['wall_seconds_median'] * 1000:.0f} ms")
+    print(f"导入时已加载的延迟导入模块: {', '.join(result['lazy_modules_loaded_at_import']) or '无'}；"
+          f"导入时创建了数据库文件: {'是' if result['db_touched_at_import'] else '否'}")
+    for item in result["top_direct_imports"]:
+        print(f"  {item['seconds'] * 1000:8.1f} ms  {item['module']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main_cli()
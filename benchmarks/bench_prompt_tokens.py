@@ -0,0 +1,119 @@
+# benchmarks/bench_prompt_tokens.py (单卡 Prompt 编码方式的 token 对比)
+#
+# 对 sample_audio/ 中的每组 original_N / practice_N，分别用 json 与 table 两种 ASR
+# 编码构建单卡评测 Prompt，并比较其 token 数。
+#
+# ASR 数据来源：配置了 AssemblyAI 密钥时直接转录样例音频 (标准音频走转录缓存)；
+# 否则使用数据库中 test_client.py 演示轮次 (card_0N) 最近一次保存的 source_data。
+# 数据库 (DB_FILE) 先复制到临时目录，建表迁移与转录缓存的写入都只发生在副本上。
+# token 数：配置了 Gemini 密钥时使用 models.count_tokens，否则使用本地估算。
+#
+# 用法 (在仓库根目录):
+#     python -m benchmarks.bench_prompt_tokens [--json]
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+
+from prompt_encoding import ASR_ENCODINGS
+from result_store import load_card_result
+
+SAMPLE_DIR = "sample_audio"
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算：CJK 字符约 1 token/字，其余字符约 4 字符/token。"""
+    cjk = sum(1 for ch in text if "　" <= ch <= "鿿" or "＀" <= ch <= "￯")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def copy_database(source: str, workdir: str) -> str:
+    """用 SQLite 在线备份把数据库 (含 WAL 中尚未检查点的内容) 复制到 workdir，返回副本路径。"""
+    target = os.path.join(workdir, os.path.basename(source))
+    if os.path.exists(source):
+        src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+        dst = sqlite3.connect(target)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+    return target
+
+
+def count_tokens(main, prompt: str) -> tuple:
+    if main.clients.get("gemini"):
+        response = main.clients.get("gemini").models.count_tokens(model=main.GEMINI_MODEL_NAME, contents=prompt)
+        return response.total_tokens, "gemini"
+    return estimate_tokens(prompt), "estimate"
+
+
+def load_fixture_asr(main, index: int):
+    original_path = os.path.join(SAMPLE_DIR, f"original_{index}.wav")
+    practice_path = os.path.join(SAMPLE_DIR, f"practice_{index}.wav")
+    if main.clients.get("transcriber"):
+        original = asyncio.run(main.get_original_asr_data(original_path, f"[bench/{index}]"))
+        practice = main.transcribe_to_asr_data(practice_path)
+        return original, practice, "assemblyai"
+
+    row = main.db.query_one(
+        """SELECT round_id FROM jobs WHERE card_id = ? AND status = 'COMPLETED' AND source_data IS NOT NULL
+           ORDER BY rowid DESC LIMIT 1""",
+        (f"card_{index:02d}",),
+    )
+    if not row:
+        return None
+    job = load_card_result(main.db, row["round_id"], f"card_{index:02d}", include_source=True)
+    source_data = job["result"]["source_data"]
+    return source_data["original_asr"], source_data["practice_asr"], f"db:{row['round_id']}"
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="比较 json 与 table 两种 ASR 编码下单卡 Prompt 的 token 数。")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    # main 在导入时读取 DB_FILE，因此先把数据库复制到临时目录
+    workdir = tempfile.mkdtemp(prefix="retelling_prompt_tokens_")
+    os.environ["DB_FILE"] = copy_database(os.getenv("DB_FILE", "evaluation_jobs.db"), workdir)
+    os.environ["TEMP_AUDIO_DIR"] = os.path.join(workdir, "temp_audio")
+
+    import main
+
+    main.init_db()
+    results = []
+    index = 1
+    while os.path.exists(os.path.join(SAMPLE_DIR, f"original_{index}.wav")):
+        fixture = load_fixture_asr(main, index)
+        if fixture is None:
+            print(f"card_{index:02d}: 没有可用的 ASR 数据 (未配置 AssemblyAI 密钥且数据库中无记录)，跳过。")
+            index += 1
+            continue
+        original, practice, source = fixture
+        row = {"card": f"card_{index:02d}", "asr_source": source,
+               "words": len(original["words"]) + len(practice["words"])}
+        for encoding in ASR_ENCODINGS:
+            prompt = main.build_single_card_gemini_prompt(original, practice, encoding=encoding)
+            tokens, method = count_tokens(main, prompt)
+            row[f"{encoding}_chars"] = len(prompt)
+            row[f"{encoding}_tokens"] = tokens
+            row["token_method"] = method
+        row["token_reduction"] = 1 - row["table_tokens"] / row["json_tokens"]
+        results.append(row)
+        index += 1
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+    for row in results:
+        print(
+            f"{row['card']}: {row['words']:4d} words  json {row['json_tokens']:6d} tok  table {row['table_tokens']:6d} tok  "
+            f"-{row['token_reduction']:.0%}  ({row['token_method']}, {row['asr_source']})"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,103 @@
+# benchmarks/bench_round_summary.py (直接汇总与分层汇总的延迟对比)
+#
+# 为不同规模的轮次写入 N 张 COMPLETED 卡片 (报告由 fake_report 生成)，用 FakeGeminiClient 替换
+# clients 中的 gemini (延迟随输入字符数线性增长，模拟长 Prompt 的处理时间)，分别测量：
+#   cold       : 没有任何已存报告与摘要缓存时生成汇总的耗时
+#   incremental: 再完成一张 card_id 最大的卡片后刷新汇总的耗时
+#   out_of_order: 再完成一张 card_id 最小的卡片 (按 card_id 排序时位于最前) 后刷新汇总的耗时；
+#                分组按完成顺序划分，两种情况都只需重新生成最后一组
+#   digests    : 每次增量刷新重新生成的摘要数
+#   max_prompt : 本次汇总中最大的单个 Prompt 的字符数
+#
+# 用法 (在仓库根目录):
+#     python -m benchmarks.bench_round_summary --sizes 10 40 80 160 320
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.fake_providers import FakeGeminiClient, FaultProfile, fake_report
+
+
+class PromptSizeRecorder:
+    """包装 fake_report，记录最大的单个 Prompt。"""
+
+    def __init__(self):
+        self.max_chars = 0
+        self.digest_calls = 0
+
+    def __call__(self, contents: str) -> dict:
+        self.max_chars = max(self.max_chars, len(contents))
+        report = fake_report(contents)
+        self.digest_calls += "retelling_patterns" in report
+        return report
+
+
+def add_completed_card(main, round_id: str, index: int):
+    card_id = f"card_{index:04d}"
+    main.db.execute("INSERT INTO jobs (round_id, card_id, status) VALUES (?, ?, ?)", (round_id, card_id, "PENDING"))
+    report = fake_report(f"{round_id}/{card_id}")
+    report["meaning_fidelity"]["missing_details"] = [f"第 {index} 句中的时间状语。"]
+    main.save_completed_result(main.db, round_id, card_id, report, {"text": "", "words": []}, {"text": "", "words": []})
+
+
+async def measure(main, recorder: PromptSizeRecorder, round_id: str) -> tuple:
+    recorder.max_chars = recorder.digest_calls = 0
+    started = time.perf_counter()
+    await main.round_summary_store.get_or_refresh(round_id)
+    return round(time.perf_counter() - started, 3), recorder.max_chars, recorder.digest_calls
+
+
+async def run_benchmark(args) -> list:
+    import main
+
+    await main.db.run(main.init_db)
+    recorder = PromptSizeRecorder()
+    main.clients.set("gemini", FakeGeminiClient(
+        FaultProfile(latency_mean=args.gemini_latency, latency_jitter=0.0, latency_per_kchar=args.latency_per_kchar),
+        respond=recorder,
+    ))
+    main.round_summary_store.chunk_size = args.chunk_size
+    results = []
+    for mode in ("direct", "hierarchical"):
+        main.round_summary_store.hierarchical_min_cards = args.min_cards if mode == "hierarchical" else 10 ** 9
+        for size in args.sizes:
+            round_id = f"bench_{mode}_{size}"
+            for index in range(1, size + 1):
+                add_completed_card(main, round_id, index)
+            cold, cold_prompt, _ = await measure(main, recorder, round_id)
+            add_completed_card(main, round_id, size + 1)
+            incremental, _, incremental_digests = await measure(main, recorder, round_id)
+            add_completed_card(main, round_id, 0)
+            out_of_order, _, out_of_order_digests = await measure(main, recorder, round_id)
+            results.append({"mode": mode, "cards": size, "cold": cold, "incremental": incremental,
+                            "incremental_digests": incremental_digests, "out_of_order": out_of_order,
+                            "out_of_order_digests": out_of_order_digests, "max_prompt_chars": cold_prompt})
+    main.db.close()
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="对比直接汇总与分层汇总在不同轮次规模下的延迟。")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 40, 80, 160, 320])
+    parser.add_argument("--chunk-size", type=int, default=20)
+    parser.add_argument("--min-cards", type=int, default=40, help="分层汇总模式下启用分层的最少卡片数")
+    parser.add_argument("--gemini-latency", type=float, default=1.0, help="Gemini 替身的基础延迟 (秒)")
+    parser.add_argument("--latency-per-kchar", type=float, default=0.02, help="每千字符输入额外增加的延迟 (秒)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="retelling_bench_")
+    os.environ["DB_FILE"] = os.path.join(workdir, "bench_jobs.db")
+    os.environ["TEMP_AUDIO_DIR"] = os.path.join(workdir, "temp_audio")
+    os.environ["ROUND_SUMMARY_REFRESH_DELAY_SECONDS"] = "0"
+
+    print(f"{'mode':<13}{'cards':>6}{'cold':>9}{'incr.':>9}{'digests':>8}{'out-of-order':>13}{'digests':>8}{'max prompt':>13}")
+    for row in asyncio.run(run_benchmark(args)):
+        print(f"{row['mode']:<13}{row['cards']:>6}{row['cold']:>8.2f}s{row['incremental']:>8.2f}s{row['incremental_digests']:>8}"
+              f"{row['out_of_order']:>12.2f}s{row['out_of_order_digests']:>8}{row['max_prompt_chars']:>13,}")
+
+
+if __name__ == "__main__":
+    main_cli()
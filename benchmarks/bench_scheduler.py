@@ -0,0 +1,86 @@
+# benchmarks/bench_scheduler.py (调度器在故障注入下的表现)
+#
+# 对本地 Gemini 替身发起一批并发调用，替身会随机返回 429 并限制服务端并发。
+# 对比不经调度器直接调用与经过 ProviderScheduler 调用时的成功率、重试次数与耗时。
+#
+# 用法 (在仓库根目录):
+#     python -m benchmarks.bench_scheduler --calls 200 --rate-limit-probability 0.1 --server-max-concurrent 8
+
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.fake_providers import FakeGeminiClient, FaultProfile
+from provider_scheduler import ProviderScheduler
+
+
+async def run(mode: str, args) -> dict:
+    profile = FaultProfile(
+        latency_mean=args.latency, latency_jitter=args.latency / 4,
+        rate_limit_probability=args.rate_limit_probability, max_concurrent=args.server_max_concurrent,
+    )
+    client = FakeGeminiClient(profile, seed=args.seed)
+    scheduler = ProviderScheduler(
+        "fake-gemini", rate_per_second=args.rate, burst=args.burst, max_in_flight=args.max_in_flight,
+        max_retries=args.max_retries, base_delay=args.base_delay, max_delay=args.base_delay * 16,
+    )
+    max_queued = 0
+
+    async def one(i: int):
+        nonlocal max_queued
+        if mode == "direct":
+            await client.aio.models.generate_content(model="fake", contents=f"prompt {i}")
+        else:
+            call = scheduler.call(client.aio.models.generate_content, model="fake", contents=f"prompt {i}")
+            task = asyncio.ensure_future(call)
+            await asyncio.sleep(0)
+            max_queued = max(max_queued, scheduler.queued)
+            await task
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[one(i) for i in range(args.calls)], return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for r in results if isinstance(r, Exception))
+    return {
+        "mode": mode,
+        "calls": args.calls,
+        "succeeded": args.calls - failed,
+        "failed": failed,
+        "provider_attempts": client.faults.calls,
+        "provider_rejections": client.faults.rejected,
+        "wall_seconds": round(elapsed, 3),
+        "scheduler": scheduler.snapshot() if mode == "scheduled" else None,
+        "max_queued": max_queued if mode == "scheduled" else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在故障注入的本地 Gemini 替身上测试 ProviderScheduler。")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2, help="替身平均延迟 (秒)")
+    parser.add_argument("--rate-limit-probability", type=float, default=0.1)
+    parser.add_argument("--server-max-concurrent", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=40.0, help="调度器令牌桶速率 (次/秒)")
+    parser.add_argument("--burst", type=int, default=8)
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--max-retries", type=int, default=6)
+    parser.add_argument("--base-delay", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = [asyncio.run(run(mode, args)) for mode in ("direct", "scheduled")]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        line = (f"{r['mode']:>9}: {r['succeeded']}/{r['calls']} ok  attempts {r['provider_attempts']}  "
+                f"429/503 {r['provider_rejections']}  wall {r['wall_seconds']:.2f}s")
+        if r["scheduler"]:
+            line += f"  retries {r['scheduler']['retries_total']}  max queued {r['max_queued']}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# benchmarks/bench_streaming.py (流式提交与整段上传的延迟对比)
+#
+# 在本进程内启动 uvicorn (替换为本地替身: FakeTranscriber / ReplayStreamingTranscriber /
+# FakeGeminiClient)，按实时速度"播放"练习音频来模拟学生说话，对比两种提交方式从
+# 录音结束到拿到评测结果的延迟：
+#   upload: 说完后 POST /evaluate-single-card，再经 /round-events 等待 COMPLETED
+#   stream: 边说边通过 WebSocket /stream-single-card 发送，结束后直接收到 result
+# 样例音频只作为字节流使用，替身不解码音频内容。
+#
+# 用法 (在仓库根目录):
+#     python -m benchmarks.bench_streaming --cards 6 --speedup 4
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import time
+
+import httpx
+import uvicorn
+from websockets.asyncio.client import connect
+
+from benchmarks.bench_e2e import load_fixtures, percentiles
+from benchmarks.fake_providers import FakeGeminiClient, FakeTranscriber, FaultProfile, ReplayStreamingTranscriber
+
+FRAME_SECONDS = 0.1
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def speak(practice: bytes, sample_rate: int, speedup: float):
+    """按实时速度产出练习音频帧 (PCM16 单声道)。"""
+    frame_bytes = int(sample_rate * 2 * FRAME_SECONDS)
+    for offset in range(0, len(practice), frame_bytes):
+        await asyncio.sleep(FRAME_SECONDS / speedup)
+        yield practice[offset:offset + frame_bytes]
+
+
+async def run_upload(client: httpx.AsyncClient, main, round_id: str, card_id: str, practice_path: str, original_path: str, args) -> float:
+    with open(practice_path, "rb") as f:
+        practice = f.read()
+    async for _ in speak(practice, args.sample_rate, args.speedup):
+        pass
+    queue = main.round_events.subscribe(round_id)
+    try:
+        speech_ended = time.perf_counter()
+        with open(original_path, "rb") as o:
+            response = await client.post("/evaluate-single-card", data={"round_id": round_id, "card_id": card_id},
+                                         files={"practice_audio": practice, "original_audio": o})
+        response.raise_for_status()
+        while True:
+            event = await queue.get()
+            if event["card_id"] == card_id and event["status"] in ("COMPLETED", "FAILED"):
+                return time.perf_counter() - speech_ended
+    finally:
+        main.round_events.unsubscribe(round_id, queue)
+
+
+async def run_stream(base_url: str, round_id: str, card_id: str, practice_path: str, original_path: str, args) -> float:
+    with open(practice_path, "rb") as f:
+        practice = f.read()
+    with open(original_path, "rb") as f:
+        original = f.read()
+    async with connect(base_url.replace("http", "ws") + "/stream-single-card", max_size=None) as ws:
+        await ws.send(json.dumps({"type": "start", "round_id": round_id, "card_id": card_id, "sample_rate": args.sample_rate}))
+        assert json.loads(await ws.recv())["type"] == "accepted"
+        await ws.send(original)
+        await ws.send(json.dumps({"type": "original_end"}))
+
+        async def drain_partials():
+            async for message in ws:
+                message = json.loads(message)
+                # partial (转录中间结果) 与 provisional (本地临时评分) 之后才是最终的 result
+                if message["type"] not in ("partial", "provisional"):
+                    return message
+
+        receiver = asyncio.create_task(drain_partials())
+        async for frame in speak(practice, args.sample_rate, args.speedup):
+            await ws.send(frame)
+        speech_ended = time.perf_counter()
+        await ws.send(json.dumps({"type": "end"}))
+        result = await receiver
+        if result.get("status") != "COMPLETED":
+            raise RuntimeError(f"stream failed: {result}")
+        return time.perf_counter() - speech_ended
+
+
+async def run_benchmark(args) -> dict:
+    import main
+
+    main.clients.set("transcript_service", None)
+    main.clients.set("transcriber", FakeTranscriber(FaultProfile(latency_mean=args.asr_latency, latency_jitter=args.asr_latency / 4), seed=args.seed))
+    main.clients.set("streaming_transcriber", ReplayStreamingTranscriber(finalize_latency=args.finalize_latency, seed=args.seed))
+    main.clients.set("gemini", FakeGeminiClient(FaultProfile(latency_mean=args.gemini_latency, latency_jitter=args.gemini_latency / 4), seed=args.seed))
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning", ws_max_size=64 * 1024 * 1024))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    fixtures = load_fixtures()
+    results = {"upload": [], "stream": []}
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+            for mode in ("upload", "stream"):
+                for index in range(args.cards):
+                    card_id, practice_path, original_path = fixtures[index % len(fixtures)]
+                    round_id = f"bench_{mode}_{index:03d}"
+                    if mode == "upload":
+                        latency = await run_upload(client, main, round_id, card_id, practice_path, original_path, args)
+                    else:
+                        latency = await run_stream(base_url, round_id, card_id, practice_path, original_path, args)
+                    results[mode].append(latency)
+    finally:
+        server.should_exit = True
+        await serving
+
+    return {
+        "params": vars(args),
+        "speech_end_to_result_seconds": {mode: percentiles(values) for mode, values in results.items()},
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="对比 WebSocket 流式提交与整段上传从录音结束到评测结果的延迟。")
+    parser.add_argument("--cards", type=int, default=6)
+    parser.add_argument("--speedup", type=float, default=4.0, help="音频播放加速倍数 (1 为实时)")
+    parser.add_argument("--sample-rate", type=int, default=16000)
+    parser.add_argument("--asr-latency", type=float, default=1.5, help="批量 ASR 替身平均延迟 (秒)")
+    parser.add_argument("--finalize-latency", type=float, default=0.3, help="流式替身确认最后语段的延迟 (秒)")
+    parser.add_argument("--gemini-latency", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="retelling_bench_")
+    os.environ["DB_FILE"] = os.path.join(workdir, "bench_jobs.db")
+    os.environ["TEMP_AUDIO_DIR"] = os.path.join(workdir, "temp_audio")
+
+    result = asyncio.run(run_benchmark(args))
+    for mode, stats in result["speech_end_to_result_seconds"].items():
+        print(f"{mode:>6}: p50 {stats['p50']:.2f}s  p90 {stats['p90']:.2f}s  max {stats['max']:.2f}s")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,328 @@
+# benchmarks/fake_providers.py (AssemblyAI 与 Gemini 的本地替身)
+#
+# 与 main.py 中 clients 登记的客户端 (transcriber / gemini / streaming_transcriber) 调用方式保持一致：
+#   FakeTranscriber().transcribe(path)                         -> 带 status/text/words 的转录对象
+#   create_fake_assemblyai_app()                               -> AssemblyAI v2 REST 接口的 ASGI 替身，
+#       配合 httpx.ASGITransport 供 asr_poller.AssemblyAITranscriptService 使用
+#   FakeGeminiClient().aio.models.generate_content(model, contents) -> candidates[0].content.parts[0].text
+#       (微批 Prompt 返回以 card_id 标识的报告数组)
+#   ReplayStreamingTranscriber().open(sample_rate, on_partial)       -> streaming_asr.StreamingSession
+# 可配置延迟分布与故障注入 (429、5xx、服务端并发上限)，用于调度器测试和离线基准。
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from streaming_asr import StreamingSession, StreamingTranscriber, TranscriptAccumulator
+
+SENTENCES = [
+    "Jeremy Hampton has a large circle of friends and is very popular at parties.",
+    "The quick brown fox jumps over the lazy dog.",
+    "She tackled the issue head on and finished the report before noon.",
+    "Most people agree that regular exercise improves both mood and sleep.",
+]
+
+
+class FakeProviderError(Exception):
+    """模拟 SDK 抛出的 HTTP 错误，带 status_code 与 code 两个属性。"""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+        self.code = status_code
+
+
+@dataclass
+class FaultProfile:
+    latency_mean: float = 0.5           # 秒
+    latency_jitter: float = 0.2         # 均匀分布 ±jitter
+    rate_limit_probability: float = 0.0  # 随机返回 429 的概率
+    server_error_probability: float = 0.0  # 随机返回 503 的概率
+    max_concurrent: int = 0             # 服务端并发上限，超过时返回 429；0 表示不限制
+    latency_per_kchar: float = 0.0      # 每千字符输入额外增加的延迟 (秒)，模拟长 Prompt 的处理时间
+
+    def sample_latency(self, rng: random.Random, input_chars: int = 0) -> float:
+        jitter = rng.uniform(-self.latency_jitter, self.latency_jitter)
+        return max(0.0, self.latency_mean + jitter + self.latency_per_kchar * input_chars / 1000)
+
+
+class _FaultInjector:
+    def __init__(self, profile: FaultProfile, seed: int = None):
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.in_flight = 0
+        self.calls = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def enter(self, input_chars: int = 0):
+        with self._lock:
+            self.calls += 1
+            p = self.profile
+            if p.max_concurrent and self.in_flight >= p.max_concurrent:
+                self.rejected += 1
+                raise FakeProviderError("Too Many Requests (concurrency limit)", 429)
+            roll = self.rng.random()
+            if roll < p.rate_limit_probability:
+                self.rejected += 1
+                raise FakeProviderError("Too Many Requests", 429)
+            if roll < p.rate_limit_probability + p.server_error_probability:
+                self.rejected += 1
+                raise FakeProviderError("Service Unavailable", 503)
+            self.in_flight += 1
+            return p.sample_latency(self.rng, input_chars)
+
+    def exit(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+# --- AssemblyAI 替身 ---
+
+class FakeWord:
+    def __init__(self, text: str, start: int, end: int, confidence: float):
+        self.text, self.start, self.end, self.confidence = text, start, end, confidence
+
+    def dict(self) -> dict:
+        return {"text": self.text, "start": self.start, "end": self.end, "confidence": self.confidence,
+                "speaker": None, "channel": None}
+
+
+def fake_asr_words(seed_bytes: bytes, practice: bool) -> tuple:
+    """根据音频内容确定性地生成一句话及其词级时间戳。"""
+    seed = int.from_bytes(hashlib.sha256(seed_bytes).digest()[:8], "big")
+    rng = random.Random(seed)
+    tokens = SENTENCES[seed % len(SENTENCES)].split()
+    if practice and len(tokens) > 4:
+        # 复述通常会遗漏个别词并出现停顿
+        del tokens[rng.randrange(1, len(tokens) - 1)]
+    words, t = [], rng.randint(100, 600)
+    for token in tokens:
+        duration = rng.randint(150, 450)
+        words.append(FakeWord(token, t, t + duration, round(rng.uniform(0.6 if practice else 0.85, 1.0), 4)))
+        t += duration + (rng.choice([0, 0, 80, 900]) if practice else rng.choice([0, 40, 120]))
+    return " ".join(tokens), words
+
+
+class FakeTranscriber:
+    def __init__(self, profile: FaultProfile = None, seed: int = None):
+        self.faults = _FaultInjector(profile or FaultProfile(latency_mean=1.0, latency_jitter=0.3), seed)
+
+    def transcribe(self, path: str):
+        latency = self.faults.enter()
+        try:
+            time.sleep(latency)
+            with open(path, "rb") as f:
+                head = f.read(64 * 1024)
+            text, words = fake_asr_words(head, practice="practice" in path)
+            return SimpleNamespace(status="completed", error=None, text=text, words=words)
+        finally:
+            self.faults.exit()
+
+
+# --- AssemblyAI 流式转录替身 ---
+
+class ReplayStreamingSession(StreamingSession):
+    """按收到的音频时长回放一份转录脚本：音频时间越过某个词的结束时间后，该词才"被识别"。
+
+    词之间停顿超过 turn_gap_ms 视为语段结束。finish() 只需等待最后一个语段的确认延迟，
+    与真实流式服务的行为一致。
+    """
+
+    def __init__(self, transcriber: "ReplayStreamingTranscriber", sample_rate: int, on_partial=None):
+        self._transcriber = transcriber
+        self._bytes_per_ms = sample_rate * 2 / 1000
+        self._on_partial = on_partial
+        self._script = transcriber.script
+        self._turns = None
+        self._bytes_received = 0
+        self._next_word = 0
+        self.accumulator = TranscriptAccumulator()
+
+    def _split_turns(self, words: list) -> list:
+        turns, current = [], []
+        for word in words:
+            if current and word["start"] - current[-1]["end"] > self._transcriber.turn_gap_ms:
+                turns.append(current)
+                current = []
+            current.append(word)
+        return turns + ([current] if current else [])
+
+    def _emit(self, audio_ms: float, final: bool):
+        flat = [(turn_order, word) for turn_order, turn in enumerate(self._turns) for word in turn]
+        while self._next_word < len(flat) and (final or flat[self._next_word][1]["end"] <= audio_ms):
+            self._next_word += 1
+        # 已完整识别的语段进入累积结果，最后一个未完成语段只作为中间结果推送
+        partial = []
+        for turn_order, turn in enumerate(self._turns):
+            recognized = [w for order, w in flat[:self._next_word] if order == turn_order]
+            if len(recognized) == len(turn):
+                self.accumulator.add_turn(turn_order, " ".join(w["text"] for w in turn), turn)
+            elif recognized:
+                partial = recognized
+        if self._on_partial:
+            self._on_partial(self.accumulator.preview(" ".join(w["text"] for w in partial)))
+
+    async def send_audio(self, chunk: bytes):
+        if self._turns is None:
+            if self._script is None:
+                text, words = fake_asr_words(chunk[:64 * 1024], practice=True)
+                self._script = {"text": text, "words": [w.dict() for w in words]}
+            self._turns = self._split_turns(self._script["words"])
+        self._bytes_received += len(chunk)
+        self._emit(self._bytes_received / self._bytes_per_ms, final=False)
+
+    async def finish(self) -> dict:
+        try:
+            await asyncio.sleep(self._transcriber.finalize_latency)
+            if self._turns is not None:
+                self._emit(float("inf"), final=True)
+            return self.accumulator.result()
+        finally:
+            self._transcriber.faults.exit()
+
+    async def abort(self):
+        self._transcriber.faults.exit()
+
+
+class ReplayStreamingTranscriber(StreamingTranscriber):
+    """流式转录替身。script 为 {"text", "words"}；为 None 时根据首个音频块确定性地生成。"""
+
+    def __init__(self, script: dict = None, profile: FaultProfile = None, seed: int = None,
+                 finalize_latency: float = 0.3, turn_gap_ms: int = 700):
+        self.script = script
+        self.faults = _FaultInjector(profile or FaultProfile(latency_mean=0.1, latency_jitter=0.05), seed)
+        self.finalize_latency = finalize_latency
+        self.turn_gap_ms = turn_gap_ms
+
+    async def open(self, sample_rate: int, on_partial=None) -> StreamingSession:
+        # 连接建立的延迟与故障注入；会话存续期间占用一个服务端并发名额
+        latency = self.faults.enter()
+        try:
+            await asyncio.sleep(latency)
+        except BaseException:
+            self.faults.exit()
+            raise
+        return ReplayStreamingSession(self, sample_rate, on_partial)
+
+
+def create_fake_assemblyai_app(profile: FaultProfile = None, seed: int = None) -> FastAPI:
+    """AssemblyAI v2 REST 接口替身：/v2/upload、/v2/transcript (提交)、/v2/transcript/{id} (查询)。
+
+    提交时按 profile 采样处理时长并注入 429/503 与服务端并发上限，之后的查询在处理完成前返回
+    processing。上传内容不含文件名，统一按标准音频生成词级结果。app.state.stats 记录各接口调用次数。
+    """
+    app = FastAPI()
+    faults = _FaultInjector(profile or FaultProfile(latency_mean=3.0, latency_jitter=1.0), seed)
+    uploads, transcripts = {}, {}
+    app.state.faults = faults
+    app.state.stats = {"uploads": 0, "submitted": 0, "status_requests": 0}
+
+    @app.post("/v2/upload")
+    async def upload(request: Request):
+        body = await request.body()
+        key = hashlib.sha256(body).hexdigest()
+        uploads[key] = body[:64 * 1024]
+        app.state.stats["uploads"] += 1
+        return {"upload_url": f"https://cdn.fake-assemblyai.local/{key}"}
+
+    @app.post("/v2/transcript")
+    async def submit(request: Request):
+        key = (await request.json())["audio_url"].rsplit("/", 1)[-1]
+        if key not in uploads:
+            return JSONResponse({"error": "audio_url is not a valid upload"}, status_code=400)
+        try:
+            latency = faults.enter()
+        except FakeProviderError as e:
+            return JSONResponse({"error": str(e)}, status_code=e.status_code)
+        transcript_id = uuid.uuid4().hex
+        text, words = fake_asr_words(uploads[key], practice=False)
+        transcripts[transcript_id] = {"ready_at": time.monotonic() + latency, "text": text,
+                                      "words": [word.dict() for word in words], "finished": False}
+        app.state.stats["submitted"] += 1
+        return {"id": transcript_id, "status": "queued"}
+
+    @app.get("/v2/transcript/{transcript_id}")
+    async def get_transcript(transcript_id: str):
+        app.state.stats["status_requests"] += 1
+        transcript = transcripts.get(transcript_id)
+        if transcript is None:
+            return JSONResponse({"error": "transcript not found"}, status_code=404)
+        if time.monotonic() < transcript["ready_at"]:
+            return {"id": transcript_id, "status": "processing"}
+        if not transcript["finished"]:
+            transcript["finished"] = True
+            faults.exit()
+        return {"id": transcript_id, "status": "completed", "text": transcript["text"], "words": transcript["words"]}
+
+    return app
+
+
+# --- Gemini 替身 ---
+
+BATCH_CARD_HEADER = re.compile(r"^### card_id: (\S+)$", re.MULTILINE)
+
+def fake_report(contents: str) -> dict:
+    rng = random.Random(hashlib.sha256(contents.encode("utf-8")).digest())
+    if "key_patterns_analysis" in contents:
+        return {
+            "performance_overview": {"comment": "整体意思传达准确。", "final_score": rng.randint(60, 95)},
+            "key_patterns_analysis": [{"pattern_id": 1, "observation": "多处停顿。", "possible_cause": "逐词朗读。"}],
+            "vocabulary_and_expression_focus": {"items": [], "native_speech_insight": "连读。"},
+        }
+    if "retelling_patterns" in contents:
+        return {
+            "retelling_patterns": [{"observation": "遗漏句中的次要细节。", "card_ids": []}],
+            "speech_patterns": [{"observation": "多处停顿。", "card_ids": []}],
+            "vocabulary_candidates": [],
+            "native_speech_phenomena": ["连读。"],
+        }
+    sections = BATCH_CARD_HEADER.split(contents)[1:]
+    if sections:
+        # 微批评测 (build_batch_card_gemini_prompt)：每张卡片一份报告，报告内容只取决于该卡片的输入
+        return [dict(fake_report(section), card_id=card_id) for card_id, section in zip(sections[::2], sections[1::2])]
+    return {
+        "meaning_fidelity": {"assessment": "核心意思已准确表达。", "missing_details": [], "added_inaccuracies": []},
+        "expression_comparison": {"summary": "表达清晰。", "original_highlight": "", "user_highlight": ""},
+        "fluency_and_rhythm": {"assessment": "节奏基本自然。"},
+        "critical_pronunciation_errors": [],
+        "overall_score": rng.randint(60, 95),
+    }
+
+
+def fake_response(payload) -> SimpleNamespace:
+    text = "```json\n" + json.dumps(payload, ensure_ascii=False) + "\n```"
+    part = SimpleNamespace(text=text)
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class _FakeAsyncModels:
+    def __init__(self, client: "FakeGeminiClient"):
+        self._client = client
+
+    async def generate_content(self, model: str, contents: str):
+        latency = self._client.faults.enter(len(contents))
+        try:
+            await asyncio.sleep(latency)
+            self._client.prompt_chars += len(contents)
+            return fake_response(self._client.respond(contents))
+        finally:
+            self._client.faults.exit()
+
+
+class FakeGeminiClient:
+    def __init__(self, profile: FaultProfile = None, seed: int = None, respond=fake_report):
+        self.faults = _FaultInjector(profile or FaultProfile(latency_mean=2.0, latency_jitter=0.5), seed)
+        self.respond = respond
+        self.prompt_chars = 0
+        self.aio = SimpleNamespace(models=_FakeAsyncModels(self))
@@ -0,0 +1,136 @@
+# card_batcher.py (同一轮次卡片的 Gemini 微批评测)
+#
+# 同一轮次的卡片通常在几秒内先后完成转录，逐张评测时每次调用都要重复发送很长的指令部分。
+# CardEvaluationBatcher 按 round_id 收集等待评测的卡片：某轮次的第一张卡片到达后开启
+# window_seconds 的收集窗口，窗口结束或凑满 max_cards 张时，把这些卡片合并为一个 Prompt，
+# 要求模型返回以 card_id 标识的报告数组。
+#   - 窗口内只有一张卡片时直接走单卡调用；
+#   - 批量调用失败或返回无法解析时，缺失报告的卡片逐张退回单卡调用，
+#     因此单张卡片的结果 (或错误) 与不做微批时一致。
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+
+def reports_by_card_id(payload, card_ids: list) -> dict:
+    """把批量调用的返回整理为 {card_id: 报告}，只保留输入中存在且带 overall_score 的报告。
+
+    接受报告数组、{"reports": [...]} 或以 card_id 为键的对象；报告中的 card_id 字段会被移除，
+    使其与单卡报告结构一致。返回值不含任何有效报告时抛出 ValueError。
+    """
+    if isinstance(payload, dict) and isinstance(payload.get("reports"), list):
+        payload = payload["reports"]
+    if isinstance(payload, dict):
+        items = [dict(report, card_id=card_id) for card_id, report in payload.items() if isinstance(report, dict)]
+    elif isinstance(payload, list):
+        items = [report for report in payload if isinstance(report, dict)]
+    else:
+        raise ValueError(f"batch response is {type(payload).__name__}, expected a list of reports")
+
+    expected, reports = set(card_ids), {}
+    for item in items:
+        card_id = str(item.get("card_id"))
+        report = {key: value for key, value in item.items() if key != "card_id"}
+        if card_id in expected and card_id not in reports and isinstance(report.get("overall_score"), (int, float)):
+            reports[card_id] = report
+    if not reports:
+        raise ValueError("batch response contains no usable card reports")
+    return reports
+
+
+@dataclass
+class PendingCard:
+    card_id: str
+    original_asr_data: dict
+    practice_asr_data: dict
+    future: asyncio.Future
+    timings: object = field(default=None, repr=False)
+
+
+class CardEvaluationBatcher:
+    """按轮次合并短时间内到达的卡片评测。
+
+    `evaluate_batch` 是 async 函数 `(round_id, cards: list[PendingCard]) -> Gemini 返回的 JSON`，
+    `evaluate_single` 是 async 函数 `(round_id, card_id, original_asr_data, practice_asr_data, timings) -> 报告`。
+    """
+
+    def __init__(self, evaluate_batch, evaluate_single, window_seconds: float = 0.5, max_cards: int = 8):
+        self.evaluate_batch = evaluate_batch
+        self.evaluate_single = evaluate_single
+        self.window_seconds = window_seconds
+        self.max_cards = max_cards
+        self._open: "dict[str, list[PendingCard]]" = {}
+        self._timers = {}
+        self._tasks = set()
+        # 统计
+        self.batch_calls = 0
+        self.batched_cards = 0
+        self.single_calls = 0
+        self.fallback_cards = 0
+
+    async def evaluate(self, round_id: str, card_id: str, original_asr_data: dict, practice_asr_data: dict,
+                       timings=None) -> dict:
+        """加入该轮次的收集窗口并等待报告；timings 用于记录退回单卡调用时的阶段耗时。"""
+        loop = asyncio.get_running_loop()
+        batch = self._open.get(round_id)
+        if batch is not None and any(card.card_id == card_id for card in batch):
+            # 同一张卡片 (如租约过期后重新执行) 不能出现在同一批中
+            self._flush(round_id)
+            batch = None
+        if batch is None:
+            batch = self._open[round_id] = []
+            self._timers[round_id] = loop.call_later(self.window_seconds, self._flush, round_id)
+        pending = PendingCard(card_id, original_asr_data, practice_asr_data, loop.create_future(), timings)
+        batch.append(pending)
+        if len(batch) >= self.max_cards:
+            self._flush(round_id)
+        return await pending.future
+
+    def _flush(self, round_id: str):
+        timer = self._timers.pop(round_id, None)
+        if timer is not None:
+            timer.cancel()
+        cards = self._open.pop(round_id, None)
+        if cards:
+            task = asyncio.create_task(self._run(round_id, cards))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, round_id: str, cards: list):
+        cards = [card for card in cards if not card.future.done()]
+        if not cards:
+            return
+        if len(cards) == 1:
+            await self._run_single(round_id, cards[0])
+            return
+
+        self.batch_calls += 1
+        self.batched_cards += len(cards)
+        card_ids = [card.card_id for card in cards]
+        try:
+            reports = reports_by_card_id(await self.evaluate_batch(round_id, cards), card_ids)
+        except Exception as e:
+            logging.warning(f"[{round_id}] 微批评测 ({len(cards)} 张卡片) 失败，逐张重新评测: {e}")
+            reports = {}
+
+        missing = [card for card in cards if card.card_id not in reports]
+        if reports and missing:
+            logging.warning(f"[{round_id}] 微批评测缺少 {len(missing)} 张卡片的报告，逐张重新评测: "
+                            f"{[card.card_id for card in missing]}")
+        for card in cards:
+            if card.card_id in reports and not card.future.done():
+                card.future.set_result(reports[card.card_id])
+        self.fallback_cards += len(missing)
+        await asyncio.gather(*[self._run_single(round_id, card) for card in missing])
+
+    async def _run_single(self, round_id: str, card: PendingCard):
+        self.single_calls += 1
+        try:
+            report = await self.evaluate_single(round_id, card.card_id, card.original_asr_data, card.practice_asr_data, card.timings)
+        except Exception as e:
+            if not card.future.done():
+                card.future.set_exception(e)
+            return
+        if not card.future.done():
+            card.future.set_result(report)
@@ -0,0 +1,57 @@
+# clients.py (第三方客户端的延迟创建)
+#
+# assemblyai 与 google.genai 两个 SDK 的导入各需数百毫秒，而导入 main 的进程未必会用到它们
+# (只负责入队的 HTTP 进程、worker 启动前的准备、工具与基准脚本)。ClientRegistry 只登记
+# 创建函数，第一次 get 时才导入 SDK 并创建客户端，之后复用同一实例。
+# 创建函数返回 None 表示未配置 (如缺少 API 密钥)，结果同样会被缓存。
+# 创建函数会导入 SDK，属于阻塞操作；协程中应使用 aget，首次创建在线程中完成，不阻塞事件循环。
+# 测试与基准可以用 set 直接换成本地替身。
+
+import asyncio
+import logging
+import threading
+
+
+class ClientRegistry:
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        # 转录在线程池中执行，首次创建可能同时发生在多个线程
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory):
+        """登记创建函数 `() -> client | None`，不会立即调用。"""
+        self._factories[name] = factory
+
+    def get(self, name: str):
+        """返回客户端，首次调用时创建；未配置时返回 None。"""
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._instances:
+                self._instances[name] = self._factories[name]()
+                if self._instances[name] is None:
+                    logging.warning(f"{name} 客户端未创建，因为 API 密钥未设置。")
+            return self._instances[name]
+
+    async def aget(self, name: str):
+        """get 的协程版本：已创建时直接返回，否则在线程中创建。"""
+        try:
+            return self._instances[name]
+        except KeyError:
+            return await asyncio.to_thread(self.get, name)
+
+    def set(self, name: str, client):
+        """直接指定客户端 (如本地替身)，跳过创建函数。"""
+        with self._lock:
+            self._instances[name] = client
+
+    def is_created(self, name: str) -> bool:
+        return name in self._instances
+
+    def preload(self, *names):
+        """预先创建客户端 (同步，适合在后台线程中调用)；不指定名称时创建全部。"""
+        for name in names or list(self._factories):
+            self.get(name)
@@ -0,0 +1,108 @@
+# db.py (共享 SQLite 访问层)
+#
+# 所有模块通过同一个 Database 实例访问 SQLite：
+# - 每个线程复用一个长连接 (WAL 模式、busy_timeout、语句缓存)，不再每次 sqlite3.connect；
+# - 异步代码通过专用的小线程池执行数据库操作，不阻塞事件循环；
+# - 连接处于 autocommit 模式，单条语句立即提交，多语句事务使用 transaction()。
+
+import asyncio
+import functools
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class Database:
+    def __init__(self, db_file: str, threads: int = 4, busy_timeout_ms: int = 30000, cached_statements: int = 256):
+        self.db_file = db_file
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections: "list[sqlite3.Connection]" = []
+        self._connections_lock = threading.Lock()
+        self.threads = threads
+        self._executor = None
+
+    def connection(self) -> sqlite3.Connection:
+        """返回当前线程的长连接，首次调用时创建并设置 PRAGMA。"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_file,
+                timeout=self.busy_timeout_ms / 1000,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=self.cached_statements,
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    # --- 同步接口 (可在任意线程中调用) ---
+
+    def execute(self, sql: str, params=()) -> int:
+        """执行一条写语句并返回受影响的行数。"""
+        return self.connection().execute(sql, params).rowcount
+
+    def executescript(self, script: str):
+        self.connection().executescript(script)
+
+    def ensure_columns(self, table: str, columns):
+        """为旧版本数据库的表补齐新增的列。columns 为 (列名, 类型) 列表。"""
+        existing = {row[1] for row in self.query_all(f"PRAGMA table_info({table})")}
+        for name, column_type in columns:
+            if name not in existing:
+                self.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+    def query_one(self, sql: str, params=()):
+        return self.connection().execute(sql, params).fetchone()
+
+    def query_all(self, sql: str, params=()) -> list:
+        return self.connection().execute(sql, params).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE 事务：提前拿到写锁，避免读后写的升级冲突。"""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # --- 异步接口 (在专用线程池中执行) ---
+
+    async def run(self, fn, *args, **kwargs):
+        """在数据库线程池中执行同步函数 fn。"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="sqlite")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def aexecute(self, sql: str, params=()) -> int:
+        return await self.run(self.execute, sql, params)
+
+    async def aquery_one(self, sql: str, params=()):
+        return await self.run(self.query_one, sql, params)
+
+    async def aquery_all(self, sql: str, params=()) -> list:
+        return await self.run(self.query_all, sql, params)
+
+    def close(self):
+        """关闭线程池与所有连接；之后再次使用时会重新创建。"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
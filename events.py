@@ -0,0 +1,52 @@
+# events.py (按 round_id 的进程内事件广播)
+#
+# 任务状态变化 (PENDING -> PROCESSING -> PARTIAL -> COMPLETED/FAILED) 发布到对应轮次的所有订阅者。
+# PARTIAL 携带本地临时报告，Gemini 报告到达后由 COMPLETED 取代。
+# 每个订阅者持有一个有界队列；消费过慢的订阅者丢弃最旧的事件，不会阻塞发布方。
+
+import asyncio
+import json
+import logging
+
+
+class RoundEventBroker:
+    def __init__(self, max_queue_size: int = 256):
+        self.max_queue_size = max_queue_size
+        self._subscribers: "dict[str, set[asyncio.Queue]]" = {}
+
+    def subscribe(self, round_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._subscribers.setdefault(round_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, round_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(round_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[round_id]
+
+    def publish(self, round_id: str, event: dict):
+        """向该轮次的所有订阅者广播事件；必须在事件循环线程中调用。"""
+        for queue in list(self._subscribers.get(round_id, ())):
+            if queue.full():
+                queue.get_nowait()
+                logging.warning(f"[{round_id}] 事件订阅者消费过慢，丢弃最旧的事件。")
+            queue.put_nowait(event)
+
+
+def make_job_event(round_id: str, card_id: str, status: str, evaluation_report: dict = None, error_message: str = None,
+                   provisional_report: dict = None) -> dict:
+    event = {"round_id": round_id, "card_id": card_id, "status": status}
+    if evaluation_report is not None:
+        event["result"] = {"evaluation_report": evaluation_report}
+    elif provisional_report is not None:
+        event["result"] = {"provisional_report": provisional_report}
+    if error_message is not None:
+        event["error_message"] = error_message
+    return event
+
+
+def format_sse(event: dict, event_type: str = "status") -> str:
+    return f"event: {event_type}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
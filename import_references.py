@@ -0,0 +1,86 @@
+# import_references.py (参考句目录批量导入)
+#
+# 并发转录一个目录中的参考音频并写入 reference_cards 表，card_id 取文件名 (不含扩展名)。
+# 可以断点续传：每完成一个文件立即写入；重新运行时内容哈希与目录中已有记录一致的文件直接跳过，
+# 中断前已转录但尚未写入目录的文件也会命中转录缓存，不会重复调用 ASR。
+#     python import_references.py ./reference_audio --concurrency 8
+#     python import_references.py ./reference_audio --force     # 忽略已有记录，全部重新导入
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import main
+from transcript_cache import hash_audio_file
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg", ".webm")
+
+
+def discover_audio(directory: str, recursive: bool) -> list:
+    """返回 [(card_id, path)]；card_id 重复时只保留第一个文件。"""
+    found = {}
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            card_id, ext = os.path.splitext(name)
+            if ext.lower() not in AUDIO_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            if card_id in found:
+                logging.warning(f"card_id '{card_id}' 重复，忽略 {path} (已使用 {found[card_id]})。")
+                continue
+            found[card_id] = path
+        if not recursive:
+            break
+    return sorted(found.items())
+
+
+async def import_directory(directory: str, concurrency: int, recursive: bool, force: bool) -> dict:
+    files = discover_audio(directory, recursive)
+    await main.db.run(main.init_db)
+    known = {} if force else await main.db.run(main.reference_catalog.audio_hashes)
+    stats = {"total": len(files), "imported": 0, "skipped": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+
+    async def import_one(card_id: str, path: str):
+        async with semaphore:
+            log_prefix = f"[reference/{card_id}]"
+            try:
+                audio_hash = await asyncio.to_thread(hash_audio_file, path)
+                if known.get(card_id) == audio_hash:
+                    stats["skipped"] += 1
+                    return
+                asr_data = await main.get_original_asr_data(path, log_prefix, audio_hash)
+                await main.db.run(main.reference_catalog.put, card_id, audio_hash, asr_data, os.path.abspath(path))
+                stats["imported"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                logging.error(f"{log_prefix} 导入失败: {e}")
+                return
+            done = stats["imported"] + stats["skipped"] + stats["failed"]
+            logging.info(f"{log_prefix} 已导入 ({done}/{stats['total']})。")
+
+    await asyncio.gather(*[import_one(card_id, path) for card_id, path in files])
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="并发转录参考音频并导入参考句目录 (可断点续传)。")
+    parser.add_argument("directory", help="参考音频所在目录，文件名 (不含扩展名) 作为 card_id")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时处理的文件数 (ASR 调用另受 ASR_MAX_IN_FLIGHT 限制)")
+    parser.add_argument("--recursive", action="store_true", help="同时导入子目录中的文件")
+    parser.add_argument("--force", action="store_true", help="忽略目录中已有的记录，全部重新导入")
+    args = parser.parse_args()
+
+    if not asyncio.run(main.asr_available()):
+        logging.error("AssemblyAI 客户端未创建，无法导入参考句。")
+        sys.exit(2)
+    stats = asyncio.run(import_directory(args.directory, args.concurrency, args.recursive, args.force))
+    main.db.close()
+    logging.info(f"导入完成: 共 {stats['total']} 个文件，导入 {stats['imported']}，跳过 {stats['skipped']}，"
+                 f"失败 {stats['failed']}，耗时 {stats['seconds']} 秒。")
+    sys.exit(1 if stats["failed"] else 0)
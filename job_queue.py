@@ -0,0 +1,228 @@
+# job_queue.py (基于 jobs 表的持久化任务队列)
+#
+# 取代 FastAPI BackgroundTasks：任务连同音频路径持久化在 jobs 表中，由固定数量的
+# async worker 认领执行。认领时写入租约 (lease)，执行期间定期心跳续约；进程重启后，
+# 租约已过期的 PROCESSING 任务会在启动时被重新放回 PENDING。多个进程可以同时消费
+# 同一个 SQLite 队列。
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+
+# jobs 表在最初版本之后新增的列 (名称, 类型)
+QUEUE_COLUMNS = [
+    ("practice_audio_path", "TEXT"),
+    ("original_audio_path", "TEXT"),
+    ("original_audio_hash", "TEXT"),
+    ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+    ("enqueued_at", "REAL"),
+    ("lease_owner", "TEXT"),
+    ("lease_expires_at", "REAL"),
+    ("heartbeat_at", "REAL"),
+    # 各阶段耗时 (秒) 的 JSON 对象，见 metrics.StageTimings
+    ("stage_timings", "TEXT"),
+    # 引用参考句目录时的 card_id，此时 original_audio_path 为空
+    ("reference_id", "TEXT"),
+]
+
+
+def ensure_queue_columns(db):
+    """为旧版本数据库的 jobs 表补齐队列所需的列。"""
+    db.ensure_columns("jobs", QUEUE_COLUMNS)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_enqueued ON jobs (status, enqueued_at)")
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    """jobs 表上的任务队列与 worker 池。
+
+    `handler` 是一个 async 函数 `(job: dict) -> None`，job 包含 round_id、card_id
+    以及持久化的音频路径。handler 负责把任务最终写为 COMPLETED 或 FAILED。
+    """
+
+    def __init__(self, db, handler, concurrency: int = 4, lease_seconds: float = 300.0,
+                 poll_interval: float = 2.0, max_attempts: int = 3, worker_id: str = None):
+        self.db = db
+        self.handler = handler
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.worker_id = worker_id or default_worker_id()
+        self._wakeup = asyncio.Event()
+        self._workers: "list[asyncio.Task]" = []
+        self._stopping = False
+
+    # --- 同步数据库操作 (通过 db.run 在数据库线程池中调用) ---
+
+    def submit(self, round_id: str, card_id: str, practice_audio_path: str, original_audio_path: str,
+               original_audio_hash: str = None, stage_timings: dict = None, reference_id: str = None):
+        """以一条语句插入带音频路径的 PENDING 任务 (音频已落盘)，插入后即可被 worker 认领。
+
+        任务已存在时抛出 sqlite3.IntegrityError。
+        """
+        if not self.submit_many([(round_id, card_id, practice_audio_path, original_audio_path, original_audio_hash, stage_timings, reference_id)]):
+            raise sqlite3.IntegrityError(f"job {round_id}/{card_id} already exists")
+
+    def submit_many(self, items) -> set:
+        """批量插入带音频路径的 PENDING 任务，单个事务完成；返回实际插入的 (round_id, card_id) 集合。
+
+        items 为 (round_id, card_id, practice 路径, original 路径, original 哈希, 阶段耗时 dict 或 None,
+        参考句 ID 或 None) 列表；引用参考句时 original 路径与哈希为 None。已存在的任务不会被覆盖，
+        也不在返回值中。
+        """
+        now = time.time()
+        inserted = set()
+        with self.db.transaction() as conn:
+            for round_id, card_id, practice_audio_path, original_audio_path, original_audio_hash, stage_timings, reference_id in items:
+                cursor = conn.execute(
+                    """INSERT OR IGNORE INTO jobs (round_id, card_id, status, practice_audio_path, original_audio_path,
+                           original_audio_hash, stage_timings, reference_id, enqueued_at)
+                       VALUES (?, ?, 'PENDING', ?, ?, ?, ?, ?, ?)""",
+                    (round_id, card_id, os.path.abspath(practice_audio_path),
+                     os.path.abspath(original_audio_path) if original_audio_path else None, original_audio_hash,
+                     json.dumps(stage_timings) if stage_timings else None, reference_id, now),
+                )
+                if cursor.rowcount:
+                    inserted.add((round_id, card_id))
+        return inserted
+
+    def reclaim_stale(self) -> int:
+        """把租约已过期的 PROCESSING 任务放回 PENDING；超过最大尝试次数或缺少音频路径的任务标记为 FAILED，
+        缺少音频路径的 PENDING 任务直接删除。"""
+        now = time.time()
+        with self.db.transaction() as conn:
+            # 旧版本先插入 PENDING 行、保存音频后才写入路径，两步之间中断会留下永远不会被认领的行；
+            # 现在任务总是连同音频路径一起插入，这样的行只可能是遗留的孤儿，删除后客户端可以重新提交
+            abandoned = conn.execute(
+                "DELETE FROM jobs WHERE status = 'PENDING' AND practice_audio_path IS NULL"
+            ).rowcount
+            stale = "status = 'PROCESSING' AND (lease_expires_at IS NULL OR lease_expires_at < ?)"
+            orphaned = conn.execute(
+                f"""UPDATE jobs SET status = 'FAILED', lease_owner = NULL,
+                        error_message = 'Job was interrupted before its audio was persisted and cannot be resumed.'
+                    WHERE {stale} AND practice_audio_path IS NULL""",
+                (now,),
+            ).rowcount
+            exhausted = conn.execute(
+                f"""UPDATE jobs SET status = 'FAILED', lease_owner = NULL,
+                        error_message = 'Job exceeded the maximum number of attempts.'
+                    WHERE {stale} AND attempts >= ?""",
+                (now, self.max_attempts),
+            ).rowcount
+            requeued = conn.execute(
+                f"UPDATE jobs SET status = 'PENDING', lease_owner = NULL, lease_expires_at = NULL WHERE {stale}",
+                (now,),
+            ).rowcount
+        if orphaned or exhausted or requeued or abandoned:
+            logging.warning(f"回收过期任务: 重新排队 {requeued} 个, 超过重试次数 {exhausted} 个, 无法恢复 {orphaned} 个, "
+                            f"删除缺少音频路径的 PENDING 任务 {abandoned} 个。")
+        return requeued
+
+    def claim_next(self):
+        """原子地认领最早入队的 PENDING 任务，没有可认领任务时返回 None。
+
+        返回的 job 中 claimed_at 为认领时间，stage_timings 为入队时记录的阶段耗时 (dict)。
+        """
+        now = time.time()
+        with self.db.transaction() as conn:
+            job = conn.execute(
+                """SELECT round_id, card_id, practice_audio_path, original_audio_path, original_audio_hash, attempts,
+                          enqueued_at, stage_timings, reference_id
+                   FROM jobs WHERE status = 'PENDING' AND practice_audio_path IS NOT NULL
+                   ORDER BY enqueued_at LIMIT 1"""
+            ).fetchone()
+            if job:
+                conn.execute(
+                    """UPDATE jobs SET status = 'PROCESSING', lease_owner = ?, lease_expires_at = ?,
+                           heartbeat_at = ?, attempts = attempts + 1
+                       WHERE round_id = ? AND card_id = ?""",
+                    (self.worker_id, now + self.lease_seconds, now, job["round_id"], job["card_id"]),
+                )
+        if not job:
+            return None
+        job = dict(job)
+        job["claimed_at"] = now
+        job["stage_timings"] = json.loads(job["stage_timings"]) if job["stage_timings"] else {}
+        return job
+
+    def begin_inline(self, round_id: str, card_id: str):
+        """插入一个由调用方直接执行、不经过队列的 PROCESSING 任务 (如 WebSocket 流式提交)。
+
+        租约归本 worker 所有，执行期间需配合 heartbeat_loop 续约；进程中断后该任务没有可恢复的
+        音频路径，会在租约过期后被 reclaim_stale 标记为 FAILED。任务已存在时抛出 sqlite3.IntegrityError。
+        """
+        now = time.time()
+        self.db.execute(
+            """INSERT INTO jobs (round_id, card_id, status, attempts, enqueued_at, lease_owner, lease_expires_at, heartbeat_at)
+               VALUES (?, ?, 'PROCESSING', 1, ?, ?, ?, ?)""",
+            (round_id, card_id, now, self.worker_id, now + self.lease_seconds, now),
+        )
+
+    def heartbeat(self, round_id: str, card_id: str):
+        now = time.time()
+        self.db.execute(
+            """UPDATE jobs SET heartbeat_at = ?, lease_expires_at = ?
+               WHERE round_id = ? AND card_id = ? AND status = 'PROCESSING' AND lease_owner = ?""",
+            (now, now + self.lease_seconds, round_id, card_id, self.worker_id),
+        )
+
+    # --- worker 池 ---
+
+    def notify(self):
+        """有新任务入队时唤醒本进程内空闲的 worker。"""
+        self._wakeup.set()
+
+    async def heartbeat_loop(self, round_id: str, card_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.db.run(self.heartbeat, round_id, card_id)
+            except Exception as e:
+                logging.error(f"[{round_id}/{card_id}] 任务心跳续约失败: {e}")
+
+    async def _worker(self, index: int):
+        while not self._stopping:
+            try:
+                job = await self.db.run(self.claim_next)
+            except Exception as e:
+                logging.error(f"worker-{index} 认领任务时数据库出错: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            logging.info(f"[{job['round_id']}/{job['card_id']}] worker-{index} 认领任务 (第 {job['attempts'] + 1} 次尝试)。")
+            heartbeat = asyncio.create_task(self.heartbeat_loop(job["round_id"], job["card_id"]))
+            try:
+                await self.handler(job)
+            except Exception as e:
+                logging.error(f"[{job['round_id']}/{job['card_id']}] worker-{index} 执行任务时未捕获的异常: {e}", exc_info=True)
+            finally:
+                heartbeat.cancel()
+
+    async def start(self):
+        """回收过期任务并启动 worker 池。"""
+        await self.db.run(self.reclaim_stale)
+        self._stopping = False
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        logging.info(f"任务队列已启动: {self.concurrency} 个 worker (worker_id={self.worker_id})。")
+
+    async def stop(self):
+        self._stopping = True
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
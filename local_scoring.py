@@ -0,0 +1,191 @@
+# local_scoring.py (本地临时评分)
+#
+# 两份 ASR 数据就绪后、Gemini 报告返回前，先在本地给出一份临时报告：
+#   词对齐   : 原句与复述的词序列按编辑距离对齐，得到遗漏、增加与替换的词。
+#              动态规划按行向量化 (numpy)：删除/替换一次算出整行，插入的依赖链用累计最小值消去；
+#              未安装 numpy 时退回逐格计算，结果相同。numpy 在首次对齐时才导入，不计入导入 main 的耗时。
+#   语音统计 : 由词级 start/end/confidence 计算语速、停顿与平均置信度 (derive_features)。
+# 评分权重与单句 Prompt 一致：意义保真度 50%，流畅度与节奏 30%；表达方式 (20%) 无法在本地判断，
+# 以识别置信度 (发音清晰度的近似) 代替。结果只在 Gemini 报告到达前作为参考。
+
+import re
+
+# 超过该时长的词间间隔计为停顿
+PAUSE_THRESHOLD_MS = 500
+# 低于该置信度的词视为可能发音不清
+LOW_CONFIDENCE = 0.6
+# 虚词遗漏对意义的影响较小，覆盖率中权重较低
+FUNCTION_WORDS = frozenset(
+    "a an the to of in on at by for with from and or but so is am are was were be been being "
+    "it its this that these those i you he she we they me him her us them my your his our their "
+    "do does did have has had will would can could shall should may might must not".split()
+)
+
+
+def normalize_token(text: str) -> str:
+    return re.sub(r"[^\w']+", "", (text or "").lower()).strip("'")
+
+
+def timed_words(asr_data: dict) -> list:
+    return [w for w in asr_data.get("words") or [] if w.get("start") is not None and w.get("end") is not None]
+
+
+def derive_features(asr_data: dict) -> dict:
+    """从词级 ASR 数据计算时长、语速、平均置信度与停顿等特征。"""
+    words = timed_words(asr_data)
+    if not words:
+        return {"word_count": 0, "duration_ms": 0, "speech_rate_wpm": None, "mean_confidence": None, "pause_count": 0,
+                "longest_pause_ms": 0}
+    duration_ms = words[-1]["end"] - words[0]["start"]
+    gaps = [b["start"] - a["end"] for a, b in zip(words, words[1:])]
+    confidences = [w["confidence"] for w in words if w.get("confidence") is not None]
+    return {
+        "word_count": len(words),
+        "duration_ms": duration_ms,
+        "speech_rate_wpm": round(len(words) * 60000 / duration_ms, 1) if duration_ms > 0 else None,
+        "mean_confidence": round(sum(confidences) / len(confidences), 4) if confidences else None,
+        "pause_count": sum(1 for gap in gaps if gap > PAUSE_THRESHOLD_MS),
+        "longest_pause_ms": max(gaps, default=0),
+    }
+
+
+# --- 词对齐 ---
+
+def edit_distance_matrix(source: list, target: list):
+    """返回 (len(source)+1) x (len(target)+1) 的编辑距离矩阵，source/target 为整数编码的词序列。"""
+    n, m = len(source), len(target)
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+    if np is not None:
+        target_codes = np.asarray(target, dtype=np.int64)
+        offsets = np.arange(m + 1)
+        matrix = np.empty((n + 1, m + 1), dtype=np.int64)
+        matrix[0] = offsets
+        for i in range(1, n + 1):
+            previous = matrix[i - 1]
+            row = np.empty(m + 1, dtype=np.int64)
+            row[0] = i
+            # 替换 (或匹配) 与删除只依赖上一行
+            row[1:] = np.minimum(previous[:-1] + (target_codes != source[i - 1]), previous[1:] + 1)
+            # 插入: row[j] = min_k (row[k] + j - k)，即 (row - j) 的前缀最小值再加回 j
+            matrix[i] = np.minimum.accumulate(row - offsets) + offsets
+        return matrix
+
+    matrix = [list(range(m + 1))]
+    for i in range(1, n + 1):
+        previous, row = matrix[-1], [i]
+        for j in range(1, m + 1):
+            row.append(min(previous[j - 1] + (source[i - 1] != target[j - 1]), previous[j] + 1, row[j - 1] + 1))
+        matrix.append(row)
+    return matrix
+
+
+def align_words(original: list, practice: list) -> list:
+    """对齐两个词序列，返回 [(操作, 原句词, 复述词)]；操作为 match / substitute / missing / added。"""
+    vocabulary = {}
+    source = [vocabulary.setdefault(token, len(vocabulary)) for token in original]
+    target = [vocabulary.setdefault(token, len(vocabulary)) for token in practice]
+    matrix = edit_distance_matrix(source, target)
+
+    # 代价相同的路径中优先 匹配 > 遗漏 > 增加 > 替换，使 "over the lazy dog" / "over lazy big dog"
+    # 对齐为遗漏 the、增加 big，而不是两次替换
+    operations = []
+    i, j = len(source), len(target)
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and source[i - 1] == target[j - 1] and matrix[i][j] == matrix[i - 1][j - 1]:
+            operations.append(("match", original[i - 1], practice[j - 1]))
+            i, j = i - 1, j - 1
+        elif i > 0 and matrix[i][j] == matrix[i - 1][j] + 1:
+            operations.append(("missing", original[i - 1], None))
+            i -= 1
+        elif j > 0 and matrix[i][j] == matrix[i][j - 1] + 1:
+            operations.append(("added", None, practice[j - 1]))
+            j -= 1
+        else:
+            operations.append(("substitute", original[i - 1], practice[j - 1]))
+            i, j = i - 1, j - 1
+    operations.reverse()
+    return operations
+
+
+# --- 评分 ---
+
+def clamp_score(value: float) -> int:
+    return int(round(min(100.0, max(0.0, value))))
+
+
+def fidelity_score(operations: list) -> tuple:
+    """返回 (分数, 词覆盖率, 实词覆盖率)；实词覆盖率占 70%，增加的词每个扣 2 分 (最多 20 分)。"""
+    original = [op for op in operations if op[0] != "added"]
+    content = [op for op in original if op[1] not in FUNCTION_WORDS]
+    coverage = sum(op[0] == "match" for op in original) / len(original) if original else 0.0
+    content_coverage = sum(op[0] == "match" for op in content) / len(content) if content else coverage
+    added = sum(op[0] == "added" for op in operations)
+    return clamp_score(100 * (0.7 * content_coverage + 0.3 * coverage) - min(20, 2 * added)), coverage, content_coverage
+
+
+def fluency_score(original_features: dict, practice_features: dict) -> int:
+    """以原句为基准：语速偏离、比原句多出的停顿与过长的停顿分别扣分；复述中没有带时间戳的词时为 0。"""
+    if not practice_features.get("word_count"):
+        return 0
+    score = 100.0
+    reference_rate, practice_rate = original_features.get("speech_rate_wpm"), practice_features.get("speech_rate_wpm")
+    if reference_rate and practice_rate:
+        score -= min(40.0, abs(1 - practice_rate / reference_rate) * 60)
+    extra_pauses = practice_features.get("pause_count", 0) - original_features.get("pause_count", 0)
+    score -= min(40.0, 10.0 * max(0, extra_pauses))
+    if practice_features.get("longest_pause_ms", 0) > 3 * PAUSE_THRESHOLD_MS:
+        score -= 10.0
+    return clamp_score(score)
+
+
+def score_locally(original_asr_data: dict, practice_asr_data: dict, original_features: dict = None) -> dict:
+    """生成临时报告；字段名与 Gemini 报告的对应部分一致，便于客户端在报告到达前先行展示。
+
+    original_features 为标准音频预先派生的特征 (如参考句目录中存储的)，未提供时由 original_asr_data 计算。
+    """
+    original_tokens = [t for t in (normalize_token(w.get("text")) for w in original_asr_data.get("words") or []) if t]
+    practice_tokens = [t for t in (normalize_token(w.get("text")) for w in practice_asr_data.get("words") or []) if t]
+    operations = align_words(original_tokens, practice_tokens)
+    if original_features is None:
+        original_features = derive_features(original_asr_data)
+    practice_features = derive_features(practice_asr_data)
+
+    fidelity, coverage, content_coverage = fidelity_score(operations)
+    fluency = fluency_score(original_features, practice_features)
+    confidence = practice_features.get("mean_confidence")
+    if confidence is not None:
+        clarity = clamp_score((confidence - 0.5) * 200)
+    else:
+        # 没有置信度时以流畅度代替；没有可用的复述词时两者都是 0
+        clarity = fluency
+    low_confidence = [w.get("text") for w in timed_words(practice_asr_data)
+                      if w.get("confidence") is not None and w["confidence"] < LOW_CONFIDENCE]
+
+    return {
+        "provisional": True,
+        "meaning_fidelity": {
+            "score": fidelity,
+            "word_coverage": round(coverage, 3),
+            "content_word_coverage": round(content_coverage, 3),
+            "missing_words": [op[1] for op in operations if op[0] == "missing"],
+            "added_words": [op[2] for op in operations if op[0] == "added"],
+            "substitutions": [{"original": op[1], "practice": op[2]} for op in operations if op[0] == "substitute"],
+        },
+        "fluency_and_rhythm": {
+            "score": fluency,
+            "speech_rate_wpm": practice_features.get("speech_rate_wpm"),
+            "reference_speech_rate_wpm": original_features.get("speech_rate_wpm"),
+            "pause_count": practice_features.get("pause_count", 0),
+            "reference_pause_count": original_features.get("pause_count", 0),
+            "longest_pause_ms": practice_features.get("longest_pause_ms", 0),
+        },
+        "pronunciation_clarity": {
+            "score": clarity,
+            "mean_confidence": confidence,
+            "low_confidence_words": low_confidence,
+        },
+        "overall_score": clamp_score(0.5 * fidelity + 0.3 * fluency + 0.2 * clarity),
+    }
@@ -1,65 +1,251 @@
 # main.py (理念对齐最终版)
 
-import assemblyai as aai
-from google import genai
 import asyncio
 import json
 import os
+import shutil
 import sqlite3
 import logging
 import fastapi
-from fastapi import File, UploadFile, HTTPException, Form, BackgroundTasks
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import time
 import uuid
-import uvicorn
+from contextlib import asynccontextmanager
+from clients import ClientRegistry
+from asr_poller import AssemblyAITranscriptService, TranscriptPoller
+from transcript_cache import TranscriptCache, hash_audio_file
+from round_summary_store import RoundSummaryStore
+from reference_catalog import ReferenceCatalog
+from local_scoring import score_locally
+from card_batcher import CardEvaluationBatcher
+from upload_stream import (
+    MultipartDiskParser, MultipartFormError, StreamedFilePart, StreamProtocolError, UploadTooLargeError, parse_control_message,
+    receive_stream_message, receive_websocket_file,
+)
+from job_queue import JobQueue, ensure_queue_columns
+from db import Database
+from prompt_encoding import ASR_ENCODINGS, TABLE_FORMAT_NOTE, encode_asr_data
+from result_store import (ensure_result_columns, load_card_result, load_round_jobs, migrate_legacy_results, public_status,
+                          save_completed_result, save_provisional_result)
+from events import RoundEventBroker, format_sse, make_job_event
+from provider_scheduler import ProviderScheduler
+from streaming_asr import AssemblyAIStreamingTranscriber
+import audio_normalize
+from audio_normalize import normalize_audio, shift_word_timestamps
+from metrics import ASR_PENDING_TRANSCRIPTS, JOBS_BY_STATUS, REGISTRY, StageTimings, render_provider_snapshots
 
 # --- 1. 定义所有配置变量 ---
-DB_FILE = "evaluation_jobs.db"
+DB_FILE = os.getenv("DB_FILE", "evaluation_jobs.db")
+TEMP_AUDIO_DIR = os.getenv("TEMP_AUDIO_DIR", "temp_audio")
+DB_THREADS = int(os.getenv("DB_THREADS", "4"))
+# Prompt 中 ASR 数据的编码方式: table (紧凑表格，默认) 或 json (旧版 indent=2 JSON)
+PROMPT_ASR_ENCODING = os.getenv("PROMPT_ASR_ENCODING", "table")
+if PROMPT_ASR_ENCODING not in ASR_ENCODINGS:
+    # 在启动时报错，而不是等到第一张卡片构建 Prompt 时才失败
+    raise ValueError(f"Invalid PROMPT_ASR_ENCODING: {PROMPT_ASR_ENCODING!r} (expected one of {ASR_ENCODINGS})")
 ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY", "在此处替换为您的 AssemblyAI API 密钥")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "在此处替换为您的 Google Gemini API 密钥")
 GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-1.5-flash")
+TRANSCRIPT_CACHE_MAX_ENTRIES = int(os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES", "5000"))
+TRANSCRIPT_CACHE_MAX_AGE_DAYS = float(os.getenv("TRANSCRIPT_CACHE_MAX_AGE_DAYS", "30"))
+TRANSCRIPT_CACHE_LRU_SIZE = int(os.getenv("TRANSCRIPT_CACHE_LRU_SIZE", "256"))
+ROUND_SUMMARY_REFRESH_DELAY_SECONDS = float(os.getenv("ROUND_SUMMARY_REFRESH_DELAY_SECONDS", "5"))
+# 汇总刷新的跨进程租约时长 (秒)，刷新期间每 1/3 时长续约一次；持有者崩溃后其他进程最多等待该时长再接手
+ROUND_SUMMARY_LEASE_SECONDS = float(os.getenv("ROUND_SUMMARY_LEASE_SECONDS", "120"))
+# 已完成卡片数达到该值的轮次改为分层汇总：每 ROUND_SUMMARY_CHUNK_SIZE 张卡片并发生成一份摘要，再由摘要汇总
+ROUND_SUMMARY_CHUNK_SIZE = int(os.getenv("ROUND_SUMMARY_CHUNK_SIZE", "20"))
+ROUND_SUMMARY_HIERARCHICAL_MIN_CARDS = int(os.getenv("ROUND_SUMMARY_HIERARCHICAL_MIN_CARDS", "40"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# 设为 false 时 HTTP 进程只负责入队，由独立的 worker.py 进程消费队列
+JOB_EMBEDDED_WORKERS = os.getenv("JOB_EMBEDDED_WORKERS", "true").lower() in ("1", "true", "yes")
+# 第三方 API 调度：令牌桶限速、并发上限、可重试错误的指数退避
+GEMINI_RATE_PER_SECOND = float(os.getenv("GEMINI_RATE_PER_SECOND", "5"))
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "10"))
+GEMINI_MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "8"))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "120"))
+GEMINI_SUMMARY_TIMEOUT_SECONDS = float(os.getenv("GEMINI_SUMMARY_TIMEOUT_SECONDS", "180"))
+# 同一轮次的卡片在该窗口 (秒) 内到达时合并为一次 Gemini 调用，每批最多 GEMINI_BATCH_MAX_CARDS 张；0 表示逐张评测
+GEMINI_BATCH_WINDOW_SECONDS = float(os.getenv("GEMINI_BATCH_WINDOW_SECONDS", "0"))
+GEMINI_BATCH_MAX_CARDS = int(os.getenv("GEMINI_BATCH_MAX_CARDS", "8"))
+ASR_RATE_PER_SECOND = float(os.getenv("ASR_RATE_PER_SECOND", "5"))
+ASR_BURST = int(os.getenv("ASR_BURST", "10"))
+ASR_MAX_IN_FLIGHT = int(os.getenv("ASR_MAX_IN_FLIGHT", "8"))
+# 批量转录改为异步提交 + 单个轮询循环，不再为每次转录占用一个线程；false 时使用 SDK 的同步 transcribe
+ASR_ASYNC_POLLING = os.getenv("ASR_ASYNC_POLLING", "true").lower() in ("1", "true", "yes")
+ASR_POLL_INITIAL_SECONDS = float(os.getenv("ASR_POLL_INITIAL_SECONDS", "1"))
+ASR_POLL_MAX_SECONDS = float(os.getenv("ASR_POLL_MAX_SECONDS", "5"))
+ASR_POLL_CONCURRENCY = int(os.getenv("ASR_POLL_CONCURRENCY", "16"))
+ASR_TRANSCRIPT_TIMEOUT_SECONDS = float(os.getenv("ASR_TRANSCRIPT_TIMEOUT_SECONDS", "600"))
+PROVIDER_MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "4"))
+BATCH_MAX_CARDS = int(os.getenv("BATCH_MAX_CARDS", "100"))
+# 事件流空闲时发送心跳并与数据库对账的间隔 (任务可能由独立 worker 进程完成)
+SSE_RECONCILE_SECONDS = float(os.getenv("SSE_RECONCILE_SECONDS", "5"))
+# WebSocket 流式提交时练习音频 (PCM16 单声道) 的默认采样率
+STREAM_SAMPLE_RATE = int(os.getenv("STREAM_SAMPLE_RATE", "16000"))
+STREAM_IDLE_TIMEOUT_SECONDS = float(os.getenv("STREAM_IDLE_TIMEOUT_SECONDS", "30"))
+# ASR 前的音频归一化：单声道、重采样、去首尾静音，可选 FLAC 编码；依赖 numpy 与 soundfile (见 audio_normalize.py)
+AUDIO_NORMALIZE = os.getenv("AUDIO_NORMALIZE", "true").lower() in ("1", "true", "yes")
+AUDIO_TARGET_SAMPLE_RATE = int(os.getenv("AUDIO_TARGET_SAMPLE_RATE", "16000"))
+AUDIO_TRIM_SILENCE = os.getenv("AUDIO_TRIM_SILENCE", "true").lower() in ("1", "true", "yes")
+AUDIO_SILENCE_THRESHOLD_DB = float(os.getenv("AUDIO_SILENCE_THRESHOLD_DB", "-35"))
+AUDIO_NORMALIZE_ENCODING = os.getenv("AUDIO_NORMALIZE_ENCODING", "wav")
+# 第三方客户端在首次使用时 (于线程内) 才创建，只负责入队的进程不会导入 SDK；为 true 时在 lifespan 中预先创建完成后
+# 才开始接受请求 (启动变慢，但首个请求不承担 SDK 导入耗时)
+PRELOAD_CLIENTS = os.getenv("PRELOAD_CLIENTS", "false").lower() in ("1", "true", "yes")
+# ASR 完成后先由本地词对齐与语音统计给出临时评分 (PARTIAL)，Gemini 报告到达后替换
+LOCAL_SCORING = os.getenv("LOCAL_SCORING", "true").lower() in ("1", "true", "yes")
 
 # --- 2. 配置日志 ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# --- 3. 配置API库 ---
-if ASSEMBLYAI_API_KEY and not ASSEMBLYAI_API_KEY.startswith("在此处"):
-    aai.settings.api_key = ASSEMBLYAI_API_KEY
+# --- 3. 检查API密钥 ---
+ASSEMBLYAI_CONFIGURED = bool(ASSEMBLYAI_API_KEY) and not ASSEMBLYAI_API_KEY.startswith("在此处")
+GEMINI_CONFIGURED = bool(GEMINI_API_KEY) and not GEMINI_API_KEY.startswith("在此处")
+if ASSEMBLYAI_CONFIGURED:
     logging.info("✅ AssemblyAI API 密钥已配置")
 else:
     logging.warning("⚠️ AssemblyAI API 密钥未正确设置")
-
-# --- 4. 创建全局客户端 ---
-transcriber_client = aai.Transcriber() if aai.settings.api_key else None
-gemini_client = None
-if GEMINI_API_KEY and not GEMINI_API_KEY.startswith("在此处"):
-    gemini_client = genai.Client(api_key=GEMINI_API_KEY)
+if GEMINI_CONFIGURED:
     logging.info("✅ Gemini API 密钥已配置")
 else:
     logging.warning("⚠️ Gemini API 密钥未正确设置")
 
-if not transcriber_client:
-    logging.warning("AssemblyAI 客户端未创建，因为 API 密钥未设置。")
-if not gemini_client:
-    logging.warning("Gemini 客户端未创建，因为 API 密钥未设置。")
+# --- 4. 登记全局客户端 ---
+# SDK 在创建函数内导入，导入 main 本身不再加载 assemblyai 与 google.genai
+def create_transcriber():
+    if not ASSEMBLYAI_CONFIGURED:
+        return None
+    import assemblyai as aai
+    aai.settings.api_key = ASSEMBLYAI_API_KEY
+    return aai.Transcriber()
+
+def create_streaming_transcriber():
+    # 流式转录 (WebSocket 提交)；SDK 在打开会话时才导入
+    return AssemblyAIStreamingTranscriber(ASSEMBLYAI_API_KEY) if ASSEMBLYAI_CONFIGURED else None
+
+def create_transcript_service():
+    # 异步提交与批量查询状态的 REST 客户端，供 transcript_poller 使用
+    if not ASSEMBLYAI_CONFIGURED or not ASR_ASYNC_POLLING:
+        return None
+    return AssemblyAITranscriptService(ASSEMBLYAI_API_KEY, poll_concurrency=ASR_POLL_CONCURRENCY)
+
+def create_gemini_client():
+    if not GEMINI_CONFIGURED:
+        return None
+    from google import genai
+    return genai.Client(api_key=GEMINI_API_KEY)
+
+# 可通过 clients.set 替换为 benchmarks/fake_providers.py 中的本地替身
+clients = ClientRegistry()
+clients.register("transcriber", create_transcriber)
+clients.register("streaming_transcriber", create_streaming_transcriber)
+clients.register("transcript_service", create_transcript_service)
+clients.register("gemini", create_gemini_client)
+
+gemini_scheduler = ProviderScheduler(
+    "gemini", rate_per_second=GEMINI_RATE_PER_SECOND, burst=GEMINI_BURST,
+    max_in_flight=GEMINI_MAX_IN_FLIGHT, max_retries=PROVIDER_MAX_RETRIES,
+)
+asr_scheduler = ProviderScheduler(
+    "assemblyai", rate_per_second=ASR_RATE_PER_SECOND, burst=ASR_BURST,
+    max_in_flight=ASR_MAX_IN_FLIGHT, max_retries=PROVIDER_MAX_RETRIES,
+)
+
+# 所有未完成的批量转录由同一个 asyncio 轮询循环跟踪
+transcript_poller = TranscriptPoller(
+    lambda: clients.get("transcript_service"),
+    initial_interval=ASR_POLL_INITIAL_SECONDS, max_interval=ASR_POLL_MAX_SECONDS,
+    timeout_seconds=ASR_TRANSCRIPT_TIMEOUT_SECONDS,
+)
+
+# 同一轮次卡片的 Gemini 微批评测 (GEMINI_BATCH_WINDOW_SECONDS > 0 时启用)；评测函数定义在下方，通过 lambda 延迟引用
+card_batcher = CardEvaluationBatcher(
+    evaluate_batch=lambda round_id, cards: evaluate_card_batch(round_id, cards),
+    evaluate_single=lambda round_id, card_id, original, practice, timings: request_card_report(
+        round_id, card_id, original, practice, timings),
+    window_seconds=GEMINI_BATCH_WINDOW_SECONDS,
+    max_cards=GEMINI_BATCH_MAX_CARDS,
+)
+
+if AUDIO_NORMALIZE and not audio_normalize.is_installed("numpy"):
+    logging.warning("未安装 numpy (项目依赖)，音频归一化已停用，将直接上传原始音频。")
+elif AUDIO_NORMALIZE and not audio_normalize.is_installed("soundfile") and not audio_normalize.ffmpeg_path():
+    logging.warning("未安装 soundfile (项目依赖) 且没有 ffmpeg，只有 PCM WAV 会被归一化。")
+
+# --- 5. 数据库 ---
+# 所有数据库访问都经由共享的 Database (WAL、长连接复用、专用线程池)；连接在首次使用时建立
+db = Database(DB_FILE, threads=DB_THREADS)
+transcript_cache = TranscriptCache(
+    db,
+    max_entries=TRANSCRIPT_CACHE_MAX_ENTRIES,
+    max_age_seconds=TRANSCRIPT_CACHE_MAX_AGE_DAYS * 24 * 3600,
+    lru_size=TRANSCRIPT_CACHE_LRU_SIZE,
+)
+# generate_round_summary 等定义在下方，这里通过 lambda 延迟引用
+round_summary_store = RoundSummaryStore(
+    db,
+    generate=lambda round_id, card_data, timings: generate_round_summary(round_id, card_data, timings),
+    refresh_delay_seconds=ROUND_SUMMARY_REFRESH_DELAY_SECONDS,
+    digest=lambda round_id, chunk_index, card_data: digest_round_chunk(round_id, chunk_index, card_data),
+    generate_from_digests=lambda round_id, digests, timings: generate_round_summary_from_digests(round_id, digests, timings),
+    chunk_size=ROUND_SUMMARY_CHUNK_SIZE,
+    hierarchical_min_cards=ROUND_SUMMARY_HIERARCHICAL_MIN_CARDS,
+    lease_seconds=ROUND_SUMMARY_LEASE_SECONDS,
+)
+# 参考句目录：预先转录的标准音频，提交时可以引用而不必上传 original_audio
+reference_catalog = ReferenceCatalog(db)
+# 任务状态变化的进程内广播，供 /round-events 推送给订阅者
+round_events = RoundEventBroker()
+job_queue = JobQueue(
+    db,
+    handler=lambda job: run_queued_job(job),
+    concurrency=JOB_WORKER_CONCURRENCY,
+    lease_seconds=JOB_LEASE_SECONDS,
+    max_attempts=JOB_MAX_ATTEMPTS,
+)
 
-# --- 5. 数据库初始化 ---
 def init_db():
+    """建表与迁移。由应用 lifespan 调用；worker.py 等不经过 lifespan 的入口需自行调用。"""
     if not os.path.exists(DB_FILE):
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE jobs (
-                    round_id TEXT, card_id TEXT, status TEXT,
-                    result TEXT, error_message TEXT,
-                    PRIMARY KEY (round_id, card_id)
-                )""")
+        db.execute("""
+            CREATE TABLE jobs (
+                round_id TEXT, card_id TEXT, status TEXT,
+                result TEXT, error_message TEXT,
+                PRIMARY KEY (round_id, card_id)
+            )""")
         logging.info("数据库已初始化。")
-init_db()
+    ensure_queue_columns(db)
+    # 报告、评分与压缩后的 ASR 源数据分列存储；旧的 result 列在此一次性迁移
+    ensure_result_columns(db)
+    migrate_legacy_results(db)
+    # 转录缓存表、汇总报告表与 jobs 同库；对已存在的旧数据库同样需要补建
+    transcript_cache.init_table()
+    round_summary_store.init_table()
+    reference_catalog.init_table()
 
 # --- FastAPI 应用实例 ---
-app = fastapi.FastAPI()
+@asynccontextmanager
+async def lifespan(app: fastapi.FastAPI):
+    await db.run(init_db)
+    if PRELOAD_CLIENTS:
+        # SDK 导入与客户端创建是阻塞操作，在线程中完成，不占用事件循环
+        await asyncio.to_thread(clients.preload)
+    if JOB_EMBEDDED_WORKERS:
+        await job_queue.start()
+    yield
+    if JOB_EMBEDDED_WORKERS:
+        await job_queue.stop()
+    await transcript_poller.close()
+    if clients.is_created("transcript_service") and clients.get("transcript_service") is not None:
+        await clients.get("transcript_service").aclose()
+    db.close()
+
+app = fastapi.FastAPI(lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
 
@@ -67,21 +253,70 @@ app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True,
 
 # 【已移除】calculate_missing_words 函数已被移除，因为它不符合“功能对等”的评估理念。
 
-def build_single_card_gemini_prompt(original_asr_data: dict, practice_asr_data: dict) -> str:
-    # 【已更新】使用最新的、以“意义保真度”和“功能对等”为核心的Prompt
-    return f"""
-你是一位AI语言教练，专注于分析用户的**复述 (Retelling)** 练习。你的核心任务是评估用户在**脱离文本**的情况下，对原句**核心意义的理解、整合与重构能力**。你的反馈应鼓励有效的**意译 (paraphrasing)**，而不是死板地抠字眼。你的反馈必须简洁、数据驱动、直击要点。注意所有的回答必须用中文回答。
+def transcribe_to_asr_data(audio_path: str) -> dict:
+    """同步调用 AssemblyAI 转录，并转换为 {"text", "words"} 结构。"""
+    transcript = clients.get("transcriber").transcribe(audio_path)
+    # aai.TranscriptStatus 是 str 枚举，直接与取值比较，无需在此导入 SDK
+    if transcript.status == "error":
+        raise Exception(f"ASR Error: {transcript.error}")
+    return {"text": transcript.text, "words": [word.dict() for word in transcript.words]}
 
-**输入数据:**
+async def asr_available() -> bool:
+    return await clients.aget("transcript_service") is not None or await clients.aget("transcriber") is not None
 
-1. `original_asr_data`: 标准发音的ASR数据。
-    
-2. `practice_asr_data`: 用户复述的ASR数据。
-    
+async def run_asr(audio_path: str, log_prefix: str) -> dict:
+    """经调度器转录：有异步转录服务时只有上传与提交经过调度器，随后交给轮询循环等待 (不占用调度器名额)；
+    否则在线程中调用 SDK (同步轮询，整个转录期间占用线程与名额)。"""
+    service = await clients.aget("transcript_service")
+    if service is not None:
+        transcript_id = await asr_scheduler.call(service.submit, audio_path)
+        return await transcript_poller.wait(transcript_id, log_prefix)
+    return await asr_scheduler.call(asyncio.to_thread, transcribe_to_asr_data, audio_path)
 
-**你的任务：** 严格按照以下JSON结构，生成一份侧重于意义和表达的诊断报告。
+async def transcribe_audio(audio_path: str, log_prefix: str, timings: StageTimings = None, stage: str = "normalize") -> dict:
+    """归一化音频后经调度器调用 ASR，并把词级时间戳移回原音频的时间轴。"""
+    if not AUDIO_NORMALIZE:
+        return await run_asr(audio_path, log_prefix)
+
+    with (timings or StageTimings("card")).stage(stage):
+        normalized = await asyncio.to_thread(
+            normalize_audio, audio_path, AUDIO_TARGET_SAMPLE_RATE, AUDIO_TRIM_SILENCE, AUDIO_SILENCE_THRESHOLD_DB, AUDIO_NORMALIZE_ENCODING,
+            TEMP_AUDIO_DIR,
+        )
+    if normalized.normalized:
+        logging.info(
+            f"{log_prefix} 音频已归一化: {normalized.source_bytes} → {normalized.output_bytes} 字节, "
+            f"{normalized.source_duration_ms} → {normalized.output_duration_ms} ms (开头裁掉 {normalized.offset_ms} ms)。"
+        )
+    else:
+        logging.info(f"{log_prefix} 跳过音频归一化: {normalized.skipped_reason}")
+    try:
+        asr_data = await run_asr(normalized.path, log_prefix)
+    finally:
+        if normalized.path != audio_path:
+            remove_files(normalized.path)
+    return shift_word_timestamps(asr_data, normalized.offset_ms)
+
+async def get_original_asr_data(original_audio_path: str, log_prefix: str, audio_hash: str = None, timings: StageTimings = None) -> dict:
+    """标准音频转录：先按音频内容哈希查缓存，未命中再调用 ASR 并回填缓存。
+
+    缓存键是原始上传内容的哈希，缓存的时间戳已移回原音频的时间轴，与归一化参数无关。
+    """
+    if audio_hash is None:
+        audio_hash = await asyncio.to_thread(hash_audio_file, original_audio_path)
+    cached = await db.run(transcript_cache.get, audio_hash)
+    if cached is not None:
+        logging.info(f"{log_prefix} 标准音频命中转录缓存 ({audio_hash[:12]})。")
+        return cached
 
-#### **【核心】JSON输出结构:**
+    asr_data = await transcribe_audio(original_audio_path, log_prefix, timings, "normalize_original")
+    await db.run(transcript_cache.put, audio_hash, asr_data)
+    return asr_data
+
+# 单卡报告的角色说明与输出结构，单卡 Prompt 与微批 Prompt (build_batch_card_gemini_prompt) 共用
+CARD_COACH_INTRO = "你是一位AI语言教练，专注于分析用户的**复述 (Retelling)** 练习。你的核心任务是评估用户在**脱离文本**的情况下，对原句**核心意义的理解、整合与重构能力**。你的反馈应鼓励有效的**意译 (paraphrasing)**，而不是死板地抠字眼。你的反馈必须简洁、数据驱动、直击要点。注意所有的回答必须用中文回答。"
+
+CARD_REPORT_SPEC = """#### **【核心】JSON输出结构:**
 
 **1. `meaning_fidelity` (意义保真度)**
 
@@ -118,170 +353,65 @@ def build_single_card_gemini_prompt(original_asr_data: dict, practice_asr_data:
 **5. `overall_score` (综合评分)**
 
 - (int) 0到100的综合评分。评分权重：**意义保真度 (50%)**，流畅度与节奏 (30%)，表达方式 (20%)。
-    
-
-**输入数据示例:** `original_asr_data`: {json.dumps(original_asr_data, indent=2)} `practice_asr_data`: {json.dumps(practice_asr_data, indent=2)}
-
-请现在开始你的分析，并确保输出是一个可以被程序直接解析的、格式正确的 JSON 对象。
-"""
-
-async def process_and_store_evaluation(practice_audio_path: str, original_audio_path: str, round_id: str, card_id: str):
-    try:
-        with sqlite3.connect(DB_FILE) as conn:
-            conn.execute("UPDATE jobs SET status = ? WHERE round_id = ? AND card_id = ?", ("PROCESSING", round_id, card_id))
-        logging.info(f"[{round_id}/{card_id}] 状态更新为 PROCESSING。")
-    except Exception as e:
-        logging.error(f"[{round_id}/{card_id}] 更新状态为 PROCESSING 时数据库出错: {e}")
-        return
-
-    try:
-        if not transcriber_client or not gemini_client:
-            raise Exception("API clients are not initialized due to missing keys.")
-
-        logging.info(f"[{round_id}/{card_id}] 开始并行转录音频...")
-        practice_task = asyncio.to_thread(transcriber_client.transcribe, practice_audio_path)
-        original_task = asyncio.to_thread(transcriber_client.transcribe, original_audio_path)
-        practice_transcript, original_transcript = await asyncio.gather(practice_task, original_task)
+    """
 
-        if practice_transcript.status == aai.TranscriptStatus.error or original_transcript.status == aai.TranscriptStatus.error:
-            raise Exception(f"ASR Error - Practice: {practice_transcript.error}, Original: {original_transcript.error}")
+def build_single_card_gemini_prompt(original_asr_data: dict, practice_asr_data: dict, encoding: str = None) -> str:
+    # 【已更新】使用最新的、以“意义保真度”和“功能对等”为核心的Prompt
+    encoding = encoding or PROMPT_ASR_ENCODING
+    format_note = TABLE_FORMAT_NOTE if encoding == "table" else ""
+    return f"""
+{CARD_COACH_INTRO}
 
-        original_asr_data = {"text": original_transcript.text, "words": [word.dict() for word in original_transcript.words]}
-        practice_asr_data = {"text": practice_transcript.text, "words": [word.dict() for word in practice_transcript.words]}
-        
-        # 【已移除】不再需要计算和传递 missing_words
-        logging.info(f"[{round_id}/{card_id}] 构建 Prompt 并调用 Gemini...")
-        prompt = build_single_card_gemini_prompt(original_asr_data, practice_asr_data)
-        
-        logging.info(f"[{round_id}/{card_id}] 开始调用 Gemini API (超时设置为120秒)...")
-        response = await gemini_client.aio.models.generate_content(
-            model=GEMINI_MODEL_NAME,
-            contents=prompt
-        )
-        logging.info(f"[{round_id}/{card_id}] Gemini API 调用成功返回。")
-        
-        cleaned_response = response.candidates[0].content.parts[0].text.strip().lstrip("```json").rstrip("```").strip()
-        evaluation_report = json.loads(cleaned_response)
-
-        # 【已更新】存储的数据中不再包含多余的 source_data.missing_words
-        full_card_data = { 
-            "evaluation_report": evaluation_report, 
-            "source_data": { 
-                "original_asr": original_asr_data, 
-                "practice_asr": practice_asr_data
-            } 
-        }
-        
-        with sqlite3.connect(DB_FILE) as conn:
-            result_json = json.dumps(full_card_data)
-            conn.execute("UPDATE jobs SET status = ?, result = ? WHERE round_id = ? AND card_id = ?", ("COMPLETED", result_json, round_id, card_id))
-        logging.info(f"[{round_id}/{card_id}] 评测成功，结果已存入数据库。")
+**输入数据:**
 
-    except Exception as e:
-        logging.error(f"[{round_id}/{card_id}] 处理后台任务时发生严重错误: {e}", exc_info=True)
-        try:
-            with sqlite3.connect(DB_FILE) as conn:
-                error_msg = str(e)
-                conn.execute("UPDATE jobs SET status = ?, error_message = ? WHERE round_id = ? AND card_id = ?", ("FAILED", error_msg, round_id, card_id))
-        except Exception as db_e:
-            logging.error(f"[{round_id}/{card_id}] 记录 FAILED 状态到数据库时再次出错: {db_e}")
-            
-    finally:
-        logging.info(f"[{round_id}/{card_id}] 开始清理临时文件...")
-        if os.path.exists(practice_audio_path): os.remove(practice_audio_path)
-        if os.path.exists(original_audio_path): os.remove(original_audio_path)
-        logging.info(f"[{round_id}/{card_id}] 后台任务处理流程结束。")
+1. `original_asr_data`: 标准发音的ASR数据。
+    
+2. `practice_asr_data`: 用户复述的ASR数据。
+    
 
+**你的任务：** 严格按照以下JSON结构，生成一份侧重于意义和表达的诊断报告。
 
-# --- FastAPI 端点 ---
+{CARD_REPORT_SPEC}
 
-@app.post("/evaluate-single-card", status_code=202)
-async def evaluate_single_card(
-    background_tasks: BackgroundTasks,
-    round_id: str = Form(...),
-    card_id: str = Form(...),
-    practice_audio: UploadFile = File(...),
-    original_audio: UploadFile = File(...)
-):
-    try:
-        with sqlite3.connect(DB_FILE) as conn:
-            conn.execute("INSERT INTO jobs (round_id, card_id, status) VALUES (?, ?, ?)", (round_id, card_id, "PENDING"))
-    except sqlite3.IntegrityError:
-         return JSONResponse(status_code=409, content={"detail": "Job for this round_id and card_id already exists."})
-    except Exception as e:
-        logging.error(f"创建任务记录失败: {e}")
-        raise HTTPException(status_code=500, detail="Failed to create job record in database.")
+**输入数据示例:** {format_note}`original_asr_data`: {encode_asr_data(original_asr_data, encoding)} `practice_asr_data`: {encode_asr_data(practice_asr_data, encoding)}
 
-    temp_dir = "temp_audio"
-    os.makedirs(temp_dir, exist_ok=True)
-    unique_suffix = str(uuid.uuid4())
-    practice_audio_path = os.path.join(temp_dir, f"{round_id}_{card_id}_practice_{unique_suffix}.wav")
-    original_audio_path = os.path.join(temp_dir, f"{round_id}_{card_id}_original_{unique_suffix}.wav")
-    
-    with open(practice_audio_path, "wb") as f: f.write(await practice_audio.read())
-    with open(original_audio_path, "wb") as f: f.write(await original_audio.read())
-    
-    background_tasks.add_task(process_and_store_evaluation, practice_audio_path, original_audio_path, round_id, card_id)
-    
-    return {"message": "Job submitted and is pending evaluation."}
+请现在开始你的分析，并确保输出是一个可以被程序直接解析的、格式正确的 JSON 对象。
+"""
 
+def build_batch_card_gemini_prompt(cards: list, encoding: str = None) -> str:
+    """微批 Prompt：指令与输出结构只出现一次，各卡片的 ASR 数据以 `### card_id:` 分节。"""
+    encoding = encoding or PROMPT_ASR_ENCODING
+    format_note = TABLE_FORMAT_NOTE if encoding == "table" else ""
+    sections = "\n\n".join(
+        f"### card_id: {card.card_id}\n`original_asr_data`: {encode_asr_data(card.original_asr_data, encoding)}\n"
+        f"`practice_asr_data`: {encode_asr_data(card.practice_asr_data, encoding)}"
+        for card in cards
+    )
+    return f"""
+{CARD_COACH_INTRO}
 
-@app.get("/get-single-card-result/{round_id}/{card_id}")
-async def get_single_card_result(round_id: str, card_id: str):
-    try:
-        with sqlite3.connect(DB_FILE) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute("SELECT * FROM jobs WHERE round_id = ? AND card_id = ?", (round_id, card_id))
-            job = cursor.fetchone()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database query failed: {e}")
+**输入数据:** 下面共有 {len(cards)} 张相互独立的卡片，每张卡片以 `### card_id: <ID>` 开头，包含：
 
-    if not job:
-        raise HTTPException(status_code=404, detail="Job not found.")
-    
-    return {
-        "round_id": job["round_id"],
-        "card_id": job["card_id"],
-        "status": job["status"],
-        "result": json.loads(job["result"]) if job["result"] else None,
-        "error_message": job["error_message"]
-    }
+1. `original_asr_data`: 标准发音的ASR数据。
 
+2. `practice_asr_data`: 用户复述的ASR数据。
 
-@app.get("/get-round-summary/{round_id}")
-async def get_round_summary(round_id: str):
-    try:
-        with sqlite3.connect(DB_FILE) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute("SELECT card_id, result FROM jobs WHERE round_id = ? AND status = ?", (round_id, "COMPLETED"))
-            completed_jobs = cursor.fetchall()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database query for summary failed: {e}")
 
-    if not completed_jobs:
-        raise HTTPException(status_code=404, detail="No completed evaluations found for this round yet.")
+**你的任务：** 对**每一张卡片分别独立地**评估 (不要让其他卡片影响本卡片的判断)，严格按照以下JSON结构，为每张卡片生成一份侧重于意义和表达的诊断报告。
 
-    card_data = {
-        job["card_id"]: json.loads(job["result"])["evaluation_report"] 
-        for job in completed_jobs
-    }
+{CARD_REPORT_SPEC}
 
-    # 【已更新】使用最新的、以“听口关联”和“模式分析”为核心的汇总Prompt
-    summary_prompt = f"""
-你是一位顶级的AI语言诊断分析师，深刻理解 **“听口不分家”** 的语言学习原理。你的任务是基于所有单句的ASR对比数据，进行模式识别和根本原因分析，找出用户在**信息理解**和**口语表达**上的系统性关联。你的反馈必须高度凝练、数据驱动，并以一个结构化的JSON对象输出。注意所有的回答必须用中文回答。
+**输出格式:** 返回一个 JSON 数组，每张卡片对应一个对象，共 {len(cards)} 个。每个对象包含 `card_id` (string，与输入完全一致) 以及上述 5 个字段。不要遗漏、合并或新增卡片。
 
-**输入数据:** 你将收到一个名为 `card_data` 的JSON对象，它包含了本轮所有句子的诊断报告和原始ASR数据。
+**输入数据:** {format_note}
 
-**核心任务与分析逻辑:**
+{sections}
 
-1. **模式识别**: 跨句子聚合分析用户的复述错误（信息遗漏、替换）和口语产出特点（发音、流畅度）。
-    
-2. **听口关联分析**: 找出用户的**听力理解难点**（例如，听不懂连读、弱读）与其**口语产出习惯**（例如，自己也不会连读、弱读）之间的强关联，并明确指出这可能是“因为你不会这样说，所以你很难听懂”的根本原因。
-    
-3. **精简输出**: 只输出最关键的模式分析和值得关注的语言点，避免提供宽泛的提升建议。
-    
+请现在开始你的分析，并确保输出是一个可以被程序直接解析的、格式正确的 JSON 数组。
+"""
 
-### **【核心】最终输出的JSON结构定义:**
+# 汇总报告的输出结构，直接汇总与分层汇总 (由摘要生成) 共用
+ROUND_SUMMARY_OUTPUT_SPEC = """### **【核心】最终输出的JSON结构定义:**
 
 **1. `performance_overview` (本轮表现快照)**
 
@@ -313,7 +443,25 @@ async def get_round_summary(round_id: str):
         
 - `native_speech_insight`: (string) **一句话点出本轮最值得学习的母语者语音技巧**，并提供搜索关键词。例如：“本轮原句中普遍存在**辅音+元音连读**现象，这是提升听力理解和口语自然度的关键。(可搜索: 'Connected Speech Linking')”
     
+"""
+
+def build_round_summary_gemini_prompt(card_data: dict) -> str:
+    # 【已更新】使用最新的、以“听口关联”和“模式分析”为核心的汇总Prompt
+    return f"""
+你是一位顶级的AI语言诊断分析师，深刻理解 **“听口不分家”** 的语言学习原理。你的任务是基于所有单句的ASR对比数据，进行模式识别和根本原因分析，找出用户在**信息理解**和**口语表达**上的系统性关联。你的反馈必须高度凝练、数据驱动，并以一个结构化的JSON对象输出。注意所有的回答必须用中文回答。
+
+**输入数据:** 你将收到一个名为 `card_data` 的JSON对象，它包含了本轮所有句子的诊断报告和原始ASR数据。
+
+**核心任务与分析逻辑:**
+
+1. **模式识别**: 跨句子聚合分析用户的复述错误（信息遗漏、替换）和口语产出特点（发音、流畅度）。
+    
+2. **听口关联分析**: 找出用户的**听力理解难点**（例如，听不懂连读、弱读）与其**口语产出习惯**（例如，自己也不会连读、弱读）之间的强关联，并明确指出这可能是“因为你不会这样说，所以你很难听懂”的根本原因。
+    
+3. **精简输出**: 只输出最关键的模式分析和值得关注的语言点，避免提供宽泛的提升建议。
+    
 
+{ROUND_SUMMARY_OUTPUT_SPEC}
 **学生本轮练习的深度诊断数据如下:**
 
 ```
@@ -322,27 +470,705 @@ async def get_round_summary(round_id: str):
 
 请严格按照以上要求，开始你的深度聚合分析，并输出最终的汇总报告JSON。
     """
+
+def build_chunk_digest_prompt(card_data: dict) -> str:
+    # 分层汇总的 map 阶段：把一组单句报告压缩为简短的模式摘要，供最终汇总使用
+    return f"""
+你是一位AI语言诊断分析师。下面是学生本轮练习中**一部分句子**的单句诊断报告。请把它们压缩为一份简短的**模式摘要**，供之后与其他部分的摘要合并做整轮分析。只保留跨句子反复出现的现象和最值得关注的语言点，不要逐句复述。注意所有的回答必须用中文回答。
+
+**输出一个JSON对象，结构如下:**
+
+- `retelling_patterns`: (object[]) 最多3条复述 (意义传达) 方面的模式，每条包含 `observation` (string，一句话描述) 与 `card_ids` (string[]，出现该现象的句子)。
     
-    logging.info(f"[{round_id}] 构建宏观汇总 Prompt 并调用 Gemini...")
+- `speech_patterns`: (object[]) 最多3条口语产出 (发音、流畅度、节奏) 方面的模式，结构同上。
+    
+- `vocabulary_candidates`: (object[]) 最多4个值得关注的词汇或短语，每个包含 `en`、`zh`、`note` (string，一句话分析)。
+    
+- `native_speech_phenomena`: (string[]) 最多2个原句中值得学习的母语者语音现象 (如连读、弱读)。
+    
+
+**本组句子的诊断报告如下:**
+
+```
+{json.dumps(card_data, ensure_ascii=False, separators=(",", ":"))}
+```
+
+请只输出摘要JSON。
+    """
+
+def build_round_summary_from_digests_prompt(digests: list) -> str:
+    # 分层汇总的 reduce 阶段：输出结构与直接汇总完全相同
+    card_count = sum(digest.get("card_count", 0) for digest in digests)
+    return f"""
+你是一位顶级的AI语言诊断分析师，深刻理解 **“听口不分家”** 的语言学习原理。学生本轮共练习了 {card_count} 个句子，这些句子已分为 {len(digests)} 组，每组的单句诊断报告已被压缩为一份模式摘要。你的任务是基于这些摘要，进行跨组的模式识别和根本原因分析，找出用户在**信息理解**和**口语表达**上的系统性关联。你的反馈必须高度凝练、数据驱动，并以一个结构化的JSON对象输出。注意所有的回答必须用中文回答。
+
+**输入数据:** 一个摘要数组，每份摘要包含 `card_count` (该组句子数)、`mean_overall_score` (该组单句评分的平均值)，以及该组的复述模式、口语模式、候选词汇和母语者语音现象。
+
+**核心任务与分析逻辑:**
+
+1. **模式识别**: 合并各组中相同或相近的模式，优先考虑在多个组中反复出现、涉及句子较多的模式。
+    
+2. **听口关联分析**: 找出用户的**听力理解难点**（例如，听不懂连读、弱读）与其**口语产出习惯**（例如，自己也不会连读、弱读）之间的强关联，并明确指出这可能是“因为你不会这样说，所以你很难听懂”的根本原因。
+    
+3. **精简输出**: 只输出最关键的模式分析和值得关注的语言点，避免提供宽泛的提升建议。`final_score` 应参考各组按句子数加权的平均评分。
+    
+
+{ROUND_SUMMARY_OUTPUT_SPEC}
+**各组的模式摘要如下:**
+
+```
+{json.dumps(digests, ensure_ascii=False, separators=(",", ":"))}
+```
+
+请严格按照以上要求，开始你的深度聚合分析，并输出最终的汇总报告JSON。
+    """
+
+async def call_gemini_json(log_prefix: str, prompt: str, timeout: float, timings: StageTimings) -> dict:
+    """调用 Gemini 并把回复解析为 JSON，在 timings 上记录 gemini_call 与 json_parse 阶段。"""
+    gemini_client = await clients.aget("gemini")
     if not gemini_client:
         raise HTTPException(status_code=503, detail="Gemini client is not available.")
 
-    try:
-        logging.info(f"[{round_id}] 开始调用 Gemini API for summary (超时设置为180秒)...")
-        response = await gemini_client.aio.models.generate_content(
+    logging.info(f"{log_prefix} 开始调用 Gemini API (超时设置为{timeout:.0f}秒)...")
+    with timings.stage("gemini_call"):
+        response = await gemini_scheduler.call(
+            gemini_client.aio.models.generate_content,
             model=GEMINI_MODEL_NAME,
-            contents=summary_prompt
+            contents=prompt,
+            timeout=timeout,
+        )
+    logging.info(f"{log_prefix} Gemini API 调用成功返回。")
+
+    with timings.stage("json_parse"):
+        cleaned_response = response.candidates[0].content.parts[0].text.strip().lstrip("```json").rstrip("```").strip()
+        return json.loads(cleaned_response)
+
+async def generate_round_summary(round_id: str, card_data: dict, timings: StageTimings = None) -> dict:
+    timings = timings or StageTimings("summary")
+    with timings.stage("prompt_build"):
+        summary_prompt = build_round_summary_gemini_prompt(card_data)
+
+    logging.info(f"[{round_id}] 构建宏观汇总 Prompt 并调用 Gemini...")
+    return await call_gemini_json(f"[{round_id}]", summary_prompt, GEMINI_SUMMARY_TIMEOUT_SECONDS, timings)
+
+async def digest_round_chunk(round_id: str, chunk_index: int, card_data: dict) -> dict:
+    """分层汇总的 map 阶段；各组并发执行，耗时计入 summary_chunk 流水线。"""
+    timings = StageTimings("summary_chunk")
+    with timings.stage("prompt_build"):
+        prompt = build_chunk_digest_prompt(card_data)
+    digest = await call_gemini_json(f"[{round_id}/chunk{chunk_index}]", prompt, GEMINI_TIMEOUT_SECONDS, timings)
+    # 句子数与平均分在本地计算，不依赖模型
+    scores = [report["overall_score"] for report in card_data.values()
+              if isinstance(report, dict) and isinstance(report.get("overall_score"), (int, float))]
+    digest["card_count"] = len(card_data)
+    digest["mean_overall_score"] = round(sum(scores) / len(scores), 1) if scores else None
+    return digest
+
+async def generate_round_summary_from_digests(round_id: str, digests: list, timings: StageTimings = None) -> dict:
+    timings = timings or StageTimings("summary")
+    with timings.stage("prompt_build"):
+        summary_prompt = build_round_summary_from_digests_prompt(digests)
+
+    logging.info(f"[{round_id}] 由 {len(digests)} 组摘要构建宏观汇总 Prompt 并调用 Gemini...")
+    return await call_gemini_json(f"[{round_id}]", summary_prompt, GEMINI_SUMMARY_TIMEOUT_SECONDS, timings)
+
+async def timed(timings: StageTimings, stage: str, awaitable):
+    """在 asyncio.gather 中并发执行时分别为每个阶段计时。"""
+    with timings.stage(stage):
+        return await awaitable
+
+async def store_provisional_result(round_id: str, card_id: str, original_asr_data: dict, practice_asr_data: dict,
+                                   timings: StageTimings, original_features: dict = None):
+    """本地临时评分；失败只记录日志，不影响随后的 Gemini 评测。"""
+    try:
+        with timings.stage("local_score"):
+            provisional_report = score_locally(original_asr_data, practice_asr_data, original_features)
+        await db.run(save_provisional_result, db, round_id, card_id, provisional_report)
+    except Exception as e:
+        logging.warning(f"[{round_id}/{card_id}] 本地临时评分失败，直接等待 Gemini 报告: {e}")
+        return None
+    logging.info(f"[{round_id}/{card_id}] 本地临时评分完成 (overall_score={provisional_report['overall_score']})。")
+    round_events.publish(round_id, make_job_event(round_id, card_id, "PARTIAL", provisional_report=provisional_report))
+    return provisional_report
+
+async def request_card_report(round_id: str, card_id: str, original_asr_data: dict, practice_asr_data: dict,
+                              timings: StageTimings) -> dict:
+    """单卡评测：构建 Prompt、调用 Gemini 并解析报告。"""
+    logging.info(f"[{round_id}/{card_id}] 构建 Prompt 并调用 Gemini...")
+    with timings.stage("prompt_build"):
+        prompt = build_single_card_gemini_prompt(original_asr_data, practice_asr_data)
+    return await call_gemini_json(f"[{round_id}/{card_id}]", prompt, GEMINI_TIMEOUT_SECONDS, timings)
+
+async def evaluate_card_batch(round_id: str, cards: list):
+    """微批评测：一次调用评测同轮次的多张卡片，返回模型给出的报告数组 (由 card_batcher 按 card_id 拆分)。"""
+    timings = StageTimings("card_batch")
+    with timings.stage("prompt_build"):
+        prompt = build_batch_card_gemini_prompt(cards)
+    logging.info(f"[{round_id}] 合并 {len(cards)} 张卡片的评测为一次 Gemini 调用: {[card.card_id for card in cards]}")
+    return await call_gemini_json(f"[{round_id}/batch]", prompt, GEMINI_TIMEOUT_SECONDS, timings)
+
+async def evaluate_and_store(round_id: str, card_id: str, original_asr_data: dict, practice_asr_data: dict,
+                             timings: StageTimings, started: float, on_provisional=None, original_features: dict = None) -> dict:
+    """由两份 ASR 数据调用 Gemini 生成报告并写为 COMPLETED；上传与流式两种提交方式共用。
+
+    调用 Gemini 之前先写入本地临时报告 (PARTIAL)；on_provisional 为可选的 async 回调，接收临时报告。
+    original_features 为参考句目录中存储的标准音频特征，本地评分时不必重新计算。
+    """
+    if LOCAL_SCORING:
+        provisional_report = await store_provisional_result(round_id, card_id, original_asr_data, practice_asr_data, timings,
+                                                            original_features)
+        if provisional_report is not None and on_provisional is not None:
+            await on_provisional(provisional_report)
+
+    # 【已移除】不再需要计算和传递 missing_words
+    if GEMINI_BATCH_WINDOW_SECONDS > 0:
+        # 等待同轮次其他卡片的收集窗口 + 批量调用；退回单卡调用时其阶段耗时同样记入 timings
+        with timings.stage("gemini_batch"):
+            evaluation_report = await card_batcher.evaluate(round_id, card_id, original_asr_data, practice_asr_data, timings)
+    else:
+        evaluation_report = await request_card_report(round_id, card_id, original_asr_data, practice_asr_data, timings)
+
+    # 报告与 ASR 源数据分列存储，源数据以紧凑的并列数组形式压缩保存；
+    # 阶段耗时随结果一并写入 (db_write 本身只进入直方图)
+    timings.record("total", time.perf_counter() - started)
+    with timings.stage("db_write"):
+        await db.run(save_completed_result, db, round_id, card_id, evaluation_report, original_asr_data, practice_asr_data, timings.as_dict())
+    logging.info(f"[{round_id}/{card_id}] 评测成功，结果已存入数据库。")
+    round_events.publish(round_id, make_job_event(round_id, card_id, "COMPLETED", evaluation_report=evaluation_report))
+    # 已完成卡片集合发生变化，在后台刷新该轮次的汇总报告
+    round_summary_store.schedule_refresh(round_id)
+    return evaluation_report
+
+async def mark_job_failed(round_id: str, card_id: str, error_msg: str, timings: StageTimings, started: float):
+    if "total" not in timings.timings:
+        timings.record("total", time.perf_counter() - started)
+    await db.aexecute(
+        "UPDATE jobs SET status = ?, error_message = ?, stage_timings = ? WHERE round_id = ? AND card_id = ?",
+        ("FAILED", error_msg, json.dumps(timings.as_dict()), round_id, card_id),
+    )
+    round_events.publish(round_id, make_job_event(round_id, card_id, "FAILED", error_message=error_msg))
+
+async def load_reference(reference_id: str) -> tuple:
+    """返回参考句的 (ASR 数据, 派生特征)。"""
+    reference = await db.run(reference_catalog.get, reference_id)
+    if reference is None:
+        raise Exception(f"Reference card '{reference_id}' not found in catalog.")
+    return reference["asr_data"], reference["features"]
+
+async def process_and_store_evaluation(practice_audio_path: str, original_audio_path: str, round_id: str, card_id: str,
+                                       original_audio_hash: str = None, timings: StageTimings = None, reference_id: str = None):
+    # 状态已由任务队列在认领时更新为 PROCESSING
+    finished = False
+    timings = timings or StageTimings("card")
+    started = time.perf_counter()
+    try:
+        if not await asr_available() or not await clients.aget("gemini"):
+            raise Exception("API clients are not initialized due to missing keys.")
+
+        logging.info(f"[{round_id}/{card_id}] 开始并行转录音频...")
+        log_prefix = f"[{round_id}/{card_id}]"
+        practice_task = timed(timings, "asr_practice", transcribe_audio(practice_audio_path, log_prefix, timings, "normalize_practice"))
+        if original_audio_path:
+            original_task = timed(timings, "asr_original", get_original_asr_data(original_audio_path, log_prefix, original_audio_hash, timings))
+        else:
+            # 引用参考句目录：标准音频早已转录，只需一次主键查询
+            original_task = timed(timings, "reference_lookup", load_reference(reference_id))
+        practice_asr_data, original = await asyncio.gather(practice_task, original_task)
+        original_asr_data, original_features = (original, None) if original_audio_path else original
+
+        await evaluate_and_store(round_id, card_id, original_asr_data, practice_asr_data, timings, started,
+                                 original_features=original_features)
+        finished = True
+
+    except Exception as e:
+        logging.error(f"[{round_id}/{card_id}] 处理后台任务时发生严重错误: {e}", exc_info=True)
+        try:
+            await mark_job_failed(round_id, card_id, str(e), timings, started)
+            finished = True
+        except Exception as db_e:
+            logging.error(f"[{round_id}/{card_id}] 记录 FAILED 状态到数据库时再次出错: {db_e}")
+            
+    finally:
+        # 任务被中断 (如进程关闭) 时保留音频文件，以便租约过期后重新执行
+        if finished:
+            logging.info(f"[{round_id}/{card_id}] 开始清理临时文件...")
+            remove_files(practice_audio_path, original_audio_path)
+        logging.info(f"[{round_id}/{card_id}] 后台任务处理流程结束 (阶段耗时: {timings.as_dict()})。")
+
+async def run_queued_job(job: dict):
+    round_events.publish(job["round_id"], make_job_event(job["round_id"], job["card_id"], "PROCESSING"))
+    # 入队时记录的 upload_write 等阶段保留下来，再加上排队等待时间
+    timings = StageTimings("card", job.get("stage_timings"))
+    if job.get("enqueued_at"):
+        timings.record("queue_wait", max(0.0, job["claimed_at"] - job["enqueued_at"]))
+    await process_and_store_evaluation(
+        job["practice_audio_path"], job["original_audio_path"], job["round_id"], job["card_id"], job["original_audio_hash"], timings,
+        job.get("reference_id"),
+    )
+
+
+# --- FastAPI 端点 ---
+
+def remove_files(*paths):
+    for path in paths:
+        if path and os.path.exists(path): os.remove(path)
+
+@app.post("/evaluate-single-card", status_code=202)
+async def evaluate_single_card(request: fastapi.Request):
+    """提交一张卡片。
+
+    multipart 字段：`round_id`、`card_id`、`practice_audio` (文件)，以及 `original_audio` (文件) 或
+    `reference_id` (缺省为 card_id，引用参考句目录；同时提供时以上传的音频为准)。
+    """
+    # 与 /evaluate-round 相同，请求体边接收边解析，UPLOAD_MAX_BYTES 在写盘过程中执行，
+    # 不经过 request.form() 先把整个上传缓存到磁盘
+    started = time.perf_counter()
+    try:
+        parser = MultipartDiskParser(request.headers.get("content-type", ""), TEMP_AUDIO_DIR, UPLOAD_MAX_BYTES,
+                                     max_files=2, max_fields=8)
+        fields, files = await parser.parse(request.stream())
+    except MultipartFormError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    upload_seconds = time.perf_counter() - started
+    try:
+        return await submit_single_card(fields, files, upload_seconds)
+    finally:
+        # 音频已链接到卡片自己的路径，part 文件本身不再需要
+        await asyncio.to_thread(remove_files, *[part.path for part in files.values()])
+
+async def submit_single_card(fields: dict, files: dict, upload_seconds: float):
+    round_id, card_id = fields.get("round_id"), fields.get("card_id")
+    practice_part, original_part = files.get("practice_audio"), files.get("original_audio")
+    if not round_id or not card_id or practice_part is None:
+        raise HTTPException(status_code=422, detail="round_id, card_id and practice_audio are required.")
+    for part in (practice_part, original_part):
+        if part is not None and part.too_large:
+            raise HTTPException(status_code=413, detail=str(UploadTooLargeError(part.field_name, UPLOAD_MAX_BYTES)))
+
+    # 不上传 original_audio 时引用参考句目录：reference_id 缺省为 card_id；同时提供时以上传的音频为准
+    reference_id = None
+    if original_part is None:
+        reference_id = fields.get("reference_id") or card_id
+        if not await db.run(reference_catalog.exists, reference_id):
+            raise HTTPException(status_code=404, detail=f"Reference card '{reference_id}' not found in catalog; upload original_audio instead.")
+
+    # 先检查冲突，避免为注定失败的提交链接音频；最终以带音频路径的单条 INSERT 为准
+    conflict = JSONResponse(status_code=409, content={"detail": "Job for this round_id and card_id already exists."})
+    try:
+        if await db.run(db.query_one, "SELECT 1 FROM jobs WHERE round_id = ? AND card_id = ?", (round_id, card_id)):
+            return conflict
+    except Exception as e:
+        logging.error(f"查询任务记录失败: {e}")
+        raise HTTPException(status_code=500, detail="Failed to create job record in database.")
+
+    try:
+        practice_audio_path, original_audio_path = await asyncio.to_thread(
+            link_card_audio, round_id, card_id, practice_part, original_part)
+    except Exception as e:
+        logging.error(f"[{round_id}/{card_id}] 保存上传音频失败: {e}")
+        raise HTTPException(status_code=500, detail="Failed to store uploaded audio.")
+
+    try:
+        # 任务记录与音频路径一并插入，由任务队列的 worker 认领执行；不存在没有音频路径的 PENDING 任务
+        await db.run(job_queue.submit, round_id, card_id, practice_audio_path, original_audio_path,
+                     original_part.sha256 if original_part else None, {"upload_write": round(upload_seconds, 4)}, reference_id)
+    except sqlite3.IntegrityError:
+        remove_files(practice_audio_path, original_audio_path)
+        return conflict
+    except Exception as e:
+        remove_files(practice_audio_path, original_audio_path)
+        logging.error(f"[{round_id}/{card_id}] 创建任务记录失败: {e}")
+        raise HTTPException(status_code=500, detail="Failed to create job record in database.")
+
+    job_queue.notify()
+    round_events.publish(round_id, make_job_event(round_id, card_id, "PENDING"))
+    
+    return {"message": "Job submitted and is pending evaluation."}
+
+
+def link_card_audio(round_id: str, card_id: str, practice_part: StreamedFilePart, original_part: StreamedFilePart = None) -> tuple:
+    """把请求中已落盘的 part 放到卡片自己的路径下 (硬链接，文件系统不支持时复制)，返回 (practice 路径, original 路径)。
+
+    同一个 part 可能被多张卡片引用，每张卡片的任务完成后各自删除自己的文件。
+    """
+    unique_suffix = str(uuid.uuid4())
+    paths = []
+    for kind, part in (("practice", practice_part), ("original", original_part)):
+        if part is None:
+            paths.append(None)
+            continue
+        path = os.path.join(TEMP_AUDIO_DIR, f"{round_id}_{card_id}_{kind}_{unique_suffix}.wav")
+        try:
+            os.link(part.path, path)
+        except OSError:
+            shutil.copyfile(part.path, path)
+        paths.append(path)
+    return tuple(paths)
+
+@app.post("/evaluate-round", status_code=202)
+async def evaluate_round(request: fastapi.Request):
+    """一次请求提交整轮卡片。
+
+    multipart 字段：
+    - `round_id`: 轮次 ID
+    - `manifest`: JSON 数组，每项为 {"card_id", "practice_audio", "original_audio"}，后两者是对应音频的 part 名称；
+      省略 original_audio 时引用参考句目录中的 "reference_id" (缺省为 card_id)
+    - 其余 part：manifest 中引用的音频文件
+    返回每张卡片的处理结果：accepted / conflict / invalid / too_large / error。
+    """
+    # 请求体边接收边解析：音频 part 直接写入 TEMP_AUDIO_DIR，UPLOAD_MAX_BYTES 在接收过程中逐个 part 执行
+    started = time.perf_counter()
+    try:
+        parser = MultipartDiskParser(request.headers.get("content-type", ""), TEMP_AUDIO_DIR, UPLOAD_MAX_BYTES,
+                                     max_files=BATCH_MAX_CARDS * 2, max_fields=16)
+        fields, files = await parser.parse(request.stream())
+    except MultipartFormError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    upload_seconds = time.perf_counter() - started
+    try:
+        return await submit_round(fields, files, upload_seconds)
+    finally:
+        # 各卡片已链接到自己的路径，part 文件本身不再需要
+        await asyncio.to_thread(remove_files, *[part.path for part in files.values()])
+
+
+# 清单中引用 part 名称或目录 card_id 的字段，必须为字符串
+MANIFEST_STRING_KEYS = ("card_id", "practice_audio", "original_audio", "reference_id")
+
+def invalid_manifest_keys(item: dict) -> list:
+    return [key for key in MANIFEST_STRING_KEYS if item.get(key) is not None and not isinstance(item[key], str)]
+
+async def submit_round(fields: dict, files: dict, upload_seconds: float) -> dict:
+    try:
+        round_id = fields["round_id"]
+        manifest = json.loads(fields["manifest"])
+        if not isinstance(manifest, list) or not all(isinstance(item, dict) and item.get("card_id") for item in manifest):
+            raise ValueError("manifest must be a JSON array of objects with a card_id")
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid round submission: {e}")
+    if len(manifest) > BATCH_MAX_CARDS:
+        raise HTTPException(status_code=400, detail=f"A round may contain at most {BATCH_MAX_CARDS} cards.")
+
+    reference_ids = [item.get("reference_id") or item["card_id"] for item in manifest
+                     if not item.get("original_audio") and not invalid_manifest_keys(item)]
+    try:
+        known_references = await db.run(reference_catalog.existing_ids, reference_ids)
+    except Exception as e:
+        logging.error(f"[{round_id}] 查询参考句目录失败: {e}")
+        raise HTTPException(status_code=500, detail="Failed to query reference catalog.")
+
+    results = []
+    seen = set()
+    valid_cards = []
+    for item in manifest:
+        bad_keys = invalid_manifest_keys(item)
+        if bad_keys:
+            results.append({"card_id": item["card_id"], "status": "invalid", "detail": f"Manifest fields must be strings: {', '.join(bad_keys)}."})
+            continue
+        card_id = item["card_id"]
+        practice_part = files.get(item.get("practice_audio") or "")
+        original_part = files.get(item["original_audio"]) if item.get("original_audio") else None
+        reference_id = None if item.get("original_audio") else item.get("reference_id") or card_id
+        result = {"card_id": card_id, "status": "invalid"}
+        if card_id in seen:
+            result["detail"] = "Duplicate card_id in manifest."
+        elif practice_part is None or (reference_id is None and original_part is None):
+            result["detail"] = "Missing practice_audio or original_audio part."
+        elif reference_id is not None and reference_id not in known_references:
+            result["detail"] = f"Reference card '{reference_id}' not found in catalog."
+        elif practice_part.too_large or (original_part is not None and original_part.too_large):
+            too_large = practice_part if practice_part.too_large else original_part
+            result.update(status="too_large", detail=str(UploadTooLargeError(too_large.field_name, UPLOAD_MAX_BYTES)))
+        else:
+            valid_cards.append((result, practice_part, original_part, reference_id))
+        seen.add(card_id)
+        results.append(result)
+
+    # 每张卡片的音频先放到自己的路径下，再连同路径一起插入任务记录 (单个事务)；
+    # INSERT OR IGNORE 未插入的行即为已存在的任务
+    items = []
+    for result, practice_part, original_part, reference_id in valid_cards:
+        card_id = result["card_id"]
+        try:
+            practice_audio_path, original_audio_path = await asyncio.to_thread(
+                link_card_audio, round_id, card_id, practice_part, original_part)
+        except Exception as e:
+            logging.error(f"[{round_id}/{card_id}] 保存上传音频失败: {e}")
+            result.update(status="error", detail="Failed to store uploaded audio.")
+            continue
+        items.append(((round_id, card_id, practice_audio_path, original_audio_path,
+                       original_part.sha256 if original_part else None, {"upload_write": round(upload_seconds, 4)}, reference_id), result))
+
+    try:
+        inserted = await db.run(job_queue.submit_many, [item for item, _ in items])
+    except Exception as e:
+        logging.error(f"[{round_id}] 批量入队失败: {e}")
+        for item, _ in items:
+            remove_files(item[2], item[3])
+        raise HTTPException(status_code=500, detail="Failed to enqueue round.")
+
+    accepted = 0
+    for item, result in items:
+        if (round_id, item[1]) in inserted:
+            result["status"] = "accepted"
+            accepted += 1
+            round_events.publish(round_id, make_job_event(round_id, item[1], "PENDING"))
+        else:
+            remove_files(item[2], item[3])
+            result.update(status="conflict", detail="Job for this round_id and card_id already exists.")
+    job_queue.notify()
+    logging.info(f"[{round_id}] 批量提交: 接受 {accepted} 张卡片，共 {len(manifest)} 张。")
+
+    return {"round_id": round_id, "cards": results}
+
+
+async def send_stream_message(websocket: WebSocket, message: dict) -> bool:
+    """向客户端发送一条消息；客户端已断开时返回 False (评测结果仍会写入数据库)。"""
+    try:
+        await websocket.send_json(message)
+        return True
+    except (WebSocketDisconnect, RuntimeError):
+        return False
+
+async def close_stream(websocket: WebSocket, status_code: int = None, detail: str = None, code: int = 1000):
+    if detail:
+        await send_stream_message(websocket, {"type": "error", "status_code": status_code, "detail": detail})
+    try:
+        await websocket.close(code=code)
+    except RuntimeError:
+        # 客户端已断开
+        pass
+
+
+@app.websocket("/stream-single-card")
+async def stream_single_card(websocket: WebSocket):
+    """边说边上传练习音频：音频帧实时转发给流式转录，录音结束后立即开始 Gemini 评测。
+
+    客户端 → 服务端：
+    1. 文本帧 {"type": "start", "round_id", "card_id", "sample_rate", "reference_id"}，sample_rate 默认
+       STREAM_SAMPLE_RATE；给出 reference_id 时引用参考句目录并跳过第 2 步
+    2. 二进制帧：标准音频文件，之后文本帧 {"type": "original_end"} (标准音频随即开始转录/查缓存)
+    3. 二进制帧：练习音频，PCM16 单声道，随录音实时发送
+    4. 文本帧 {"type": "end"}：录音结束
+    服务端 → 客户端：{"type": "accepted"}、{"type": "partial", "text"}、{"type": "provisional", "provisional_report"}
+    (本地临时评分)、{"type": "result", "status": "COMPLETED" | "FAILED", ...} 或 {"type": "error", "status_code", "detail"}。
+    练习音频不落盘，流中断的任务不会被重试：录音结束前断开时任务记录被删除，可以重新提交。
+    """
+    await websocket.accept()
+    try:
+        message = await receive_stream_message(websocket, STREAM_IDLE_TIMEOUT_SECONDS)
+    except (WebSocketDisconnect, StreamProtocolError):
+        return await close_stream(websocket, code=1008)
+    start = parse_control_message(message.get("text"))
+    round_id, card_id = start.get("round_id"), start.get("card_id")
+    if start.get("type") != "start" or not round_id or not card_id:
+        return await close_stream(websocket, 400, "First message must be {\"type\": \"start\", \"round_id\", \"card_id\"}.", code=1008)
+    round_id, card_id = str(round_id), str(card_id)
+    try:
+        sample_rate = int(start.get("sample_rate") or STREAM_SAMPLE_RATE)
+    except (TypeError, ValueError):
+        return await close_stream(websocket, 400, "sample_rate must be an integer.", code=1008)
+    if not await clients.aget("streaming_transcriber") or not await asr_available() or not await clients.aget("gemini"):
+        return await close_stream(websocket, 503, "API clients are not initialized due to missing keys.", code=1011)
+    reference_id = str(start["reference_id"]) if start.get("reference_id") else None
+    if reference_id and not await db.run(reference_catalog.exists, reference_id):
+        return await close_stream(websocket, 404, f"Reference card '{reference_id}' not found in catalog.", code=1008)
+    try:
+        await db.run(job_queue.begin_inline, round_id, card_id)
+    except sqlite3.IntegrityError:
+        return await close_stream(websocket, 409, "Job for this round_id and card_id already exists.", code=1008)
+    except Exception as e:
+        logging.error(f"创建任务记录失败: {e}")
+        return await close_stream(websocket, 500, "Failed to create job record in database.", code=1011)
+
+    log_prefix = f"[{round_id}/{card_id}]"
+    await send_stream_message(websocket, {"type": "accepted"})
+    heartbeat = asyncio.create_task(job_queue.heartbeat_loop(round_id, card_id))
+    timings = StageTimings("stream")
+    os.makedirs(TEMP_AUDIO_DIR, exist_ok=True)
+    original_audio_path = None if reference_id else os.path.join(TEMP_AUDIO_DIR, f"{round_id}_{card_id}_original_{uuid.uuid4()}.wav")
+    original_task = None
+    session = None
+    speech_ended = None
+    try:
+        if reference_id:
+            original_task = asyncio.create_task(timed(timings, "reference_lookup", load_reference(reference_id)))
+        else:
+            with timings.stage("upload_write"):
+                _, original_audio_hash = await receive_websocket_file(
+                    websocket, original_audio_path, UPLOAD_MAX_BYTES, "original_end", "original_audio", STREAM_IDLE_TIMEOUT_SECONDS)
+            # 学生说话期间完成标准音频的转录 (或命中缓存)
+            original_task = asyncio.create_task(timed(timings, "asr_original", get_original_asr_data(original_audio_path, log_prefix, original_audio_hash, timings)))
+        # 录音中途中止时该任务可能已失败而无人 await，在这里取走异常
+        original_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+        partial = {"latest": "", "sent": ""}
+        session = await asr_scheduler.call((await clients.aget("streaming_transcriber")).open, sample_rate, on_partial=lambda text: partial.update(latest=text))
+        logging.info(f"{log_prefix} 流式转录会话已建立 ({sample_rate} Hz)。")
+        received = 0
+        while True:
+            message = await receive_stream_message(websocket, STREAM_IDLE_TIMEOUT_SECONDS)
+            chunk = message.get("bytes")
+            if chunk is None:
+                if parse_control_message(message.get("text")).get("type") == "end":
+                    break
+                raise StreamProtocolError("Expected binary 'practice_audio' frames or {\"type\": \"end\"}.")
+            received += len(chunk)
+            if received > UPLOAD_MAX_BYTES:
+                raise UploadTooLargeError("practice_audio", UPLOAD_MAX_BYTES)
+            await session.send_audio(chunk)
+            if partial["latest"] != partial["sent"]:
+                partial["sent"] = partial["latest"]
+                await send_stream_message(websocket, {"type": "partial", "text": partial["sent"]})
+
+        # 从录音结束起计算 total：只剩最后一个语段的确认、Gemini 调用与写库
+        speech_ended = time.perf_counter()
+        logging.info(f"{log_prefix} 录音结束 ({received} 字节)，等待最终转录并开始评测...")
+        round_events.publish(round_id, make_job_event(round_id, card_id, "PROCESSING"))
+        with timings.stage("asr_stream_finish"):
+            practice_asr_data = await session.finish()
+        session = None
+        original = await original_task
+        original_asr_data, original_features = original if reference_id else (original, None)
+        evaluation_report = await evaluate_and_store(
+            round_id, card_id, original_asr_data, practice_asr_data, timings, speech_ended,
+            on_provisional=lambda report: send_stream_message(websocket, {"type": "provisional", "provisional_report": report}),
+            original_features=original_features,
         )
-        logging.info(f"[{round_id}] Gemini summary API 调用成功返回。")
+        await send_stream_message(websocket, {"type": "result", "status": "COMPLETED", "evaluation_report": evaluation_report})
+
+    except (WebSocketDisconnect, StreamProtocolError, UploadTooLargeError) as e:
+        # 录音结束前出错：删除任务记录，客户端可以重新提交
+        logging.warning(f"{log_prefix} 流式提交中止: {type(e).__name__} {e}")
+        await db.aexecute("DELETE FROM jobs WHERE round_id = ? AND card_id = ?", (round_id, card_id))
+        if not isinstance(e, WebSocketDisconnect):
+            status_code = 413 if isinstance(e, UploadTooLargeError) else 400
+            await send_stream_message(websocket, {"type": "error", "status_code": status_code, "detail": str(e)})
+    except asyncio.CancelledError:
+        # 连接被服务端取消 (如进程关闭)：录音未结束时同样删除任务记录
+        if speech_ended is None:
+            await asyncio.shield(db.aexecute("DELETE FROM jobs WHERE round_id = ? AND card_id = ?", (round_id, card_id)))
+        raise
+    except Exception as e:
+        logging.error(f"{log_prefix} 流式评测时发生严重错误: {e}", exc_info=True)
+        if speech_ended is None:
+            await db.aexecute("DELETE FROM jobs WHERE round_id = ? AND card_id = ?", (round_id, card_id))
+            await send_stream_message(websocket, {"type": "error", "status_code": 500, "detail": f"Streaming transcription failed: {e}"})
+        else:
+            try:
+                await mark_job_failed(round_id, card_id, str(e), timings, speech_ended)
+            except Exception as db_e:
+                logging.error(f"{log_prefix} 记录 FAILED 状态到数据库时再次出错: {db_e}")
+            await send_stream_message(websocket, {"type": "result", "status": "FAILED", "error_message": str(e)})
+    finally:
+        heartbeat.cancel()
+        if original_task is not None and not original_task.done():
+            original_task.cancel()
+        if session is not None:
+            await session.abort()
+        remove_files(original_audio_path)
+        logging.info(f"{log_prefix} 流式提交处理结束 (阶段耗时: {timings.as_dict()})。")
+    await close_stream(websocket)
+
+
+@app.get("/get-single-card-result/{round_id}/{card_id}")
+async def get_single_card_result(round_id: str, card_id: str, include_source: bool = False):
+    # 默认只返回评测报告；?include_source=true 时才解压并返回词级 ASR 源数据
+    try:
+        job = await db.run(load_card_result, db, round_id, card_id, include_source)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database query failed: {e}")
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    
+    return job
+
+
+def row_to_job_event(round_id: str, row) -> dict:
+    evaluation_report = json.loads(row["evaluation_report"]) if row["evaluation_report"] else None
+    status = public_status(row["status"], row["provisional_report"])
+    provisional_report = json.loads(row["provisional_report"]) if status == "PARTIAL" else None
+    return make_job_event(round_id, row["card_id"], status, evaluation_report, row["error_message"], provisional_report)
+
+
+@app.get("/round-events/{round_id}")
+async def round_events_stream(round_id: str, request: fastapi.Request):
+    # SSE：先推送轮次内所有任务的当前状态，之后实时推送状态变化与最终报告
+    queue = round_events.subscribe(round_id)
+
+    async def event_stream():
+        last_status = {}
+        try:
+            for row in await db.run(load_round_jobs, db, round_id):
+                event = row_to_job_event(round_id, row)
+                last_status[row["card_id"]] = event["status"]
+                yield format_sse(event)
+
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_RECONCILE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    for row in await db.run(load_round_jobs, db, round_id):
+                        event = row_to_job_event(round_id, row)
+                        if last_status.get(row["card_id"]) != event["status"]:
+                            last_status[row["card_id"]] = event["status"]
+                            yield format_sse(event)
+                    continue
+
+                if last_status.get(event["card_id"]) == event["status"]:
+                    continue
+                last_status[event["card_id"]] = event["status"]
+                yield format_sse(event)
+        finally:
+            round_events.unsubscribe(round_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/get-round-summary/{round_id}")
+async def get_round_summary(round_id: str):
+    # 汇总报告按已完成卡片集合的指纹物化存储；指纹未变时直接返回，否则等待 (去重后的) 刷新任务
+    # 刷新内部各阶段由 RoundSummaryStore 计时，这里记录请求整体耗时 (含等待刷新)
+    try:
+        with StageTimings("summary").stage("request"):
+            summary_report = await round_summary_store.get_or_refresh(round_id)
+    except HTTPException:
+        raise
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database query for summary failed: {e}")
     except Exception as e:
         logging.error(f"[{round_id}] 生成汇总报告时 Gemini 调用失败: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to generate summary from Gemini: {e}")
 
-    cleaned_response = response.candidates[0].content.parts[0].text.strip().lstrip("```json").rstrip("```").strip()
-    return json.loads(cleaned_response)
+    if summary_report is None:
+        raise HTTPException(status_code=404, detail="No completed evaluations found for this round yet.")
+
+    return summary_report
+
+def count_jobs_by_status() -> dict:
+    rows = db.query_all("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+    return {row[0]: row[1] for row in rows}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus 文本格式；阶段指标只覆盖本进程，独立 worker 进程的任务耗时见 jobs.stage_timings
+    counts = await db.run(count_jobs_by_status)
+    for status in {"PENDING", "PROCESSING", "COMPLETED", "FAILED"} | counts.keys():
+        JOBS_BY_STATUS.set(status, value=counts.get(status, 0))
+    ASR_PENDING_TRANSCRIPTS.set(value=transcript_poller.pending_count)
+    body = REGISTRY.render() + render_provider_snapshots([gemini_scheduler.snapshot(), asr_scheduler.snapshot()])
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # --- 启动应用 ---
 if __name__ == "__main__":
+    import uvicorn
     logging.info(f"--- 句子复述 AI 评测服务 (数据库版) ---")
     logging.info(f"将使用 Gemini 模型: {GEMINI_MODEL_NAME}")
     logging.info("访问 http://127.0.0.1:8000/docs 查看 API 文档。")
@@ -0,0 +1,185 @@
+# metrics.py (热路径计时与 Prometheus 文本格式指标)
+#
+# 不依赖 prometheus_client 的最小实现：Counter / Gauge / Histogram (带标签)，
+# 以及按阶段计时的 StageTimings。每个阶段会同时记录：
+#   retelling_stage_duration_seconds{pipeline, stage}  直方图
+#   retelling_stage_in_flight{pipeline, stage}         在途数量
+#   retelling_stage_errors_total{pipeline, stage}      出错次数
+# 指标只覆盖当前进程；独立 worker 进程的每任务阶段耗时另外持久化在 jobs 表中。
+
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_labels(label_names, label_values, extra: dict = None) -> str:
+    pairs = list(zip(label_names, label_values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def __init__(self, name, documentation, label_names=()):
+        super().__init__(name, documentation, label_names)
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    metric_type = "gauge"
+
+    def dec(self, *label_values, amount: float = 1.0):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values, value: float):
+        with self._lock:
+            self._values[label_values] = float(value)
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label_values -> [bucket_counts, sum, count]
+
+    def observe(self, *label_values, value: float):
+        with self._lock:
+            series = self._series.setdefault(label_values, [[0] * len(self.buckets), 0.0, 0])
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = self.header()
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for label_values, (bucket_counts, total, count) in items:
+            for upper, bucket_count in zip(self.buckets, bucket_counts):
+                labels = _format_labels(self.label_names, label_values, {"le": _format_value(upper)})
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = _format_labels(self.label_names, label_values, {"le": "+Inf"})
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            base = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{base} {_format_value(total)}")
+            lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "retelling_stage_duration_seconds", "Wall time spent in each pipeline stage.", ("pipeline", "stage")))
+STAGE_IN_FLIGHT = REGISTRY.register(Gauge(
+    "retelling_stage_in_flight", "Number of pipeline stages currently executing.", ("pipeline", "stage")))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "retelling_stage_errors_total", "Number of pipeline stages that raised an exception.", ("pipeline", "stage")))
+JOBS_BY_STATUS = REGISTRY.register(Gauge(
+    "retelling_jobs", "Jobs in the jobs table by status, sampled at scrape time.", ("status",)))
+ASR_PENDING_TRANSCRIPTS = REGISTRY.register(Gauge(
+    "retelling_asr_pending_transcripts", "Submitted transcripts awaiting completion in the poller, sampled at scrape time."))
+
+
+class StageTimings:
+    """记录一次任务 (或一次汇总) 各阶段的耗时，并同步更新全局指标。
+
+    用法：
+        timings = StageTimings("card")
+        with timings.stage("gemini_call"):
+            ...
+        timings.as_dict()  # {"gemini_call": 1.234, ...}
+    """
+
+    def __init__(self, pipeline: str, initial: dict = None):
+        self.pipeline = pipeline
+        self.timings = dict(initial or {})
+
+    @contextmanager
+    def stage(self, name: str):
+        STAGE_IN_FLIGHT.inc(self.pipeline, name)
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            STAGE_ERRORS.inc(self.pipeline, name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            STAGE_IN_FLIGHT.dec(self.pipeline, name)
+            self.record(name, elapsed)
+
+    def record(self, name: str, seconds: float):
+        """记录一个在别处测得的阶段耗时 (同名阶段累加)。"""
+        STAGE_DURATION.observe(self.pipeline, name, value=seconds)
+        self.timings[name] = round(self.timings.get(name, 0.0) + seconds, 4)
+
+    def as_dict(self) -> dict:
+        return dict(self.timings)
+
+
+def render_provider_snapshots(snapshots) -> str:
+    """把 ProviderScheduler.snapshot() 的结果渲染为 Prometheus 文本格式。"""
+    gauges = (("queued", "Calls waiting for a rate-limit token or concurrency slot."),
+              ("in_flight", "Calls currently executing against the provider."))
+    counters = (("calls_total", "Provider call attempts, including retries."),
+                ("retries_total", "Provider calls retried after a retryable error."),
+                ("failures_total", "Provider calls that failed after exhausting retries."),
+                ("rate_limited_total", "Provider responses with HTTP 429."))
+    lines = []
+    for key, documentation in gauges + counters:
+        metric = Counter if key.endswith("_total") else Gauge
+        rendered = metric(f"retelling_provider_{key}", documentation, ("provider",))
+        for snapshot in snapshots:
+            rendered.inc(snapshot["provider"], amount=snapshot[key])
+        lines.extend(rendered.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,28 @@
+# prompt_encoding.py (Prompt 中 ASR 数据的编码方式)
+#
+# json  : 原始方式，json.dumps(indent=2)，每个词都带全部字段名
+# table : 紧凑表格，每个词一行 "word|start|end|conf"，只保留 Prompt 实际用到的字段，
+#         置信度保留两位小数。词数相同时 token 数约为 json 方式的三分之一。
+
+import json
+
+ASR_ENCODINGS = ("json", "table")
+
+TABLE_FORMAT_NOTE = "ASR 数据为紧凑表格：首行为完整文本，其后每行一个词，格式为 `词|开始毫秒|结束毫秒|置信度`。"
+
+
+def encode_asr_table(asr_data: dict) -> str:
+    lines = [f"text: {asr_data.get('text') or ''}", "word|start|end|conf"]
+    for word in asr_data.get("words") or []:
+        confidence = word.get("confidence")
+        conf = f"{confidence:.2f}" if confidence is not None else ""
+        lines.append(f"{word.get('text')}|{word.get('start')}|{word.get('end')}|{conf}")
+    return "\n".join(lines)
+
+
+def encode_asr_data(asr_data: dict, encoding: str = "table") -> str:
+    if encoding == "json":
+        return json.dumps(asr_data, indent=2)
+    if encoding == "table":
+        return "\n```\n" + encode_asr_table(asr_data) + "\n```\n"
+    raise ValueError(f"Unknown ASR prompt encoding: {encoding!r} (expected one of {ASR_ENCODINGS})")
@@ -0,0 +1,152 @@
+# provider_scheduler.py (第三方 API 调用调度器)
+#
+# Gemini 与 AssemblyAI 的所有调用都经过各自的 ProviderScheduler：
+# - 令牌桶限速 (rate_per_second / burst)
+# - 并发上限 (max_in_flight)
+# - 对可重试错误 (429、5xx、超时、连接错误) 做带抖动的指数退避重试
+# - 按提供方统计排队深度、在途数量、重试与失败次数
+
+import asyncio
+import logging
+import random
+import time
+
+import httpx
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class RetryableProviderError(Exception):
+    """调用方明确标记为可重试的错误。"""
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    if isinstance(exc, (RetryableProviderError, TimeoutError, asyncio.TimeoutError, ConnectionError,
+                        httpx.TimeoutException, httpx.TransportError)):
+        return True
+    # google.genai.errors.APIError 使用 code，assemblyai.types.AssemblyAIError 使用 status_code
+    for attr in ("status_code", "code"):
+        status = getattr(exc, attr, None)
+        if isinstance(status, int) and status in RETRYABLE_STATUS_CODES:
+            return True
+    return False
+
+
+def error_status(exc: BaseException):
+    for attr in ("status_code", "code"):
+        status = getattr(exc, attr, None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, lock: asyncio.Lock):
+        # 持锁等待，保证先到先得
+        async with lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ProviderScheduler:
+    def __init__(self, name: str, rate_per_second: float = 5.0, burst: int = 10, max_in_flight: int = 8,
+                 max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0, is_retryable=is_retryable_error):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.is_retryable = is_retryable
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self._loop = None
+        self._semaphore = None
+        self._bucket_lock = None
+        # 指标
+        self.queued = 0
+        self.in_flight = 0
+        self.calls_total = 0
+        self.retries_total = 0
+        self.failures_total = 0
+        self.rate_limited_total = 0
+
+    def _ensure_loop(self):
+        # asyncio 原语绑定事件循环；在新的事件循环中 (如独立的 asyncio.run) 重新创建
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._bucket_lock = asyncio.Lock()
+
+    def backoff_delay(self, attempt: int) -> float:
+        """第 attempt 次重试前的等待时间：full jitter 指数退避。"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def call(self, fn, *args, timeout: float = None, **kwargs):
+        """通过调度器执行 `await fn(*args, **kwargs)`，timeout 为单次尝试的超时秒数。
+
+        同步函数可以借助 asyncio.to_thread 传入：`call(asyncio.to_thread, sync_fn, arg)`。
+        """
+        self._ensure_loop()
+        attempt = 0
+        while True:
+            self.queued += 1
+            try:
+                await self._semaphore.acquire()
+                try:
+                    await self._bucket.acquire(self._bucket_lock)
+                except BaseException:
+                    self._semaphore.release()
+                    raise
+            finally:
+                self.queued -= 1
+
+            self.in_flight += 1
+            self.calls_total += 1
+            try:
+                if timeout:
+                    return await asyncio.wait_for(fn(*args, **kwargs), timeout)
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                if error_status(e) == 429:
+                    self.rate_limited_total += 1
+                if attempt >= self.max_retries or not self.is_retryable(e):
+                    self.failures_total += 1
+                    raise
+                delay = self.backoff_delay(attempt)
+                attempt += 1
+                self.retries_total += 1
+                logging.warning(
+                    f"[{self.name}] 调用失败 ({type(e).__name__}: {e})，{delay:.1f} 秒后进行第 {attempt} 次重试 "
+                    f"(排队 {self.queued}, 在途 {self.in_flight - 1})。"
+                )
+            finally:
+                self.in_flight -= 1
+                self._semaphore.release()
+            # 退避期间不占用并发槽位
+            await asyncio.sleep(delay)
+
+    def snapshot(self) -> dict:
+        return {
+            "provider": self.name,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "calls_total": self.calls_total,
+            "retries_total": self.retries_total,
+            "failures_total": self.failures_total,
+            "rate_limited_total": self.rate_limited_total,
+        }
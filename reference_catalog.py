@@ -0,0 +1,70 @@
+# reference_catalog.py (参考句目录)
+#
+# 参考句是固定的课程内容：预先转录好的标准音频 ASR 数据与派生特征按 card_id 存入
+# reference_cards 表 (本地评分直接使用存储的特征)。提交时引用目录中的参考句即可，不必每次上传 original_audio，
+# 标准音频的转录也因此完全不在评测任务的关键路径上。
+# 目录由 import_references.py 批量导入。
+
+import json
+import time
+import zlib
+
+from local_scoring import derive_features
+from result_store import pack_asr_data, unpack_asr_data
+
+class ReferenceCatalog:
+    def __init__(self, db):
+        self.db = db
+
+    def init_table(self):
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS reference_cards (
+                card_id TEXT PRIMARY KEY,
+                audio_hash TEXT NOT NULL,
+                asr_data BLOB NOT NULL,
+                features TEXT NOT NULL,
+                source_path TEXT,
+                updated_at REAL NOT NULL
+            )""")
+
+    # --- 同步数据库操作 (通过 db.run 在数据库线程池中调用) ---
+
+    def exists(self, card_id: str) -> bool:
+        return self.db.query_one("SELECT 1 FROM reference_cards WHERE card_id = ?", (card_id,)) is not None
+
+    def existing_ids(self, card_ids) -> set:
+        card_ids = list(set(card_ids))
+        if not card_ids:
+            return set()
+        placeholders = ",".join("?" * len(card_ids))
+        rows = self.db.query_all(f"SELECT card_id FROM reference_cards WHERE card_id IN ({placeholders})", card_ids)
+        return {row[0] for row in rows}
+
+    def get(self, card_id: str):
+        """返回参考句记录，含 asr_data ({"text", "words"}) 与导入时派生的 features；目录中不存在时返回 None。"""
+        row = self.db.query_one(
+            "SELECT card_id, audio_hash, asr_data, features, source_path, updated_at FROM reference_cards WHERE card_id = ?",
+            (card_id,),
+        )
+        if not row:
+            return None
+        return {
+            "card_id": row["card_id"],
+            "audio_hash": row["audio_hash"],
+            "asr_data": unpack_asr_data(json.loads(zlib.decompress(row["asr_data"]).decode("utf-8"))),
+            "features": json.loads(row["features"]),
+            "source_path": row["source_path"],
+            "updated_at": row["updated_at"],
+        }
+
+    def audio_hashes(self) -> dict:
+        """{card_id: audio_hash}，批量导入时据此跳过内容未变的参考句 (断点续传)。"""
+        return {row[0]: row[1] for row in self.db.query_all("SELECT card_id, audio_hash FROM reference_cards")}
+
+    def put(self, card_id: str, audio_hash: str, asr_data: dict, source_path: str = None):
+        blob = zlib.compress(json.dumps(pack_asr_data(asr_data), separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+        self.db.execute(
+            """INSERT OR REPLACE INTO reference_cards (card_id, audio_hash, asr_data, features, source_path, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (card_id, audio_hash, blob, json.dumps(derive_features(asr_data)), source_path, time.time()),
+        )
@@ -0,0 +1,156 @@
+# result_store.py (评测结果的拆分存储)
+#
+# 评测报告、综合评分与 ASR 源数据分列存储：
+#   evaluation_report : 报告 JSON 文本 (汇总接口只读这一列)
+#   overall_score     : 整数评分，便于查询
+#   source_data       : zlib 压缩的紧凑 ASR 数据，词级信息以并列数组形式保存
+#   provisional_report: Gemini 报告到达前的本地临时报告；任务仍为 PROCESSING 时对外显示为 PARTIAL
+# 旧版本写入的 result 列会在启动时迁移到新列。
+
+import json
+import logging
+import time
+import zlib
+
+RESULT_COLUMNS = [
+    ("evaluation_report", "TEXT"),
+    ("overall_score", "INTEGER"),
+    ("source_data", "BLOB"),
+    ("provisional_report", "TEXT"),
+    # 首次完成的时间；轮次汇总按完成顺序分组 (round_summary_store.chunk_results)
+    ("completed_at", "REAL"),
+]
+
+# 词级字段中始终保留的列；speaker/channel 只有在存在非空值时才保留
+WORD_FIELDS = ("text", "start", "end", "confidence")
+OPTIONAL_WORD_FIELDS = ("speaker", "channel")
+
+
+def pack_asr_data(asr_data: dict) -> dict:
+    """{"text", "words": [{...}, ...]} -> {"text", "words": {字段: [值, ...]}}"""
+    words = asr_data.get("words") or []
+    columns = {field: [word.get(field) for word in words] for field in WORD_FIELDS}
+    for field in OPTIONAL_WORD_FIELDS:
+        values = [word.get(field) for word in words]
+        if any(value is not None for value in values):
+            columns[field] = values
+    return {"text": asr_data.get("text"), "words": columns}
+
+
+def unpack_asr_data(packed: dict) -> dict:
+    columns = packed.get("words") or {}
+    count = len(columns.get("text", []))
+    fields = list(WORD_FIELDS) + list(OPTIONAL_WORD_FIELDS)
+    words = [
+        {field: (columns[field][i] if field in columns else None) for field in fields}
+        for i in range(count)
+    ]
+    return {"text": packed.get("text"), "words": words}
+
+
+def compress_source_data(original_asr_data: dict, practice_asr_data: dict) -> bytes:
+    payload = {"original_asr": pack_asr_data(original_asr_data), "practice_asr": pack_asr_data(practice_asr_data)}
+    return zlib.compress(json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+
+def decompress_source_data(blob: bytes) -> dict:
+    payload = json.loads(zlib.decompress(blob).decode("utf-8"))
+    return {key: unpack_asr_data(value) for key, value in payload.items()}
+
+
+def extract_overall_score(evaluation_report):
+    score = evaluation_report.get("overall_score") if isinstance(evaluation_report, dict) else None
+    try:
+        return int(score) if score is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def ensure_result_columns(db):
+    db.ensure_columns("jobs", RESULT_COLUMNS)
+
+
+def migrate_legacy_results(db) -> int:
+    """把旧的整块 result JSON 拆分到新列，并清空 result 列。"""
+    rows = db.query_all("SELECT round_id, card_id, result FROM jobs WHERE result IS NOT NULL")
+    migrated = 0
+    with db.transaction() as conn:
+        for row in rows:
+            try:
+                full_card_data = json.loads(row["result"])
+                source_data = full_card_data.get("source_data") or {}
+                evaluation_report = full_card_data["evaluation_report"]
+                blob = compress_source_data(source_data.get("original_asr") or {}, source_data.get("practice_asr") or {})
+            except (ValueError, KeyError, AttributeError) as e:
+                logging.warning(f"[{row['round_id']}/{row['card_id']}] 旧结果无法迁移，保持原样: {e}")
+                continue
+            conn.execute(
+                """UPDATE jobs SET evaluation_report = ?, overall_score = ?, source_data = ?, result = NULL
+                   WHERE round_id = ? AND card_id = ?""",
+                (json.dumps(evaluation_report, ensure_ascii=False), extract_overall_score(evaluation_report), blob,
+                 row["round_id"], row["card_id"]),
+            )
+            migrated += 1
+    if migrated:
+        logging.info(f"已将 {migrated} 条旧格式评测结果迁移为拆分存储。")
+    return migrated
+
+
+def save_completed_result(db, round_id: str, card_id: str, evaluation_report: dict, original_asr_data: dict,
+                          practice_asr_data: dict, stage_timings: dict = None):
+    db.execute(
+        """UPDATE jobs SET status = ?, evaluation_report = ?, overall_score = ?, source_data = ?,
+               stage_timings = COALESCE(?, stage_timings), completed_at = COALESCE(completed_at, ?)
+           WHERE round_id = ? AND card_id = ?""",
+        ("COMPLETED", json.dumps(evaluation_report, ensure_ascii=False), extract_overall_score(evaluation_report),
+         compress_source_data(original_asr_data, practice_asr_data),
+         json.dumps(stage_timings) if stage_timings else None, time.time(), round_id, card_id),
+    )
+
+
+def save_provisional_result(db, round_id: str, card_id: str, provisional_report: dict):
+    # 只更新仍在处理中的任务，避免覆盖已经写入的最终结果
+    db.execute(
+        "UPDATE jobs SET provisional_report = ? WHERE round_id = ? AND card_id = ? AND status = ?",
+        (json.dumps(provisional_report, ensure_ascii=False), round_id, card_id, "PROCESSING"),
+    )
+
+
+def public_status(status: str, provisional_report) -> str:
+    """数据库中的状态保持 PROCESSING (租约回收依赖它)，已有临时报告时对外显示为 PARTIAL。"""
+    return "PARTIAL" if status == "PROCESSING" and provisional_report else status
+
+
+def load_card_result(db, round_id: str, card_id: str, include_source: bool = False):
+    """读取单卡任务；只有 include_source 为真时才读取并解压 ASR 源数据。返回 None 表示任务不存在。"""
+    columns = "round_id, card_id, status, error_message, evaluation_report, overall_score, provisional_report"
+    if include_source:
+        columns += ", source_data"
+    job = db.query_one(f"SELECT {columns} FROM jobs WHERE round_id = ? AND card_id = ?", (round_id, card_id))
+    if not job:
+        return None
+
+    status = public_status(job["status"], job["provisional_report"])
+    result = None
+    if job["evaluation_report"]:
+        result = {"evaluation_report": json.loads(job["evaluation_report"])}
+        if include_source and job["source_data"]:
+            result["source_data"] = decompress_source_data(job["source_data"])
+    elif status == "PARTIAL":
+        result = {"provisional_report": json.loads(job["provisional_report"])}
+    return {
+        "round_id": job["round_id"],
+        "card_id": job["card_id"],
+        "status": status,
+        "result": result,
+        "error_message": job["error_message"],
+    }
+
+
+def load_round_jobs(db, round_id: str) -> list:
+    """读取轮次内所有任务的状态行 (card_id, status, evaluation_report, provisional_report, error_message)，不读取 ASR 源数据。"""
+    return db.query_all(
+        """SELECT card_id, status, evaluation_report, provisional_report, error_message FROM jobs
+           WHERE round_id = ? ORDER BY card_id""",
+        (round_id,),
+    )
@@ -0,0 +1,305 @@
+# round_summary_store.py (轮次汇总报告物化存储)
+#
+# 每个 round_id 的汇总报告连同其所依据的 COMPLETED 卡片集合的指纹一起存入 SQLite。
+# 指纹未变时直接返回已存报告；有新卡片完成时在后台刷新，并保证同一轮次同时只有
+# 一个 Gemini 调用在进行：进程内按 round_id 复用同一个刷新任务，跨进程 (多个 uvicorn worker
+# 或 worker.py) 则由 round_summaries 中的刷新租约 (refresh_owner / refreshing_until) 保证，
+# 租约在 BEGIN IMMEDIATE 事务中认领，刷新期间定期续约；未拿到租约的进程轮询已存报告，
+# 直到指纹一致或对方的租约过期 (如进程崩溃) 后自行接手。
+#
+# 卡片较多的轮次改为分层 (map-reduce) 汇总：按完成顺序 (jobs.completed_at) 每 chunk_size 张卡片一组，
+# 各组并发压缩为简短的模式摘要 (digest)，再由全部摘要生成最终报告。摘要按组的指纹缓存在
+# round_summary_digests 表中。新完成的卡片总是排在最后，已有各组的成员不变，
+# 无论卡片以什么顺序完成，都只有最后一组需要重新生成，
+# 最终 Prompt 的大小也只随组数增长，不再随卡片数线性增长。
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from job_queue import default_worker_id
+from metrics import StageTimings
+
+
+def fingerprint_results(rows) -> str:
+    """根据 (card_id, evaluation_report) 行计算指纹，行顺序不影响结果。"""
+    digest = hashlib.sha256()
+    for card_id, evaluation_report in sorted(rows):
+        digest.update(card_id.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(hashlib.sha256(evaluation_report.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+def chunk_results(rows, chunk_size: int) -> list:
+    """按给定顺序 (完成顺序) 切分为每组 chunk_size 行；新完成的卡片只会进入最后一组。"""
+    rows = list(rows)
+    return [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+
+
+class RoundSummaryStore:
+    """物化的轮次汇总报告。
+
+    `generate` 是一个 async 函数 `(round_id, card_data, timings) -> dict`，负责真正调用 Gemini，
+    并在 timings (StageTimings) 上记录 prompt 构建、Gemini 调用与解析各阶段的耗时。
+
+    同时提供 `digest` `(round_id, chunk_index, card_data) -> dict` 与
+    `generate_from_digests` `(round_id, digests, timings) -> dict` 时，已完成卡片数达到
+    hierarchical_min_cards 的轮次走分层汇总。
+
+    lease_seconds 为跨进程刷新租约的时长，poll_interval 为未拿到租约时轮询已存报告的间隔。
+    """
+
+    def __init__(self, db, generate, refresh_delay_seconds: float = 5.0, digest=None, generate_from_digests=None,
+                 chunk_size: int = 20, hierarchical_min_cards: int = 40, lease_seconds: float = 300.0,
+                 poll_interval: float = 1.0, owner: str = None):
+        self.db = db
+        self.generate = generate
+        self.refresh_delay_seconds = refresh_delay_seconds
+        self.digest = digest
+        self.generate_from_digests = generate_from_digests
+        self.chunk_size = chunk_size
+        self.hierarchical_min_cards = hierarchical_min_cards
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.owner = owner or default_worker_id()
+        self._tasks: "dict[str, asyncio.Task]" = {}
+
+    def init_table(self):
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS round_summaries (
+                round_id TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                report TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        self.db.ensure_columns("round_summaries", [
+            ("stage_timings", "TEXT"),
+            # 跨进程刷新租约；还没有报告的轮次在认领时插入 fingerprint 为空的占位行
+            ("refresh_owner", "TEXT"),
+            ("refreshing_until", "REAL"),
+        ])
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS round_summary_digests (
+                round_id TEXT NOT NULL,
+                chunk_fingerprint TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (round_id, chunk_fingerprint)
+            )""")
+
+    # --- 同步数据库操作 (通过 db.run 在数据库线程池中调用) ---
+
+    def load_completed_results(self, round_id: str) -> list:
+        # 按完成顺序返回；迁移前完成的卡片没有 completed_at，排在最前 (按 card_id)
+        rows = self.db.query_all(
+            """SELECT card_id, evaluation_report FROM jobs WHERE round_id = ? AND status = ?
+               ORDER BY completed_at, card_id""",
+            (round_id, "COMPLETED"),
+        )
+        return [(row[0], row[1]) for row in rows]
+
+    def get_stored(self, round_id: str):
+        row = self.db.query_one(
+            "SELECT fingerprint, report FROM round_summaries WHERE round_id = ?", (round_id,)
+        )
+        if not row:
+            return None
+        return row[0], json.loads(row[1])
+
+    def save(self, round_id: str, fingerprint: str, report: dict, stage_timings: dict = None):
+        # 不使用 INSERT OR REPLACE，保留同一行上的刷新租约
+        self.db.execute(
+            """INSERT INTO round_summaries (round_id, fingerprint, report, updated_at, stage_timings)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (round_id) DO UPDATE SET fingerprint = excluded.fingerprint, report = excluded.report,
+                   updated_at = excluded.updated_at, stage_timings = excluded.stage_timings""",
+            (round_id, fingerprint, json.dumps(report, ensure_ascii=False), time.time(),
+             json.dumps(stage_timings) if stage_timings else None),
+        )
+
+    def claim_refresh(self, round_id: str, fingerprint: str) -> tuple:
+        """在同一事务中检查已存报告并认领刷新租约，返回 (状态, 报告)。
+
+        状态为 "fresh" (已存报告的指纹一致，附带报告)、"claimed" (本进程拿到或续约了租约)
+        或 "busy" (其他进程持有未过期的租约)。
+        """
+        now = time.time()
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT fingerprint, report, refresh_owner, refreshing_until FROM round_summaries WHERE round_id = ?",
+                (round_id,),
+            ).fetchone()
+            if row and row["fingerprint"] == fingerprint:
+                return "fresh", json.loads(row["report"])
+            if row and row["refresh_owner"] not in (None, self.owner) and (row["refreshing_until"] or 0) > now:
+                return "busy", None
+            if row:
+                conn.execute(
+                    "UPDATE round_summaries SET refresh_owner = ?, refreshing_until = ? WHERE round_id = ?",
+                    (self.owner, now + self.lease_seconds, round_id),
+                )
+            else:
+                conn.execute(
+                    """INSERT INTO round_summaries (round_id, fingerprint, report, updated_at, refresh_owner, refreshing_until)
+                       VALUES (?, '', 'null', ?, ?, ?)""",
+                    (round_id, now, self.owner, now + self.lease_seconds),
+                )
+        return "claimed", None
+
+    def renew_refresh(self, round_id: str):
+        now = time.time()
+        self.db.execute(
+            "UPDATE round_summaries SET refreshing_until = ? WHERE round_id = ? AND refresh_owner = ?",
+            (now + self.lease_seconds, round_id, self.owner),
+        )
+
+    def release_refresh(self, round_id: str):
+        self.db.execute(
+            "UPDATE round_summaries SET refresh_owner = NULL, refreshing_until = NULL WHERE round_id = ? AND refresh_owner = ?",
+            (round_id, self.owner),
+        )
+
+    def get_digests(self, round_id: str, fingerprints) -> dict:
+        """{chunk_fingerprint: digest}，只包含已缓存的组。"""
+        fingerprints = list(fingerprints)
+        if not fingerprints:
+            return {}
+        placeholders = ",".join("?" * len(fingerprints))
+        rows = self.db.query_all(
+            f"SELECT chunk_fingerprint, digest FROM round_summary_digests WHERE round_id = ? AND chunk_fingerprint IN ({placeholders})",
+            [round_id] + fingerprints,
+        )
+        return {row[0]: json.loads(row[1]) for row in rows}
+
+    def save_digest(self, round_id: str, fingerprint: str, digest: dict):
+        self.db.execute(
+            "INSERT OR REPLACE INTO round_summary_digests (round_id, chunk_fingerprint, digest, created_at) VALUES (?, ?, ?, ?)",
+            (round_id, fingerprint, json.dumps(digest, ensure_ascii=False), time.time()),
+        )
+
+    def prune_digests(self, round_id: str, keep_fingerprints):
+        """删除该轮次中已不属于当前分组的摘要 (组内卡片变化后旧摘要不会再被命中)。"""
+        keep_fingerprints = list(keep_fingerprints)
+        placeholders = ",".join("?" * len(keep_fingerprints))
+        self.db.execute(
+            f"DELETE FROM round_summary_digests WHERE round_id = ? AND chunk_fingerprint NOT IN ({placeholders})",
+            [round_id] + keep_fingerprints,
+        )
+
+    # --- 汇总生成 ---
+
+    def is_hierarchical(self, card_count: int) -> bool:
+        return self.digest is not None and self.generate_from_digests is not None and card_count >= self.hierarchical_min_cards
+
+    async def _digest_chunk(self, round_id: str, chunk_index: int, fingerprint: str, rows) -> dict:
+        card_data = {card_id: json.loads(evaluation_report) for card_id, evaluation_report in rows}
+        digest = await self.digest(round_id, chunk_index, card_data)
+        # 每组完成即写入缓存，其他组失败时已完成的摘要不会丢失
+        await self.db.run(self.save_digest, round_id, fingerprint, digest)
+        return digest
+
+    async def _generate_hierarchical(self, round_id: str, rows, timings: StageTimings) -> dict:
+        chunks = chunk_results(rows, self.chunk_size)
+        fingerprints = [fingerprint_results(chunk) for chunk in chunks]
+        with timings.stage("db_read"):
+            cached = await self.db.run(self.get_digests, round_id, fingerprints)
+        missing = [i for i, fp in enumerate(fingerprints) if fp not in cached]
+        logging.info(f"[{round_id}] 分层汇总: {len(chunks)} 组，{len(chunks) - len(missing)} 组命中摘要缓存，"
+                     f"{len(missing)} 组需要生成。")
+
+        with timings.stage("map"):
+            results = await asyncio.gather(
+                *[self._digest_chunk(round_id, i, fingerprints[i], chunks[i]) for i in missing], return_exceptions=True
+            )
+        for i, result in zip(missing, results):
+            if isinstance(result, BaseException):
+                raise result
+            cached[fingerprints[i]] = result
+
+        report = await self.generate_from_digests(round_id, [cached[fp] for fp in fingerprints], timings)
+        with timings.stage("db_write"):
+            await self.db.run(self.prune_digests, round_id, fingerprints)
+        return report
+
+    # --- 刷新调度 ---
+
+    async def _lease_loop(self, round_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.db.run(self.renew_refresh, round_id)
+            except Exception as e:
+                logging.error(f"[{round_id}] 汇总报告刷新租约续约失败: {e}")
+
+    async def _refresh_loop(self, round_id: str, delay: float):
+        if delay:
+            # 同一轮次的卡片通常接连完成，稍作等待以合并为一次刷新
+            await asyncio.sleep(delay)
+        try:
+            while True:
+                timings = StageTimings("summary")
+                with timings.stage("db_read"):
+                    rows = await self.db.run(self.load_completed_results, round_id)
+                    if not rows:
+                        return None
+                    fingerprint = fingerprint_results(rows)
+                    state, stored_report = await self.db.run(self.claim_refresh, round_id, fingerprint)
+                if state == "fresh":
+                    return stored_report
+                if state == "busy":
+                    # 其他进程正在刷新该轮次，等待其写入报告 (或租约过期) 后重新检查
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+
+                logging.info(f"[{round_id}] 汇总报告已过期或不存在，开始刷新 ({len(rows)} 张卡片)...")
+                lease = asyncio.create_task(self._lease_loop(round_id))
+                try:
+                    if self.is_hierarchical(len(rows)):
+                        report = await self._generate_hierarchical(round_id, rows, timings)
+                    else:
+                        # 只读取报告列，不再解析词级 ASR 数据
+                        card_data = {card_id: json.loads(evaluation_report) for card_id, evaluation_report in rows}
+                        report = await self.generate(round_id, card_data, timings)
+                finally:
+                    lease.cancel()
+                # 写入耗时无法计入同一行，只进入直方图
+                with timings.stage("db_write"):
+                    await self.db.run(self.save, round_id, fingerprint, report, timings.as_dict())
+                logging.info(f"[{round_id}] 汇总报告已刷新并存储 (阶段耗时: {timings.as_dict()})。")
+                # 生成期间可能有新卡片完成，循环一次以确认指纹仍然一致 (租约仍归本进程，可直接续用)
+        finally:
+            # 刷新失败或被取消时同样释放租约，其他进程不必等到租约过期
+            await self.db.run(self.release_refresh, round_id)
+
+    def _on_task_done(self, round_id: str, task: asyncio.Task):
+        if self._tasks.get(round_id) is task:
+            del self._tasks[round_id]
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"[{round_id}] 汇总报告刷新失败: {task.exception()}")
+
+    def schedule_refresh(self, round_id: str, delay: float = None) -> asyncio.Task:
+        """确保该轮次有一个刷新任务在运行；已有任务时直接复用 (去重)。"""
+        task = self._tasks.get(round_id)
+        if task is not None and not task.done():
+            return task
+        if delay is None:
+            delay = self.refresh_delay_seconds
+        task = asyncio.create_task(self._refresh_loop(round_id, delay))
+        self._tasks[round_id] = task
+        task.add_done_callback(lambda t: self._on_task_done(round_id, t))
+        return task
+
+    async def get_or_refresh(self, round_id: str):
+        """返回最新的汇总报告；没有任何已完成卡片时返回 None。"""
+        rows = await self.db.run(self.load_completed_results, round_id)
+        if not rows:
+            return None
+        stored = await self.db.run(self.get_stored, round_id)
+        if stored and stored[0] == fingerprint_results(rows):
+            return stored[1]
+        task = self.schedule_refresh(round_id, delay=0)
+        # shield: 客户端断开时不取消共享的刷新任务
+        return await asyncio.shield(task)
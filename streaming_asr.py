@@ -0,0 +1,147 @@
+# streaming_asr.py (流式转录接口)
+#
+# 练习音频通过 WebSocket 边说边上传时，音频帧实时转发给流式转录服务，已结束的语段 (turn)
+# 增量累积为与批量转录相同的 {"text", "words"} 结构；流结束时只需等待最后一个语段，
+# 不必在说完之后再从头转录整段音频。
+#
+# StreamingTranscriber / StreamingSession 是接口：
+# - AssemblyAIStreamingTranscriber: 基于 AssemblyAI v3 流式 API (PCM16 单声道)
+# - 本地回放替身: benchmarks/fake_providers.py 中的 ReplayStreamingTranscriber
+
+import abc
+import asyncio
+import logging
+
+
+def word_to_dict(text: str, start: int, end: int, confidence: float) -> dict:
+    """与批量转录 word.dict() 的字段保持一致，下游 prompt 编码与存储无需区分来源。"""
+    return {"text": text, "start": start, "end": end, "confidence": confidence, "speaker": None, "channel": None}
+
+
+class TranscriptAccumulator:
+    """按 turn_order 累积已结束的语段；同一语段的格式化版本会覆盖未格式化版本。"""
+
+    def __init__(self):
+        self._turns = {}
+
+    def add_turn(self, turn_order: int, text: str, words: list):
+        self._turns[turn_order] = (text, words)
+
+    def preview(self, partial_text: str = "") -> str:
+        """已结束语段加上当前未结束语段的文本，用于向客户端推送中间结果。"""
+        texts = [text for _, (text, _) in sorted(self._turns.items()) if text]
+        if partial_text:
+            texts.append(partial_text)
+        return " ".join(texts)
+
+    def result(self) -> dict:
+        ordered = [self._turns[key] for key in sorted(self._turns)]
+        return {
+            "text": " ".join(text for text, _ in ordered if text),
+            "words": [word for _, words in ordered for word in words],
+        }
+
+
+class StreamingSession(abc.ABC):
+    """一次流式转录会话。所有方法都在事件循环中调用。"""
+
+    @abc.abstractmethod
+    async def send_audio(self, chunk: bytes):
+        ...
+
+    @abc.abstractmethod
+    async def finish(self) -> dict:
+        """音频已全部发送：等待最后的语段并返回 {"text", "words"}。"""
+
+    @abc.abstractmethod
+    async def abort(self):
+        """客户端中途断开时丢弃会话。"""
+
+
+class StreamingTranscriber(abc.ABC):
+    @abc.abstractmethod
+    async def open(self, sample_rate: int, on_partial=None) -> StreamingSession:
+        """建立会话。on_partial(text) 在事件循环中被调用，text 为当前的完整中间转录。"""
+
+
+class AssemblyAIStreamingSession(StreamingSession):
+    # AssemblyAI 要求每次发送 50ms ~ 1000ms 的音频，过小的 WebSocket 帧先在这里合并
+    MIN_CHUNK_SECONDS = 0.05
+
+    def __init__(self, client, sample_rate: int, loop: asyncio.AbstractEventLoop, on_partial=None):
+        self._client = client
+        self._loop = loop
+        self._on_partial = on_partial
+        self._min_chunk_bytes = int(sample_rate * 2 * self.MIN_CHUNK_SECONDS)
+        self._pending = bytearray()
+        self.accumulator = TranscriptAccumulator()
+        self.error = None
+
+    # SDK 在自己的读线程中回调，这里转交给事件循环
+    def on_turn(self, client, event):
+        self._loop.call_soon_threadsafe(self._handle_turn, event)
+
+    def on_error(self, client, error):
+        self._loop.call_soon_threadsafe(self._handle_error, error)
+
+    def _handle_turn(self, event):
+        if event.end_of_turn:
+            words = [word_to_dict(w.text, w.start, w.end, w.confidence) for w in event.words]
+            self.accumulator.add_turn(event.turn_order, event.transcript, words)
+            partial_text = ""
+        else:
+            partial_text = event.transcript
+        if self._on_partial:
+            self._on_partial(self.accumulator.preview(partial_text))
+
+    def _handle_error(self, error):
+        logging.error(f"[assemblyai-streaming] 流式转录出错: {error}")
+        self.error = error
+
+    def raise_if_failed(self):
+        if self.error is None:
+            return
+        # StreamingError 带有 code 属性，ProviderScheduler 据此判断是否可重试
+        if isinstance(self.error, BaseException):
+            raise self.error
+        raise Exception(f"Streaming ASR Error: {self.error}")
+
+    async def send_audio(self, chunk: bytes):
+        self.raise_if_failed()
+        self._pending.extend(chunk)
+        if len(self._pending) >= self._min_chunk_bytes:
+            # stream() 只是放入 SDK 的发送队列，不会阻塞
+            self._client.stream(bytes(self._pending))
+            self._pending.clear()
+
+    async def finish(self) -> dict:
+        if self._pending:
+            self._client.stream(bytes(self._pending))
+            self._pending.clear()
+        # terminate=True 会等待服务端返回最后的语段与 Termination 事件
+        await asyncio.to_thread(self._client.disconnect, True)
+        # 让 disconnect 期间跨线程投递的回调先执行完
+        await asyncio.sleep(0)
+        self.raise_if_failed()
+        return self.accumulator.result()
+
+    async def abort(self):
+        await asyncio.to_thread(self._client.disconnect, False)
+
+
+class AssemblyAIStreamingTranscriber(StreamingTranscriber):
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    async def open(self, sample_rate: int, on_partial=None) -> StreamingSession:
+        from assemblyai.streaming.v3 import StreamingClient, StreamingClientOptions, StreamingEvents, StreamingParameters
+
+        client = StreamingClient(StreamingClientOptions(api_key=self.api_key))
+        session = AssemblyAIStreamingSession(client, sample_rate, asyncio.get_running_loop(), on_partial)
+        client.on(StreamingEvents.Turn, session.on_turn)
+        client.on(StreamingEvents.Error, session.on_error)
+        await asyncio.to_thread(client.connect, StreamingParameters(sample_rate=sample_rate, format_turns=True))
+        await asyncio.sleep(0)
+        # 握手失败不会抛出，而是通过 Error 事件报告
+        session.raise_if_failed()
+        return session
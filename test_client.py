@@ -65,48 +65,51 @@ def run_full_demo():
         print("\n❌ 没有成功提交任何卡片，演示结束。")
         return
     
-    # [步骤 3] 智能轮询，获取逐句结果
-    print(f"\n[步骤 3] 智能轮询获取评测结果...")
+    # [步骤 3] 订阅事件流，实时获取逐句结果
+    print(f"\n[步骤 3] 订阅 /round-events 事件流获取评测结果...")
     finished_cards = {}
     max_wait_seconds = 600 # 最长等待10分钟
-    poll_interval_seconds = 30 # 每30秒查询一次
     start_time = time.time()
 
-    while len(finished_cards) < len(submitted_cards) and (time.time() - start_time) < max_wait_seconds:
-        print(f"\n--- {int(time.time() - start_time)}s / {max_wait_seconds}s ---")
-        for card_id in submitted_cards:
-            if card_id in finished_cards:
-                continue # 如果已完成，则跳过
+    try:
+        # 服务器空闲时每隔几秒发送心跳，因此读取超时只需覆盖心跳间隔
+        with requests.get(f"{BASE_URL}/round-events/{round_id}", stream=True, timeout=(5, 60)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if time.time() - start_time > max_wait_seconds:
+                    print(f"  ⚠️ 等待超过 {max_wait_seconds} 秒，停止订阅。")
+                    break
+                if not line or not line.startswith("data:"):
+                    continue # 跳过空行、事件类型行与心跳注释
 
-            try:
-                response = requests.get(f"{BASE_URL}/get-single-card-result/{round_id}/{card_id}", timeout=10)
-                response.raise_for_status()
-                
-                job = response.json()
+                job = json.loads(line[len("data:"):])
+                card_id = job.get("card_id")
                 status = job.get("status")
-                
+                if card_id not in submitted_cards or card_id in finished_cards:
+                    continue
+                elapsed = int(time.time() - start_time)
+
                 if status == "COMPLETED":
-                    print(f"  ✅ {card_id}: 评测完成！")
+                    print(f"  ✅ [{elapsed}s] {card_id}: 评测完成！")
                     print("-" * 20 + f" [{card_id}] 详细报告 " + "-" * 20)
                     print(json.dumps(job.get("result", {}).get("evaluation_report"), indent=2, ensure_ascii=False))
                     print("-" * 55 + "\n")
                     finished_cards[card_id] = "COMPLETED"
 
                 elif status == "FAILED":
-                    print(f"  ❌ {card_id}: 评测失败！")
+                    print(f"  ❌ [{elapsed}s] {card_id}: 评测失败！")
                     print(f"     错误原因: {job.get('error_message')}")
                     finished_cards[card_id] = "FAILED"
                 
                 else: # PENDING or PROCESSING
-                    print(f"  ⏳ {card_id}: 状态为 {status}... 正在处理中。")
+                    print(f"  ⏳ [{elapsed}s] {card_id}: 状态为 {status}... 正在处理中。")
 
-            except requests.exceptions.HTTPError as e:
-                print(f"  ❌ 查询 {card_id} 时发生HTTP错误: {e.response.status_code} - {e.response.text}")
-            except Exception as e:
-                print(f"  ❌ 查询 {card_id} 时发生未知错误: {e}")
-        
-        if len(finished_cards) < len(submitted_cards):
-            time.sleep(poll_interval_seconds)
+                if len(finished_cards) == len(submitted_cards):
+                    break
+    except requests.exceptions.HTTPError as e:
+        print(f"  ❌ 订阅事件流时发生HTTP错误: {e.response.status_code} - {e.response.text}")
+    except Exception as e:
+        print(f"  ❌ 订阅事件流时发生未知错误: {e}")
 
     # [步骤 4] 获取并显示最终汇总报告
     print("\n[步骤 4] 所有任务处理完毕，获取最终汇总报告...")
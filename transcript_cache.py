@@ -0,0 +1,113 @@
+# transcript_cache.py (标准音频转录缓存)
+#
+# 大量学生复述的是同一批标准句子，因此标准音频 (original_audio) 的 ASR 结果可以按
+# 音频内容的哈希值复用。缓存分两层：进程内 LRU + 与 jobs 表同库的 SQLite 表。
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_audio_file(path: str) -> str:
+    """按块计算音频文件的 SHA-256，避免一次性把整个文件读入内存。"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """以音频哈希为键缓存 {"text", "words"} 转录结果。
+
+    - 进程内 LRU 命中时不访问数据库。
+    - SQLite 表按条目数 (max_entries) 和存活时间 (max_age_seconds) 淘汰，
+      淘汰顺序依据 last_used_at。
+    """
+
+    def __init__(self, db, max_entries: int = 5000, max_age_seconds: float = 30 * 24 * 3600, lru_size: int = 256):
+        self.db = db
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_table(self):
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS transcript_cache (
+                audio_hash TEXT PRIMARY KEY,
+                transcript TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_transcript_cache_last_used ON transcript_cache (last_used_at);
+        """)
+
+    def _lru_get(self, audio_hash: str):
+        with self._lock:
+            entry = self._lru.get(audio_hash)
+            if entry is None:
+                return None
+            created_at, data = entry
+            if time.time() - created_at > self.max_age_seconds:
+                del self._lru[audio_hash]
+                return None
+            self._lru.move_to_end(audio_hash)
+            return data
+
+    def _lru_put(self, audio_hash: str, data: dict, created_at: float):
+        with self._lock:
+            self._lru[audio_hash] = (created_at, data)
+            self._lru.move_to_end(audio_hash)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def get(self, audio_hash: str):
+        """返回缓存的 {"text", "words"}，未命中或已过期时返回 None。"""
+        data = self._lru_get(audio_hash)
+        if data is not None:
+            return data
+
+        now = time.time()
+        row = self.db.query_one(
+            "SELECT transcript, created_at FROM transcript_cache WHERE audio_hash = ?", (audio_hash,)
+        )
+        if not row:
+            return None
+        transcript, created_at = row
+        if now - created_at > self.max_age_seconds:
+            self.db.execute("DELETE FROM transcript_cache WHERE audio_hash = ?", (audio_hash,))
+            return None
+        self.db.execute("UPDATE transcript_cache SET last_used_at = ? WHERE audio_hash = ?", (now, audio_hash))
+
+        data = json.loads(transcript)
+        self._lru_put(audio_hash, data, created_at)
+        return data
+
+    def put(self, audio_hash: str, data: dict):
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO transcript_cache (audio_hash, transcript, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+            (audio_hash, json.dumps(data), now, now),
+        )
+        self._lru_put(audio_hash, data, now)
+        self.evict()
+
+    def evict(self):
+        """删除过期条目，并在条目数超限时按最近使用时间淘汰最旧的条目。"""
+        cutoff = time.time() - self.max_age_seconds
+        expired = self.db.execute("DELETE FROM transcript_cache WHERE created_at < ?", (cutoff,))
+        overflow = self.db.execute(
+            """DELETE FROM transcript_cache WHERE audio_hash IN (
+                   SELECT audio_hash FROM transcript_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+               )""",
+            (self.max_entries,),
+        )
+        if expired or overflow:
+            logging.info(f"转录缓存淘汰: 过期 {expired} 条, 超量 {overflow} 条。")
@@ -0,0 +1,254 @@
+# upload_stream.py (分块流式保存上传音频)
+#
+# 上传的音频边接收边写入磁盘：文件写入放在线程池中执行，不阻塞事件循环；同时边写边计算
+# SHA-256 并强制执行最大文件大小限制。
+# multipart 请求体 (单卡与整轮提交) 由 MultipartDiskParser 边接收边解析：文件 part 直接写入目标目录
+# (不经过 request.form() 先把整个上传缓存到磁盘)，大小限制在接收过程中逐个 part 执行。
+# WebSocket 上以二进制帧发送的文件由 receive_websocket_file 以同样的方式落盘。
+
+import asyncio
+import codecs
+import hashlib
+import json
+import os
+import uuid
+from dataclasses import dataclass, field
+
+from fastapi import WebSocket, WebSocketDisconnect
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+
+class StreamProtocolError(Exception):
+    """WebSocket 客户端发送了不符合约定的消息。"""
+
+
+class UploadTooLargeError(Exception):
+    """上传内容超过允许的最大字节数。"""
+
+    def __init__(self, field_name: str, max_bytes: int):
+        super().__init__(f"Upload '{field_name}' exceeds the maximum size of {max_bytes} bytes.")
+        self.field_name = field_name
+        self.max_bytes = max_bytes
+
+
+def parse_control_message(text: str) -> dict:
+    """解析 WebSocket 文本帧中的 JSON 控制消息；格式不正确时返回空 dict。"""
+    try:
+        message = json.loads(text or "")
+    except ValueError:
+        return {}
+    return message if isinstance(message, dict) else {}
+
+
+async def receive_stream_message(websocket: WebSocket, idle_timeout: float = None) -> dict:
+    """接收一条 WebSocket 消息；客户端断开时抛出 WebSocketDisconnect，空闲超时抛出 StreamProtocolError。"""
+    try:
+        message = await asyncio.wait_for(websocket.receive(), idle_timeout)
+    except asyncio.TimeoutError:
+        raise StreamProtocolError(f"No message received for {idle_timeout:.0f} seconds.")
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    return message
+
+
+async def receive_websocket_file(websocket: WebSocket, dest_path: str, max_bytes: int, end_type: str,
+                                 field_name: str = "audio", idle_timeout: float = None) -> tuple:
+    """把二进制帧依次写入 dest_path，直到收到文本帧 {"type": end_type}；返回 (字节数, sha256 十六进制摘要)。
+
+    超过 max_bytes、收到其他文本帧、空闲超时或客户端断开时删除已写入的部分文件并抛出异常。
+    """
+    digest = hashlib.sha256()
+    size = 0
+    f = await asyncio.to_thread(open, dest_path, "wb")
+    try:
+        while True:
+            message = await receive_stream_message(websocket, idle_timeout)
+            chunk = message.get("bytes")
+            if chunk is None:
+                if parse_control_message(message.get("text")).get("type") == end_type:
+                    break
+                raise StreamProtocolError(f"Expected binary '{field_name}' frames or {{\"type\": \"{end_type}\"}}.")
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(field_name, max_bytes)
+            digest.update(chunk)
+            await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        await asyncio.to_thread(f.close)
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    await asyncio.to_thread(f.close)
+    return size, digest.hexdigest()
+
+
+# --- multipart 请求体的流式解析 ---
+
+class MultipartFormError(Exception):
+    """multipart 请求体格式不正确或超出字段/文件数量限制。"""
+
+
+@dataclass
+class StreamedFilePart:
+    """已写入磁盘的文件 part；too_large 时文件已被删除，path 不可用。"""
+    field_name: str
+    filename: str
+    path: str
+    size: int = 0
+    sha256: str = None
+    too_large: bool = False
+    _digest: object = field(default_factory=hashlib.sha256, repr=False)
+    _file: object = field(default=None, repr=False)
+
+
+class MultipartDiskParser:
+    """把 multipart/form-data 请求体流式解析为 (文本字段 dict, 文件 part dict)，均以 part 名称为键。
+
+    文件 part 写入 dest_dir 下的临时文件 (调用方负责在使用后删除 StreamedFilePart.path)；
+    单个 part 超过 max_bytes 时停止写入并删除该文件，标记 too_large，其余 part 照常解析。
+    磁盘写入在线程池中执行，每收到一个网络块只切换一次线程。
+    """
+
+    def __init__(self, content_type: str, dest_dir: str, max_bytes: int, max_files: int = 1000,
+                 max_fields: int = 1000, max_field_bytes: int = 1024 * 1024):
+        _, params = parse_options_header(content_type)
+        if b"boundary" not in params:
+            raise MultipartFormError("Request body must be multipart/form-data with a boundary.")
+        charset = params.get(b"charset", b"utf-8")
+        try:
+            self.charset = codecs.lookup(charset.decode("latin-1")).name
+        except LookupError:
+            self.charset = "latin-1"
+        self.boundary = params[b"boundary"]
+        self.dest_dir = dest_dir
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.max_fields = max_fields
+        self.max_field_bytes = max_field_bytes
+        self.fields = {}
+        self.files = {}
+        # 每次 parser.write 后在线程池中统一执行的文件操作
+        self._pending_ops = []
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._part_name = None
+        self._field_data = None
+        self._file_part = None
+
+    # --- python-multipart 回调 (同步，只记录需要执行的文件操作) ---
+
+    def on_part_begin(self):
+        self._disposition, self._part_name, self._field_data, self._file_part = b"", None, None, None
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name, self._header_value = b"", b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if b"name" not in options:
+            raise MultipartFormError('The Content-Disposition header field "name" must be provided.')
+        self._part_name = options[b"name"].decode(self.charset, errors="replace")
+        if b"filename" in options:
+            if self._part_name in self.files:
+                # 同名文件 part 会覆盖前一个，前一个 part 的临时文件将无人删除
+                raise MultipartFormError(f"Duplicate file part '{self._part_name}'.")
+            if len(self.files) >= self.max_files:
+                raise MultipartFormError(f"Too many files. Maximum number of files is {self.max_files}.")
+            path = os.path.join(self.dest_dir, f"upload_{uuid.uuid4()}.part")
+            self._file_part = StreamedFilePart(self._part_name, options[b"filename"].decode(self.charset, errors="replace"), path)
+            self.files[self._part_name] = self._file_part
+            self._pending_ops.append(("open", self._file_part, None))
+        else:
+            if len(self.fields) >= self.max_fields:
+                raise MultipartFormError(f"Too many fields. Maximum number of fields is {self.max_fields}.")
+            self._field_data = bytearray()
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._file_part is None:
+            if len(self._field_data) + end - start > self.max_field_bytes:
+                raise MultipartFormError(f"Field '{self._part_name}' exceeds {self.max_field_bytes} bytes.")
+            self._field_data.extend(data[start:end])
+            return
+        part = self._file_part
+        if part.too_large:
+            return
+        part.size += end - start
+        if part.size > self.max_bytes:
+            part.too_large = True
+            self._pending_ops.append(("discard", part, None))
+        else:
+            self._pending_ops.append(("write", part, data[start:end]))
+
+    def on_part_end(self):
+        if self._file_part is None:
+            self.fields[self._part_name] = self._field_data.decode(self.charset, errors="replace")
+        elif not self._file_part.too_large:
+            self._pending_ops.append(("close", self._file_part, None))
+
+    # --- 文件操作 (线程池中执行) ---
+
+    @staticmethod
+    def _apply(ops):
+        for op, part, data in ops:
+            if op == "open":
+                part._file = open(part.path, "wb")
+            elif op == "write":
+                part._digest.update(data)
+                part._file.write(data)
+            elif op == "close":
+                part._file.close()
+                part._file = None
+                part.sha256 = part._digest.hexdigest()
+            elif op == "discard":
+                part._file.close()
+                part._file = None
+                os.remove(part.path)
+
+    def _cleanup(self):
+        for part in self.files.values():
+            if part._file is not None:
+                part._file.close()
+                part._file = None
+            if os.path.exists(part.path):
+                os.remove(part.path)
+
+    async def _flush(self):
+        if self._pending_ops:
+            ops, self._pending_ops = self._pending_ops, []
+            await asyncio.to_thread(self._apply, ops)
+
+    async def parse(self, stream) -> tuple:
+        """消费请求体的异步字节流，返回 (fields, files)；失败时删除已写入的文件。"""
+        os.makedirs(self.dest_dir, exist_ok=True)
+        parser = MultipartParser(self.boundary, {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        })
+        try:
+            async for chunk in stream:
+                parser.write(chunk)
+                await self._flush()
+            parser.finalize()
+            await self._flush()
+        except BaseException as e:
+            self._pending_ops = []
+            await asyncio.to_thread(self._cleanup)
+            if isinstance(e, FormParserError):
+                raise MultipartFormError("Invalid multipart data.") from e
+            raise
+        return self.fields, self.files
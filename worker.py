@@ -0,0 +1,42 @@
+# worker.py (独立的评测任务 worker 进程)
+#
+# 与 HTTP 服务共享同一个 SQLite 任务队列。可以启动多个进程并行消费：
+#     JOB_EMBEDDED_WORKERS=false python main.py     # 只负责接收请求并入队
+#     python worker.py --concurrency 8              # 一个或多个 worker 进程
+
+import argparse
+import asyncio
+import logging
+import signal
+
+import main
+
+
+async def run_worker(concurrency: int):
+    # 不经过应用 lifespan，需自行建表与迁移
+    await main.db.run(main.init_db)
+    queue = main.JobQueue(
+        main.db,
+        handler=main.run_queued_job,
+        concurrency=concurrency,
+        lease_seconds=main.JOB_LEASE_SECONDS,
+        max_attempts=main.JOB_MAX_ATTEMPTS,
+    )
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    await queue.start()
+    await stop_event.wait()
+    logging.info("收到退出信号，正在停止 worker...")
+    await queue.stop()
+    main.db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="消费 jobs 表中的评测任务。")
+    parser.add_argument("--concurrency", type=int, default=main.JOB_WORKER_CONCURRENCY, help="并发 worker 数量")
+    args = parser.parse_args()
+    logging.info(f"--- 句子复述 AI 评测 worker (并发数 {args.concurrency}) ---")
+    asyncio.run(run_worker(args.concurrency))